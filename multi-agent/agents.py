@@ -1,75 +1,235 @@
 import os
-from typing import List, Dict, Any, Optional
-import google.generativeai as genai
-from openai import OpenAI
+import asyncio
+from typing import List, Dict, Any, Optional, Iterator, Callable, Tuple
 import logging
 import json
+from llm_cache import LLMResponseCache
+from providers import LLMProvider, create_provider
+from rate_limit import TokenBucket, retrying, call_with_retry, call_with_retry_async
+from utils import count_tokens, pack_contexts
+from research_index import ResearchIndex
+from structured_output import StructuredOutputError, STRUCTURED_OUTPUT_STATS, parse_json, reask_prompt
+from tracing import traced, annotate, span
 
 logger = logging.getLogger(__name__)
 
+# Token budget for the research findings in the report prompt, by model prefix
+REPORT_CONTEXT_BUDGETS = {
+    "gemini-2.5": 150000,
+    "gemini-2.0": 100000,
+    "gemini-1.5": 100000,
+    "anthropic/": 60000,
+    "openai/": 40000,
+}
+DEFAULT_REPORT_CONTEXT_BUDGET = 30000
+
+PLAN_SECTIONS = ("core_concepts", "key_questions", "information_requirements", "research_priorities")
+PROGRESS_ASPECTS = ("core_concepts", "key_questions", "information_requirements")
+
+# JSON schemas for the structured replies, sent to providers that can enforce them
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {section: {"type": "array", "items": {"type": "string"}} for section in PLAN_SECTIONS},
+    "required": list(PLAN_SECTIONS),
+}
+PROGRESS_SCHEMA = {
+    "type": "object",
+    "properties": {aspect: {"type": "boolean"} for aspect in PROGRESS_ASPECTS},
+    "required": list(PROGRESS_ASPECTS),
+}
+QUERIES_SCHEMA = {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": 3}
+BATCH_QUERIES_SCHEMA = {"type": "object", "additionalProperties": QUERIES_SCHEMA}
+
 class BaseAgent:
     def __init__(self, use_gemini: bool = True, api_key: Optional[str] = None, 
-                 openrouter_model: Optional[str] = None, gemini_model: Optional[str] = None):
+                 openrouter_model: Optional[str] = None, gemini_model: Optional[str] = None,
+                 cache: Optional[LLMResponseCache] = None, backend: Optional[LLMProvider] = None):
         self.use_gemini = use_gemini
-        if use_gemini:
-            if not api_key:
-                raise ValueError("Gemini API key is required when use_gemini=True")
-            genai.configure(api_key=api_key)
-            self.gemini_model = gemini_model or "gemini-1.5-pro"  # Use a good default model
-        else:
-            self.openrouter_client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=api_key
+        self.temperature = 0.1
+        self.cache = cache
+        self.api_key = api_key
+        # Any registered provider can be passed in; otherwise use_gemini picks
+        # between the Gemini and OpenRouter backends
+        if backend is None:
+            backend = create_provider(
+                "gemini" if use_gemini else "openrouter", api_key,
+                gemini_model if use_gemini else openrouter_model
             )
-            self.model = openrouter_model or "anthropic/claude-3-opus:beta"
+        self.backend = backend
 
-    def _generate_with_gemini(self, prompt: str, system_prompt: str) -> str:
-        try:
-            model = genai.GenerativeModel(model_name=self.gemini_model)
-            # Combine system prompt and user prompt for Gemini
-            combined_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
-            response = model.generate_content(
-                combined_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1
-                )
-            )
-            return response.text
-        except Exception as e:
-            logger.error(f"Gemini generation failed: {str(e)}")
-            raise
+    @property
+    def provider(self) -> str:
+        return self.backend.name
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
 
-    def _generate_with_openrouter(self, prompt: str, system_prompt: str) -> str:
-        completion = self.openrouter_client.chat.completions.create(
+    def _rate_limiter(self) -> TokenBucket:
+        return self.backend.rate_limiter()
+
+    def _annotate_request(self, prompt: str, system_prompt: str, cache_hit: Optional[bool]) -> None:
+        annotate(
+            provider=self.provider,
             model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
+            prompt_chars=len(prompt) + len(system_prompt),
+            prompt_tokens=count_tokens(system_prompt) + count_tokens(prompt),
+            **({"cache_hit": cache_hit} if cache_hit is not None else {})
         )
-        return completion.choices[0].message.content
 
-    def generate(self, prompt: str, system_prompt: str) -> str:
+    def _annotate_response(self, response: Optional[str]) -> None:
+        annotate(response_chars=len(response or ""), response_tokens=count_tokens(response or ""))
+
+    def _cache_key(self, prompt: str, system_prompt: str) -> str:
+        return LLMResponseCache.make_key(self.backend.cache_namespace, self.model, system_prompt, prompt,
+                                         self.temperature)
+
+    def generate(self, prompt: str, system_prompt: str, use_cache: bool = True,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        cache_key = self._cache_key(prompt, system_prompt) if self.cache and use_cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        self._annotate_request(prompt, system_prompt, cached is not None if cache_key else None)
+        if cached is not None:
+            self._annotate_response(cached)
+            return cached
         try:
-            if self.use_gemini:
-                return self._generate_with_gemini(prompt, system_prompt)
-            else:
-                return self._generate_with_openrouter(prompt, system_prompt)
+            response = call_with_retry(
+                lambda: self.backend.generate(prompt, system_prompt, self.temperature, response_schema),
+                self._rate_limiter(), f"{self.provider} generation"
+            )
         except Exception as e:
             logger.error(f"Generation failed: {str(e)}")
             raise
-
-class OrchestratorAgent(BaseAgent):
+        self._annotate_response(response)
+        if cache_key and response:
+            self.cache.set(cache_key, response)
+        return response
+
+    def generate_stream(self, prompt: str, system_prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """Yield the completion in chunks as the provider produces them"""
+        cache_key = self._cache_key(prompt, system_prompt) if self.cache and use_cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        self._annotate_request(prompt, system_prompt, cached is not None if cache_key else None)
+        if cached is not None:
+            self._annotate_response(cached)
+            yield cached
+            return
+        chunks = []
+        try:
+            # Retry only until the first chunk arrives; a stream that fails
+            # part-way cannot be resumed without duplicating output
+            for attempt in retrying(self._rate_limiter(), f"{self.provider} streaming"):
+                with attempt:
+                    self._rate_limiter().acquire()
+                    stream = self.backend.stream(prompt, system_prompt, self.temperature)
+                    first_chunk = next(stream, None)
+            if first_chunk is not None:
+                chunks.append(first_chunk)
+                yield first_chunk
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {str(e)}")
+            raise
+        response = "".join(chunks)
+        self._annotate_response(response)
+        if cache_key and response:
+            self.cache.set(cache_key, response)
+
+    def _load_structured(self, response: str, loader: Callable[[Any], Any]) -> tuple:
+        value, repaired = parse_json(response)
+        return loader(value), repaired
+
+    def _discard_reply(self, prompt: str, system_prompt: str, error: Exception, operation: str) -> None:
+        logger.warning(f"Malformed {operation} reply ({str(error)}), asking again")
+        if self.cache:
+            # Do not serve the unusable reply again
+            self.cache.delete(self._cache_key(prompt, system_prompt))
+
+    def generate_structured(self, prompt: str, system_prompt: str, schema: Dict[str, Any],
+                            loader: Callable[[Any], Any], operation: str) -> Any:
+        """Generate a JSON reply and convert it with ``loader``
+
+        The schema is passed to the provider where it supports structured
+        output. A reply that cannot be repaired into valid JSON, or that
+        ``loader`` rejects with StructuredOutputError, gets one targeted
+        re-ask; if that fails too, StructuredOutputError is raised for the
+        caller to fall back on. The re-ask runs in its own span so the usage
+        of both calls is recorded.
+        """
+        response = self.generate(prompt, system_prompt, response_schema=schema)
+        try:
+            result, repaired = self._load_structured(response, loader)
+        except StructuredOutputError as e:
+            self._discard_reply(prompt, system_prompt, e, operation)
+            with span(f"{operation}_reask"):
+                response = self.generate(reask_prompt(prompt, response, e, schema), system_prompt,
+                                         use_cache=False, response_schema=schema)
+            try:
+                result, _ = self._load_structured(response, loader)
+            except StructuredOutputError:
+                STRUCTURED_OUTPUT_STATS.record(operation, "failed")
+                raise
+            STRUCTURED_OUTPUT_STATS.record(operation, "reasked")
+            return result
+        STRUCTURED_OUTPUT_STATS.record(operation, "repaired" if repaired else "ok")
+        return result
+
+class AsyncBaseAgent(BaseAgent):
+    """BaseAgent with non-blocking generation for the async research engine"""
+
+    async def generate_async(self, prompt: str, system_prompt: str, use_cache: bool = True,
+                             response_schema: Optional[Dict[str, Any]] = None) -> str:
+        cache_key = self._cache_key(prompt, system_prompt) if self.cache and use_cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        self._annotate_request(prompt, system_prompt, cached is not None if cache_key else None)
+        if cached is not None:
+            self._annotate_response(cached)
+            return cached
+        try:
+            response = await call_with_retry_async(
+                lambda: self.backend.generate_async(prompt, system_prompt, self.temperature, response_schema),
+                self._rate_limiter(), f"{self.provider} generation"
+            )
+        except Exception as e:
+            logger.error(f"Generation failed: {str(e)}")
+            raise
+        self._annotate_response(response)
+        if cache_key and response:
+            self.cache.set(cache_key, response)
+        return response
+
+    async def generate_structured_async(self, prompt: str, system_prompt: str, schema: Dict[str, Any],
+                                        loader: Callable[[Any], Any], operation: str) -> Any:
+        """Async variant of generate_structured"""
+        response = await self.generate_async(prompt, system_prompt, response_schema=schema)
+        try:
+            result, repaired = self._load_structured(response, loader)
+        except StructuredOutputError as e:
+            self._discard_reply(prompt, system_prompt, e, operation)
+            with span(f"{operation}_reask"):
+                response = await self.generate_async(reask_prompt(prompt, response, e, schema), system_prompt,
+                                                     use_cache=False, response_schema=schema)
+            try:
+                result, _ = self._load_structured(response, loader)
+            except StructuredOutputError:
+                STRUCTURED_OUTPUT_STATS.record(operation, "failed")
+                raise
+            STRUCTURED_OUTPUT_STATS.record(operation, "reasked")
+            return result
+        STRUCTURED_OUTPUT_STATS.record(operation, "repaired" if repaired else "ok")
+        return result
+
+class OrchestratorAgent(AsyncBaseAgent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.system_prompt = """You are an expert research planner that develops comprehensive research strategies.
         Your role is to create structured research plans that identify what information is needed and why.
         Focus on the logical flow of information needed to answer the query comprehensively."""
 
-    def create_research_plan(self, query: str) -> Dict[str, List[str]]:
-        """Create a structured research plan with clear objectives"""
-        prompt = f"""Create a detailed research plan for the following query: {query}
+    def _research_plan_prompt(self, query: str) -> str:
+        return f"""Create a detailed research plan for the following query: {query}
 
         Return a JSON object with the following structure:
         {{
@@ -80,27 +240,51 @@ class OrchestratorAgent(BaseAgent):
         }}
 
         Make sure the plan flows logically and each item contributes to answering the main query."""
-        
-        response = self.generate(prompt, self.system_prompt)
+
+    def _load_research_plan(self, value: Any) -> Dict[str, List[str]]:
+        if not isinstance(value, dict):
+            raise StructuredOutputError("research plan is not a JSON object")
+        plan = dict(value)
+        for key in PLAN_SECTIONS:
+            items = plan.get(key, [] if key == "research_priorities" else None)
+            if isinstance(items, str):
+                items = [items]
+            if not isinstance(items, list) or (key != "research_priorities" and not items):
+                raise StructuredOutputError(f"research plan needs a non-empty '{key}' list")
+            plan[key] = [str(item) for item in items if str(item).strip()]
+        logger.info(f"Generated research plan: {json.dumps(plan, indent=2)}")
+        return plan
+
+    def _fallback_plan(self, query: str) -> Dict[str, List[str]]:
+        logger.error(f"Failed to get a research plan for: {query}")
+        # Return a basic plan structure if parsing fails
+        return {
+            "core_concepts": [query],
+            "key_questions": [query],
+            "information_requirements": [query],
+            "research_priorities": [query]
+        }
+
+    @traced("create_research_plan")
+    def create_research_plan(self, query: str) -> Dict[str, List[str]]:
+        """Create a structured research plan with clear objectives"""
         try:
-            # Clean the response of any markdown formatting
-            cleaned_response = response.strip().replace('```json', '').replace('```', '').strip()
-            plan = json.loads(cleaned_response)
-            logger.info(f"Generated research plan: {json.dumps(plan, indent=2)}")
-            return plan
-        except:
-            logger.error(f"Failed to parse research plan: {response}")
-            # Return a basic plan structure if parsing fails
-            return {
-                "core_concepts": [query],
-                "key_questions": [query],
-                "information_requirements": [query],
-                "research_priorities": [query]
-            }
+            return self.generate_structured(self._research_plan_prompt(query), self.system_prompt,
+                                            PLAN_SCHEMA, self._load_research_plan, "create_research_plan")
+        except StructuredOutputError:
+            return self._fallback_plan(query)
+
+    @traced("create_research_plan")
+    async def create_research_plan_async(self, query: str) -> Dict[str, List[str]]:
+        """Async variant of create_research_plan"""
+        try:
+            return await self.generate_structured_async(self._research_plan_prompt(query), self.system_prompt,
+                                                        PLAN_SCHEMA, self._load_research_plan, "create_research_plan")
+        except StructuredOutputError:
+            return self._fallback_plan(query)
 
-    def evaluate_research_progress(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> Dict[str, bool]:
-        """Evaluate if we have enough information for each aspect of the plan"""
-        prompt = f"""Analyze the research plan and gathered information to evaluate completeness.
+    def _progress_prompt(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> str:
+        return f"""Analyze the research plan and gathered information to evaluate completeness.
 
         Research Plan:
         {json.dumps(plan, indent=2)}
@@ -122,41 +306,181 @@ class OrchestratorAgent(BaseAgent):
         - Return ONLY the JSON object, no other text
         - Must be valid JSON parseable by json.loads()"""
 
-        response = self.generate(prompt, self.system_prompt)
+    def _incremental_progress_prompt(self, plan: Dict[str, List[str]], prior_progress: Optional[Dict[str, bool]],
+                                     digests: List[str], new_info: List[str]) -> str:
+        prior = json.dumps(prior_progress, indent=2) if prior_progress else "None yet - this is the first evaluation"
+        reviewed = chr(10).join(digests) if digests else "None"
+        new = chr(10).join(new_info) if new_info else "None"
+        return f"""Update your evaluation of research completeness using the newly gathered information.
+
+        Research Plan:
+        {json.dumps(plan, indent=2)}
+
+        Your Previous Verdicts:
+        {prior}
+
+        Previously Reviewed Sources (short digests, already reflected in the verdicts above):
+        {reviewed}
+
+        Newly Gathered Information:
+        {new}
+
+        Your task: Return a STRICTLY FORMATTED JSON object with only three boolean fields indicating whether all information gathered so far adequately covers each aspect. Do not include any other text, explanation, or comments.
+
+        Required exact output format (with true/false values):
+        {{
+            "core_concepts": false,
+            "key_questions": false,
+            "information_requirements": false
+        }}
+
+        Rules:
+        - Keep a field true if it was already true in your previous verdicts
+        - Set a field to true ONLY if the gathered information thoroughly covers that aspect
+        - Return ONLY the JSON object, no other text
+        - Must be valid JSON parseable by json.loads()"""
+
+    @staticmethod
+    def _load_progress(value: Any) -> Dict[str, bool]:
+        # Validate the response has the correct structure
+        if not isinstance(value, dict):
+            raise StructuredOutputError("evaluation is not a JSON object")
+        progress = {}
+        for key in PROGRESS_ASPECTS:
+            verdict = value.get(key)
+            if isinstance(verdict, str) and verdict.strip().lower() in ("true", "false"):
+                verdict = verdict.strip().lower() == "true"
+            if not isinstance(verdict, bool):
+                raise StructuredOutputError(f"evaluation needs a true/false '{key}' field")
+            progress[key] = verdict
+        return progress
+
+    def evaluate_structured(self, prompt: str) -> Dict[str, bool]:
+        """Run an evaluate prompt, treating every aspect as uncovered if no usable verdict comes back"""
         try:
-            # Remove any leading/trailing whitespace and quotes
-            cleaned_response = response.strip().strip('"').strip()
-            # Remove any markdown code block formatting
-            cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
-            
-            # Parse and validate the response has the correct structure
-            parsed = json.loads(cleaned_response)
-            required_keys = {"core_concepts", "key_questions", "information_requirements"}
-            if not all(isinstance(parsed.get(key), bool) for key in required_keys):
-                raise ValueError("Response missing required boolean fields")
-            
-            return parsed
-        except Exception as e:
-            logger.error(f"Failed to parse evaluation response: {response}")
-            # Return a default response indicating no completeness
-            return {
-                "core_concepts": False,
-                "key_questions": False,
-                "information_requirements": False
-            }
-
-class PlannerAgent(BaseAgent):
+            return self.generate_structured(prompt, self.system_prompt, PROGRESS_SCHEMA,
+                                            self._load_progress, "evaluate_research_progress")
+        except StructuredOutputError:
+            logger.error("Failed to get a research progress evaluation")
+            return dict.fromkeys(PROGRESS_ASPECTS, False)
+
+    async def evaluate_structured_async(self, prompt: str) -> Dict[str, bool]:
+        """Async variant of evaluate_structured"""
+        try:
+            return await self.generate_structured_async(prompt, self.system_prompt, PROGRESS_SCHEMA,
+                                                        self._load_progress, "evaluate_research_progress")
+        except StructuredOutputError:
+            logger.error("Failed to get a research progress evaluation")
+            return dict.fromkeys(PROGRESS_ASPECTS, False)
+
+    @traced("evaluate_research_progress")
+    def evaluate_research_progress(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> Dict[str, bool]:
+        """Evaluate if we have enough information for each aspect of the plan"""
+        return self.evaluate_structured(self._progress_prompt(plan, gathered_info))
+
+    @traced("evaluate_research_progress")
+    async def evaluate_research_progress_async(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> Dict[str, bool]:
+        """Async variant of evaluate_research_progress"""
+        return await self.evaluate_structured_async(self._progress_prompt(plan, gathered_info))
+
+class IncrementalProgressEvaluator:
+    """Keeps a running coverage state so each evaluation only sends new material
+
+    Sources that were part of an earlier evaluation are replaced by short
+    digests and the previous verdicts are sent along, so the evaluate
+    prompt grows with the number of new results instead of with the whole
+    corpus. Verdicts are monotonic: an aspect judged covered stays covered.
+    """
+
+    def __init__(self, orchestrator: OrchestratorAgent, digest_chars: int = 240):
+        self.orchestrator = orchestrator
+        self.digest_chars = digest_chars
+        self.progress: Optional[Dict[str, bool]] = None
+        self.digests: List[str] = []
+        self.evaluated_count = 0
+        self.evaluations = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+        self._gathered_tokens = 0
+
+    def _digest(self, text: str) -> str:
+        compact = " ".join(text.split())
+        if len(compact) > self.digest_chars:
+            compact = compact[:self.digest_chars].rstrip() + "..."
+        return f"- {compact}"
+
+    def _prepare(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> tuple:
+        new_info = gathered_info[self.evaluated_count:]
+        prompt = self.orchestrator._incremental_progress_prompt(plan, self.progress, self.digests, new_info)
+
+        # Compare against the prompt the full evaluation would have sent
+        self._gathered_tokens += sum(count_tokens(text) for text in new_info)
+        full_tokens = count_tokens(self.orchestrator._progress_prompt(plan, [])) + self._gathered_tokens
+        sent_tokens = count_tokens(prompt)
+        self.tokens_sent += sent_tokens
+        self.tokens_saved += max(0, full_tokens - sent_tokens)
+        return prompt, new_info
+
+    def _record(self, parsed: Dict[str, bool], new_info: List[str]) -> Dict[str, bool]:
+        if self.progress:
+            parsed = {key: bool(value or self.progress.get(key, False)) for key, value in parsed.items()}
+        self.progress = parsed
+        self.digests.extend(self._digest(text) for text in new_info)
+        self.evaluated_count += len(new_info)
+        self.evaluations += 1
+        return dict(parsed)
+
+    @traced("evaluate_research_progress")
+    def evaluate(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> Dict[str, bool]:
+        """Evaluate progress given every result gathered so far, in arrival order"""
+        prompt, new_info = self._prepare(plan, gathered_info)
+        return self._record(self.orchestrator.evaluate_structured(prompt), new_info)
+
+    @traced("evaluate_research_progress")
+    async def evaluate_async(self, plan: Dict[str, List[str]], gathered_info: List[str]) -> Dict[str, bool]:
+        """Async variant of evaluate"""
+        prompt, new_info = self._prepare(plan, gathered_info)
+        return self._record(await self.orchestrator.evaluate_structured_async(prompt), new_info)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "evaluations": self.evaluations,
+            "tokens_sent": self.tokens_sent,
+            "tokens_saved": self.tokens_saved
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "progress": self.progress,
+            "digests": self.digests,
+            "evaluated_count": self.evaluated_count,
+            "evaluations": self.evaluations,
+            "tokens_sent": self.tokens_sent,
+            "tokens_saved": self.tokens_saved,
+            "gathered_tokens": self._gathered_tokens
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Reload the state saved by to_dict"""
+        self.progress = data.get("progress")
+        self.digests = list(data.get("digests", []))
+        self.evaluated_count = data.get("evaluated_count", 0)
+        self.evaluations = data.get("evaluations", 0)
+        self.tokens_sent = data.get("tokens_sent", 0)
+        self.tokens_saved = data.get("tokens_saved", 0)
+        self._gathered_tokens = data.get("gathered_tokens", 0)
+
+class PlannerAgent(AsyncBaseAgent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.system_prompt = """You are an expert research planner that creates targeted search strategies.
         Your role is to identify the key aspects that need deep investigation, focusing on quality over quantity.
         Create research plans that encourage thorough exploration of important concepts rather than shallow coverage of many topics."""
 
-    def create_search_strategy(self, research_item: str, item_type: str) -> List[str]:
-        """Create targeted search queries based on the type of research item"""
-        prompt = f"""Create 2-3 highly specific search queries for this {item_type}: {research_item}
-        
-        Focus on Depth:
+    # Items planned per batched strategy call; larger batches are split
+    STRATEGY_BATCH_SIZE = 10
+
+    STRATEGY_GUIDELINES = """Focus on Depth:
         - Start with foundational understanding
         - Build up to technical specifics and implementation details
         - Look for real-world examples and case studies
@@ -167,67 +491,186 @@ class PlannerAgent(BaseAgent):
         - Prefer fewer, more focused queries over many broad ones
         - Each query should build on previous knowledge
         - Target high-quality technical sources
-        - Look for detailed explanations rather than surface-level overviews
+        - Look for detailed explanations rather than surface-level overviews"""
+
+    def _search_strategy_prompt(self, research_item: str, item_type: str) -> str:
+        return f"""Create 2-3 highly specific search queries for this {item_type}: {research_item}
+        
+        {self.STRATEGY_GUIDELINES}
         
         Return ONLY a JSON array of 2-3 carefully crafted search queries that will yield deep technical information.
         Make each query highly specific and targeted."""
+
+    def _batch_search_strategy_prompt(self, items: List[tuple]) -> str:
+        numbered = "\n".join(
+            f"        {number}. [{item_type}] {research_item}"
+            for number, (item_type, research_item) in enumerate(items, 1)
+        )
+        return f"""Create 2-3 highly specific search queries for each of these research items:
+{numbered}
+        
+        {self.STRATEGY_GUIDELINES}
         
-        response = self.generate(prompt, self.system_prompt)
+        Return ONLY a JSON object mapping each item's number to a JSON array of its 2-3 search queries, e.g.
+        {{"1": ["query", "query"], "2": ["query", "query", "query"]}}
+        Include every item. Make each query highly specific and targeted."""
+
+    @staticmethod
+    def _load_queries(value: Any) -> List[str]:
+        if isinstance(value, dict) and len(value) == 1:
+            # e.g. {"queries": [...]}
+            value = next(iter(value.values()))
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            raise StructuredOutputError("search queries are not a JSON array")
+        queries = [str(q).strip() for q in value if str(q).strip()][:3]
+        if not queries:
+            raise StructuredOutputError("no search queries in reply")
+        return queries
+
+    def _load_batch_queries(self, value: Any, items: List[tuple]) -> Dict[int, List[str]]:
+        """Queries per item position; items missing or malformed in the reply are left out"""
+        if not isinstance(value, dict):
+            raise StructuredOutputError("batched search queries are not a JSON object")
+        strategies = {}
+        for position in range(len(items)):
+            try:
+                strategies[position] = self._load_queries(value[str(position + 1)])
+            except (KeyError, StructuredOutputError):
+                continue
+        if not strategies:
+            raise StructuredOutputError("no item in the reply has search queries")
+        return strategies
+
+    def _strategy_batches(self, items: List[tuple]) -> List[List[tuple]]:
+        size = max(1, self.STRATEGY_BATCH_SIZE)
+        return [items[start:start + size] for start in range(0, len(items), size)]
+
+    @traced("create_search_strategy")
+    def create_search_strategy(self, research_item: str, item_type: str) -> List[str]:
+        """Create targeted search queries based on the type of research item"""
+        try:
+            return self.generate_structured(self._search_strategy_prompt(research_item, item_type), self.system_prompt,
+                                            QUERIES_SCHEMA, self._load_queries, "create_search_strategy")
+        except StructuredOutputError:
+            logger.error(f"Failed to get search queries for: {research_item}")
+            return [str(research_item)]
+
+    @traced("create_search_strategy")
+    async def create_search_strategy_async(self, research_item: str, item_type: str) -> List[str]:
+        """Async variant of create_search_strategy"""
         try:
-            cleaned_response = response.strip().replace('```json', '').replace('```', '').strip()
-            queries = json.loads(cleaned_response)
-            return [str(q) for q in queries[:3]]
-        except:
-            logger.error(f"Failed to parse search queries: {response}")
+            return await self.generate_structured_async(
+                self._search_strategy_prompt(research_item, item_type), self.system_prompt,
+                QUERIES_SCHEMA, self._load_queries, "create_search_strategy"
+            )
+        except StructuredOutputError:
+            logger.error(f"Failed to get search queries for: {research_item}")
             return [str(research_item)]
 
-    def prioritize_unfulfilled_requirements(self, plan: Dict[str, List[str]], progress: Dict[str, bool], gathered_info: List[str] = None) -> List[tuple]:
-        """Create a prioritized list of remaining research needs with depth checking"""
+    @traced("create_search_strategies")
+    def _create_strategy_batch(self, items: List[tuple]) -> Dict[int, List[str]]:
+        try:
+            return self.generate_structured(self._batch_search_strategy_prompt(items), self.system_prompt,
+                                            BATCH_QUERIES_SCHEMA, lambda value: self._load_batch_queries(value, items),
+                                            "create_search_strategies")
+        except Exception as e:
+            logger.error(f"Batched search strategy failed: {str(e)}")
+            return {}
+
+    @traced("create_search_strategies")
+    async def _create_strategy_batch_async(self, items: List[tuple]) -> Dict[int, List[str]]:
+        try:
+            return await self.generate_structured_async(
+                self._batch_search_strategy_prompt(items), self.system_prompt,
+                BATCH_QUERIES_SCHEMA, lambda value: self._load_batch_queries(value, items),
+                "create_search_strategies"
+            )
+        except Exception as e:
+            logger.error(f"Batched search strategy failed: {str(e)}")
+            return {}
+
+    def create_search_strategies(self, items: List[tuple]) -> List[List[str]]:
+        """Search queries for several (item_type, research_item) pairs, planned in one call per batch
+
+        Items the batched response leaves out or garbles are planned one by
+        one with create_search_strategy.
+        """
+        if len(items) == 1:
+            item_type, research_item = items[0]
+            return [self.create_search_strategy(research_item, item_type)]
+        strategies = []
+        for batch in self._strategy_batches(items):
+            planned = self._create_strategy_batch(batch)
+            for position, (item_type, research_item) in enumerate(batch):
+                if position not in planned:
+                    planned[position] = self.create_search_strategy(research_item, item_type)
+            strategies.extend(planned[position] for position in range(len(batch)))
+        return strategies
+
+    async def create_search_strategies_async(self, items: List[tuple]) -> List[List[str]]:
+        """Async variant of create_search_strategies; batches and fallbacks run concurrently"""
+        if len(items) == 1:
+            item_type, research_item = items[0]
+            return [await self.create_search_strategy_async(research_item, item_type)]
+        batches = self._strategy_batches(items)
+        planned_batches = await asyncio.gather(*[self._create_strategy_batch_async(batch) for batch in batches])
+        missing = [
+            (planned, position, item)
+            for batch, planned in zip(batches, planned_batches)
+            for position, item in enumerate(batch) if position not in planned
+        ]
+        if missing:
+            logger.warning(f"Planning {len(missing)} of {len(items)} items individually")
+            fallbacks = await asyncio.gather(*[
+                self.create_search_strategy_async(research_item, item_type)
+                for _, _, (item_type, research_item) in missing
+            ])
+            for (planned, position, _), queries in zip(missing, fallbacks):
+                planned[position] = queries
+        return [planned[position] for batch, planned in zip(batches, planned_batches) for position in range(len(batch))]
+
+    def prioritize_unfulfilled_requirements(self, plan: Dict[str, List[str]], progress: Dict[str, bool], gathered_info: List[str] = None,
+                                            index: Optional[ResearchIndex] = None) -> List[tuple]:
+        """Create a prioritized list of remaining research needs with depth checking
+        
+        Pass the run's ResearchIndex to avoid re-tokenizing gathered_info on
+        every call; without it a temporary index is built from gathered_info.
+        """
         items = []
         
-        def has_sufficient_depth(topic: str, info: List[str]) -> bool:
-            if not info:
-                return False
-            
-            # Count substantial mentions (more than just a passing reference)
-            substantial_mentions = 0
-            for text in info:
-                topic_words = set(topic.lower().split())
-                text_lower = text.lower()
-                
-                # Check if the text contains multiple topic keywords
-                keyword_matches = sum(1 for word in topic_words if word in text_lower)
-                
-                # Check for substantial content (contains multiple keywords and is detailed)
-                if keyword_matches >= 2 and len(text) > 300:
-                    substantial_mentions += 1
-                
-            # Require multiple substantial mentions
-            return substantial_mentions >= 2
+        if index is None and gathered_info:
+            index = ResearchIndex()
+            index.extend(gathered_info)
+        
+        def needs_research(item) -> bool:
+            return not index or not index.has_sufficient_depth(item)
         
         # First priority: core concepts without sufficient depth
         if not progress["core_concepts"]:
             for item in plan["core_concepts"]:
-                if not gathered_info or not has_sufficient_depth(item, gathered_info):
+                if needs_research(item):
                     items.append(("core_concepts", item))
             
         # Second priority: key questions without sufficient answers
         if not progress["key_questions"]:
             for item in plan["key_questions"]:
-                if not gathered_info or not has_sufficient_depth(item, gathered_info):
+                if needs_research(item):
                     items.append(("key_questions", item))
             
         # Third priority: detailed information requirements
         if not progress["information_requirements"]:
             for item in plan["information_requirements"]:
-                if not gathered_info or not has_sufficient_depth(item, gathered_info):
+                if needs_research(item):
                     items.append(("information_requirements", item))
         
         return items
 
-class ReportAgent(BaseAgent):
-    def __init__(self, *args, **kwargs):
+class ReportAgent(AsyncBaseAgent):
+    def __init__(self, *args, context_token_budget: Optional[int] = None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.context_token_budget = context_token_budget
         self.system_prompt = """You are an expert technical writer and researcher that creates 
         comprehensive, well-structured research reports. Your primary focus is on deep analysis,
         synthesis of information, and meaningful organization of content.
@@ -239,9 +682,9 @@ class ReportAgent(BaseAgent):
         4. Critical Analysis - Question assumptions and evaluate trade-offs
         5. Evidence-Based - Support claims with specific technical details and examples"""
 
-    def generate_report(self, query: str, research_plan: Dict[str, List[str]], 
+    def _report_prompt(self, query: str, research_plan: Dict[str, List[str]],
                        research_results: List[str], completion_stats: Dict[str, Any]) -> str:
-        prompt = f"""Generate a comprehensive technical report that synthesizes the research findings into a cohesive narrative.
+        return f"""Generate a comprehensive technical report that synthesizes the research findings into a cohesive narrative.
 
         Query: {query}
 
@@ -297,5 +740,64 @@ class ReportAgent(BaseAgent):
         - Focus on providing meaningful insights rather than covering every possible aspect
         - Only include information that contributes to understanding the topic
         - Skip sections or topics where there isn't enough substantive content"""
-        
-        return self.generate(prompt, self.system_prompt)
\ No newline at end of file
+
+    def _context_budget(self) -> int:
+        if self.context_token_budget:
+            return self.context_token_budget
+        model = self.model
+        for prefix, budget in REPORT_CONTEXT_BUDGETS.items():
+            if model.startswith(prefix):
+                return budget
+        return DEFAULT_REPORT_CONTEXT_BUDGET
+
+    def pack_findings(self, query: str, research_plan: Dict[str, List[str]],
+                      research_results: List[str], token_budget: Optional[int] = None) -> Tuple[List[str], List[int]]:
+        """Fit the findings into the report's context budget
+
+        Returns the packed findings and the indices of the findings kept, so
+        callers can cite only the sources the report was written from.
+        """
+        budget = min(self._context_budget(), token_budget) if token_budget else self._context_budget()
+        packed, summary = pack_contexts(research_results, query, research_plan, budget)
+        logger.info(
+            f"Packed {summary['kept']}/{len(research_results)} sources into "
+            f"{summary['tokens_used']}/{summary['budget']} tokens"
+        )
+        if summary["trimmed"]:
+            logger.info(f"Trimmed sources: {json.dumps(summary['trimmed'])}")
+        if summary["dropped"]:
+            logger.info(f"Dropped sources over token budget: {json.dumps(summary['dropped'])}")
+        return packed, summary["kept_indices"]
+
+    def _pack_findings(self, query: str, research_plan: Dict[str, List[str]], research_results: List[str],
+                       token_budget: Optional[int], packed: bool) -> List[str]:
+        if packed:
+            return research_results
+        return self.pack_findings(query, research_plan, research_results, token_budget)[0]
+
+    @traced("generate_report")
+    def generate_report(self, query: str, research_plan: Dict[str, List[str]], 
+                       research_results: List[str], completion_stats: Dict[str, Any],
+                       token_budget: Optional[int] = None, packed: bool = False) -> str:
+        """Write the report; pass ``packed=True`` for findings already run through pack_findings"""
+        research_results = self._pack_findings(query, research_plan, research_results, token_budget, packed)
+        prompt = self._report_prompt(query, research_plan, research_results, completion_stats)
+        return self.generate(prompt, self.system_prompt)
+
+    @traced("generate_report")
+    def generate_report_stream(self, query: str, research_plan: Dict[str, List[str]],
+                               research_results: List[str], completion_stats: Dict[str, Any],
+                               token_budget: Optional[int] = None, packed: bool = False) -> Iterator[str]:
+        """Yield the report in chunks as it is generated"""
+        research_results = self._pack_findings(query, research_plan, research_results, token_budget, packed)
+        prompt = self._report_prompt(query, research_plan, research_results, completion_stats)
+        yield from self.generate_stream(prompt, self.system_prompt)
+
+    @traced("generate_report")
+    async def generate_report_async(self, query: str, research_plan: Dict[str, List[str]],
+                                    research_results: List[str], completion_stats: Dict[str, Any],
+                                    token_budget: Optional[int] = None, packed: bool = False) -> str:
+        """Async variant of generate_report"""
+        research_results = self._pack_findings(query, research_plan, research_results, token_budget, packed)
+        prompt = self._report_prompt(query, research_plan, research_results, completion_stats)
+        return await self.generate_async(prompt, self.system_prompt)
@@ -0,0 +1,187 @@
+"""Headless batch runner: research every query in a JSONL file
+
+Each input line is either a JSON object with a ``query`` (and optionally
+an ``id``) or a bare JSON string. Reports are written as ``<id>.md`` and
+``<id>.html`` into a per-batch directory next to a ``manifest.json``
+recording the outcome of every item; rerunning the same batch skips
+items the manifest already lists as done.
+
+    python batch_research.py topics.jsonl --parallelism 8
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import statistics
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+from utils import save_markdown_report, convert_to_html
+from client_pool import run_async
+from mcp_server import MultiAgentSystem, get_multi_agent_system, server_logger
+
+def load_queries(path: str) -> List[Dict[str, str]]:
+    """Read batch items from a JSONL file, assigning stable ids where missing"""
+    items = []
+    seen_ids = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON: {str(e)}")
+            if isinstance(record, str):
+                record = {"query": record}
+            query = str(record.get("query", "")).strip() if isinstance(record, dict) else ""
+            if not query:
+                raise ValueError(f"{path}:{line_no}: missing query")
+            item_id = str(record.get("id") or hashlib.sha256(query.encode("utf-8")).hexdigest()[:12])
+            # Ids become file names
+            item_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in item_id).lstrip(".")
+            if item_id in seen_ids:
+                raise ValueError(f"{path}:{line_no}: duplicate id {item_id}")
+            seen_ids.add(item_id)
+            items.append({"id": item_id, "query": query})
+    return items
+
+class BatchManifest:
+    """Per-batch record of item outcomes, rewritten after every update"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.items = json.load(f).get("items", {})
+
+    def is_done(self, item_id: str) -> bool:
+        entry = self.items.get(item_id)
+        return bool(entry and entry.get("status") == "done"
+                    and entry.get("markdown") and os.path.exists(entry["markdown"]))
+
+    def record(self, item_id: str, **fields) -> None:
+        with self._lock:
+            self.items[item_id] = dict(self.items.get(item_id, {}), **fields)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"updated_at": datetime.now().isoformat(), "items": self.items}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+async def run_item(system: MultiAgentSystem, item: Dict[str, str], batch_dir: str,
+                   manifest: BatchManifest, semaphore: asyncio.Semaphore, html: bool) -> Optional[float]:
+    """Research one item and record it in the manifest; returns its latency on success"""
+    async with semaphore:
+        server_logger.info(f"[batch] Starting {item['id']}: {item['query']}")
+        manifest.record(item["id"], query=item["query"], status="running",
+                        started_at=datetime.now().isoformat())
+        started = time.monotonic()
+        try:
+            # Scoped to the batch and item so a rerun resumes this item's checkpoint
+            run_id = system.run_id_for(item["query"], os.path.abspath(batch_dir), item["id"])
+            report = await system.process_query_async(item["query"], run_id=run_id)
+        except Exception as e:
+            latency = time.monotonic() - started
+            server_logger.error(f"[batch] {item['id']} failed after {latency:.1f}s: {str(e)}")
+            manifest.record(item["id"], status="failed", error=str(e), latency_seconds=round(latency, 3))
+            return None
+        latency = time.monotonic() - started
+
+    md_path = save_markdown_report(report, output_dir=batch_dir, filename=f"{item['id']}.md")
+    html_path = convert_to_html(report, output_dir=batch_dir, filename=f"{item['id']}.html") if html else None
+    manifest.record(
+        item["id"], status="done", error=None, markdown=md_path, html=html_path,
+        latency_seconds=round(latency, 3), finished_at=datetime.now().isoformat()
+    )
+    server_logger.info(f"[batch] Finished {item['id']} in {latency:.1f}s")
+    return latency
+
+async def run_batch_async(system: MultiAgentSystem, items: List[Dict[str, str]], batch_dir: str,
+                          parallelism: int = 4, html: bool = True) -> Dict[str, Any]:
+    """Research the pending items of a batch and return aggregate statistics"""
+    os.makedirs(batch_dir, exist_ok=True)
+    manifest = BatchManifest(os.path.join(batch_dir, "manifest.json"))
+    pending = [item for item in items if not manifest.is_done(item["id"])]
+    skipped = len(items) - len(pending)
+    if skipped:
+        server_logger.info(f"[batch] Skipping {skipped} items completed in an earlier run")
+
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+    started = time.monotonic()
+    latencies = await asyncio.gather(*[
+        run_item(system, item, batch_dir, manifest, semaphore, html) for item in pending
+    ])
+    wall_time = time.monotonic() - started
+
+    completed = sorted(latency for latency in latencies if latency is not None)
+    stats = {
+        "items": len(items),
+        "skipped": skipped,
+        "completed": len(completed),
+        "failed": len(pending) - len(completed),
+        "wall_seconds": round(wall_time, 1),
+        "throughput_per_hour": round(len(completed) / wall_time * 3600, 1) if wall_time > 0 else 0.0
+    }
+    if completed:
+        stats["latency_seconds"] = {
+            "mean": round(statistics.mean(completed), 1),
+            "p50": round(statistics.median(completed), 1),
+            "p90": round(completed[min(len(completed) - 1, int(0.9 * len(completed)))], 1),
+            "max": round(completed[-1], 1)
+        }
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Research every query in a JSONL file")
+    parser.add_argument("input", help="JSONL file with one query per line")
+    parser.add_argument("--output-dir", default=os.path.join("generated_reports", "batches"),
+                        help="Directory holding one subdirectory per batch")
+    parser.add_argument("--batch-name", help="Batch directory name (defaults to the input file name)")
+    parser.add_argument("--parallelism", type=int, default=4, help="Queries researched at the same time")
+    parser.add_argument("--provider", choices=["gemini", "openrouter"], default="gemini")
+    parser.add_argument("--gemini-model", default="gemini-2.0-flash")
+    parser.add_argument("--openrouter-model", default="anthropic/claude-3-opus:beta")
+    parser.add_argument("--no-html", action="store_true", help="Only write markdown reports")
+    args = parser.parse_args(argv)
+
+    use_gemini = args.provider == "gemini"
+    tavily_key = os.getenv("TAVILY_API_KEY")
+    llm_key = os.getenv("GEMINI_API_KEY") if use_gemini else os.getenv("OPENROUTER_API_KEY")
+    if not tavily_key or not llm_key:
+        parser.error(f"TAVILY_API_KEY and {'GEMINI' if use_gemini else 'OPENROUTER'}_API_KEY must be set")
+
+    items = load_queries(args.input)
+    batch_name = args.batch_name or os.path.splitext(os.path.basename(args.input))[0]
+    batch_dir = os.path.join(args.output_dir, batch_name)
+
+    # One pooled system for the whole batch, so LLM, search and checkpoint caches are shared
+    system = get_multi_agent_system(
+        use_gemini=use_gemini,
+        gemini_api_key=llm_key if use_gemini else None,
+        gemini_model=args.gemini_model if use_gemini else None,
+        tavily_api_key=tavily_key,
+        openrouter_api_key=None if use_gemini else llm_key,
+        openrouter_model=None if use_gemini else args.openrouter_model
+    )
+    stats = run_async(run_batch_async(system, items, batch_dir, args.parallelism, html=not args.no_html))
+
+    print(f"Batch '{batch_name}' finished: {stats['completed']} completed, "
+          f"{stats['failed']} failed, {stats['skipped']} skipped of {stats['items']}")
+    print(f"Wall time {stats['wall_seconds']}s, throughput {stats['throughput_per_hour']} queries/hour")
+    if "latency_seconds" in stats:
+        latency = stats["latency_seconds"]
+        print(f"Latency mean {latency['mean']}s, p50 {latency['p50']}s, "
+              f"p90 {latency['p90']}s, max {latency['max']}s")
+    print(f"Reports and manifest in {batch_dir}")
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
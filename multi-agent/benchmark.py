@@ -0,0 +1,196 @@
+"""End-to-end benchmark of the research pipeline against local stub servers
+
+Starts stand-ins for the LLM provider and Tavily (see stub_servers.py),
+points the pipeline at them and runs process_query repeatedly for each
+plan size. Reports run-time percentiles, calls per agent method, bytes
+and tokens sent to each service, and how those scale with plan size.
+No API credits are used.
+
+    python benchmark.py --runs 5 --plan-sizes 2,4,8 --llm-latency 0.2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Dict, List, Optional
+from stub_servers import StubConfig, OpenAIStub, GeminiStub, TavilyStub, PageStub
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def _delta(after: Dict[str, Any], before: Dict[str, Any]) -> Dict[str, Any]:
+    result = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            result[key] = _delta(value, before.get(key, {}))
+        else:
+            result[key] = value - before.get(key, 0)
+    return result
+
+def _add(total: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            _add(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+def run_benchmark(provider: str = "openrouter", runs: int = 3, plan_sizes: List[int] = (3,),
+                  config: Optional[StubConfig] = None, search_fanout: bool = False,
+                  search_config: Optional[StubConfig] = None, batch_strategies: bool = True,
+                  pipelined: bool = False, fetch_pages: bool = False,
+                  coverage_gating: bool = True) -> Dict[str, Any]:
+    """Run the pipeline ``runs`` times per plan size and return the measurements
+
+    ``config`` drives the LLM stub; ``search_config`` (defaulting to the
+    same settings) drives the Tavily stub and, with ``fetch_pages``, the
+    page stub behind its results.
+    """
+    config = config or StubConfig()
+    llm = GeminiStub(config) if provider == "gemini" else OpenAIStub(config)
+    search = TavilyStub(search_config or config)
+    pages = PageStub(search_config or config) if fetch_pages else None
+    if pages:
+        search.page_url = f"{pages.start()}/page"
+    llm_url, search_url = llm.start(), search.start()
+
+    # Point every client at the stubs and keep caches, checkpoints and
+    # client-side throttling from hiding the pipeline's own behaviour
+    os.environ["TAVILY_API_URL"] = search_url
+    if provider == "openrouter":
+        os.environ["OPENROUTER_BASE_URL"] = f"{llm_url}/v1"
+    elif provider == "local":
+        os.environ["LOCAL_LLM_BASE_URL"] = f"{llm_url}/v1"
+    else:
+        os.environ["GEMINI_API_ENDPOINT"] = llm_url
+    for name in ("GEMINI", "OPENROUTER", "TAVILY"):
+        os.environ.setdefault(f"RATE_LIMIT_{name}_RPS", "1000")
+        os.environ.setdefault(f"RATE_LIMIT_{name}_BURST", "1000")
+    from mcp_server import MultiAgentSystem
+    from providers import AGENT_ROLES, create_provider
+    from structured_output import STRUCTURED_OUTPUT_STATS
+    from page_fetcher import PageFetcher
+    STRUCTURED_OUTPUT_STATS.reset()
+
+    results = {"provider": provider, "runs_per_size": runs, "plan_sizes": {}}
+    try:
+        for plan_size in plan_sizes:
+            config.plan_size = plan_size
+            system = MultiAgentSystem(
+                use_gemini=provider == "gemini",
+                gemini_api_key="stub-key", gemini_model="gemini-2.0-flash",
+                tavily_api_key="stub-key",
+                openrouter_api_key="stub-key", openrouter_model="stub/model",
+                search_fanout=search_fanout, batch_strategies=batch_strategies, pipelined=pipelined,
+                coverage_gating=coverage_gating,
+                llm_cache=None, search_cache=None, checkpoint_store=None,
+                agent_backends={role: create_provider("local") for role in AGENT_ROLES} if provider == "local" else None,
+                page_fetcher=PageFetcher(allow_private_addresses=True) if fetch_pages else None
+            )
+            durations, failures = [], 0
+            llm_total: Dict[str, Any] = {}
+            search_total: Dict[str, Any] = {}
+            page_total: Dict[str, Any] = {}
+            for run in range(runs):
+                llm_before, search_before = llm.snapshot(), search.snapshot()
+                pages_before = pages.snapshot() if pages else {}
+                started = time.monotonic()
+                try:
+                    system.process_query(f"benchmark topic {plan_size}-{run}")
+                    durations.append(time.monotonic() - started)
+                except Exception as e:
+                    failures += 1
+                    print(f"Run {run} with plan size {plan_size} failed: {str(e)}", file=sys.stderr)
+                _add(llm_total, _delta(llm.snapshot(), llm_before))
+                _add(search_total, _delta(search.snapshot(), search_before))
+                if pages:
+                    _add(page_total, _delta(pages.snapshot(), pages_before))
+
+            entry: Dict[str, Any] = {"completed": len(durations), "failed": failures, "llm": llm_total,
+                                     "search": search_total}
+            if pages:
+                entry["pages"] = page_total
+            if durations:
+                entry["run_seconds"] = {
+                    "p50": round(statistics.median(durations), 3),
+                    "p95": round(percentile(durations, 0.95), 3),
+                    "mean": round(statistics.mean(durations), 3),
+                    "max": round(max(durations), 3)
+                }
+            results["plan_sizes"][plan_size] = entry
+    finally:
+        llm.stop()
+        search.stop()
+        if pages:
+            pages.stop()
+    results["structured_output"] = STRUCTURED_OUTPUT_STATS.stats()
+    return results
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [f"Provider: {results['provider']}, {results['runs_per_size']} runs per plan size", ""]
+    header = (f"{'plan':>5} {'p50 s':>8} {'p95 s':>8} {'llm calls':>10} {'searches':>9} "
+              f"{'LLM KB sent':>11} {'tokens sent':>11} {'tokens recv':>11} {'search KB recv':>14}")
+    lines += [header, "-" * len(header)]
+    for plan_size, entry in results["plan_sizes"].items():
+        runs = max(1, entry["completed"] + entry["failed"])
+        timing = entry.get("run_seconds", {})
+        llm, search = entry["llm"], entry["search"]
+        lines.append(
+            f"{plan_size:>5} {timing.get('p50', float('nan')):>8.2f} {timing.get('p95', float('nan')):>8.2f} "
+            f"{llm.get('requests', 0) / runs:>10.1f} {search.get('requests', 0) / runs:>9.1f} "
+            f"{llm.get('bytes_in', 0) / runs / 1024:>11.1f} {llm.get('tokens_in', 0) / runs:>11.0f} "
+            f"{llm.get('tokens_out', 0) / runs:>11.0f} {search.get('bytes_out', 0) / runs / 1024:>14.1f}"
+        )
+    lines += ["", "Calls per run by agent method:"]
+    for plan_size, entry in results["plan_sizes"].items():
+        runs = max(1, entry["completed"] + entry["failed"])
+        calls = dict(entry["llm"].get("calls", {}), **entry["search"].get("calls", {}),
+                     **entry.get("pages", {}).get("calls", {}))
+        summary = ", ".join(f"{name}={count / runs:.1f}" for name, count in sorted(calls.items()))
+        lines.append(f"  plan size {plan_size}: {summary}")
+    lines += ["", "Structured replies by outcome:"]
+    for operation, counts in sorted(results.get("structured_output", {}).items()):
+        lines.append(f"  {operation}: " + ", ".join(f"{key}={value}" for key, value in counts.items()))
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the research pipeline against local stub servers")
+    parser.add_argument("--provider", choices=["openrouter", "gemini", "local"], default="openrouter")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per plan size")
+    parser.add_argument("--plan-sizes", default="3", help="Comma-separated items per plan section")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per stub response")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per stub search")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+    parser.add_argument("--payload-chars", type=int, default=1500, help="Characters per search result")
+    parser.add_argument("--report-chars", type=int, default=4000, help="Characters per generated report")
+    parser.add_argument("--search-fanout", action="store_true", help="Issue an item's searches concurrently")
+    parser.add_argument("--per-item-strategies", action="store_true",
+                        help="Plan each item's searches in its own LLM call instead of one call per round")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Search for still-unfulfilled items while progress is being evaluated")
+    parser.add_argument("--always-evaluate", action="store_true",
+                        help="Evaluate progress every round instead of only when the coverage estimate changes")
+    parser.add_argument("--fetch-pages", action="store_true",
+                        help="Fetch the full pages behind accepted search results from a page stub")
+    parser.add_argument("--json", help="Also write the raw measurements to this file")
+    args = parser.parse_args(argv)
+
+    plan_sizes = [int(size) for size in args.plan_sizes.split(",") if size.strip()]
+    llm_config = StubConfig(latency=args.llm_latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                            payload_chars=args.payload_chars, report_chars=args.report_chars)
+    search_config = StubConfig(**dict(vars(llm_config), latency=args.search_latency))
+    results = run_benchmark(args.provider, args.runs, plan_sizes, llm_config, args.search_fanout,
+                            search_config=search_config, batch_strategies=not args.per_item_strategies, pipelined=args.pipelined, fetch_pages=args.fetch_pages,
+                            coverage_gating=not args.always_evaluate)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def make_run_id(query: str, *config: Any) -> str:
+    """Deterministic run id for a query and the settings that shape its research"""
+    payload = json.dumps([" ".join(query.split()).lower(), *config], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def new_run_id() -> str:
+    """Fresh run id for a run that is not meant to resume an earlier one"""
+    return uuid.uuid4().hex
+
+class RunInProgressError(RuntimeError):
+    """Another run holds the lock on this run id"""
+
+class CheckpointStore:
+    """Directory of JSON run checkpoints with age and count based cleanup
+
+    Each run is stored as ``<run_id>.json`` and rewritten atomically, so a
+    crash mid-write leaves the previous checkpoint intact. Checkpoints older
+    than ``max_age_seconds`` are removed, and the oldest ones beyond
+    ``max_checkpoints`` are dropped, whenever cleanup() runs.
+
+    A run holds ``<run_id>.lock`` while it executes, so two runs with the
+    same id never resume or overwrite each other's state. Locks not
+    refreshed by a save for ``lock_timeout`` seconds are considered stale.
+    """
+
+    def __init__(self, directory: str = os.path.join("cache", "checkpoints"),
+                 max_age_seconds: Optional[float] = 3 * 24 * 3600,
+                 max_checkpoints: int = 200, lock_timeout: float = 3600):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.max_checkpoints = max_checkpoints
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str, suffix: str = ".json") -> str:
+        if not run_id or os.sep in run_id or "/" in run_id or run_id.startswith("."):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        return os.path.join(self.directory, f"{run_id}{suffix}")
+
+    def acquire(self, run_id: str) -> None:
+        """Take the lock for a run, raising RunInProgressError if another run holds it"""
+        path = self._path(run_id, ".lock")
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.path.getmtime(path) > self.lock_timeout
+                except FileNotFoundError:
+                    continue
+                if not stale:
+                    raise RunInProgressError(f"Run {run_id} is already in progress")
+                logger.warning(f"Removing stale lock for run {run_id}")
+                self.release(run_id)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return
+        raise RunInProgressError(f"Run {run_id} is already in progress")
+
+    def release(self, run_id: str) -> None:
+        try:
+            os.remove(self._path(run_id, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def save(self, run_id: str, data: Dict[str, Any]) -> None:
+        """Write the checkpoint for a run, replacing any previous one"""
+        path = self._path(run_id)
+        record = dict(data, run_id=run_id, updated_at=time.time())
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        try:
+            # Keep the run's lock fresh while it is making progress
+            os.utime(self._path(run_id, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Return the checkpoint for a run, or None if there is no usable one"""
+        path = self._path(run_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+            return None
+        if self._expired(record.get("updated_at", 0), time.time()):
+            self.delete(run_id)
+            return None
+        return record
+
+    def delete(self, run_id: str) -> None:
+        try:
+            os.remove(self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - updated_at > self.max_age_seconds
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored checkpoints, newest first"""
+        runs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            runs.append({
+                "run_id": record.get("run_id", name[:-len(".json")]),
+                "query": record.get("query"),
+                "stage": record.get("stage"),
+                "updated_at": record.get("updated_at", 0)
+            })
+        return sorted(runs, key=lambda run: run["updated_at"], reverse=True)
+
+    def cleanup(self) -> int:
+        """Remove expired checkpoints and the oldest ones over the count limit"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp") and now - os.path.getmtime(path) > 3600:
+                # Left behind by a crash during save()
+                os.remove(path)
+            elif name.endswith(".lock") and now - os.path.getmtime(path) > self.lock_timeout:
+                # Left behind by a run that died without releasing its lock
+                os.remove(path)
+            elif name.endswith(".json"):
+                entries.append((os.path.getmtime(path), path))
+        entries.sort(reverse=True)
+
+        removed = 0
+        for position, (mtime, path) in enumerate(entries):
+            if position >= self.max_checkpoints or self._expired(mtime, now):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info(f"Removed {removed} old research checkpoints")
+        return removed
+
+_default_store: Optional[CheckpointStore] = None
+_default_store_lock = threading.Lock()
+
+def get_default_checkpoint_store() -> Optional[CheckpointStore]:
+    """Return the process-wide checkpoint store configured from the environment
+
+    Set CHECKPOINT_DISABLED=1 to turn checkpointing off. CHECKPOINT_DIR,
+    CHECKPOINT_MAX_AGE_SECONDS and CHECKPOINT_MAX_FILES override the defaults.
+    """
+    global _default_store
+    if os.getenv("CHECKPOINT_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            try:
+                _default_store = CheckpointStore(
+                    directory=os.getenv("CHECKPOINT_DIR", os.path.join("cache", "checkpoints")),
+                    max_age_seconds=float(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", str(3 * 24 * 3600))),
+                    max_checkpoints=int(os.getenv("CHECKPOINT_MAX_FILES", "200"))
+                )
+                _default_store.cleanup()
+            except Exception as e:
+                logger.error(f"Failed to open checkpoint directory, continuing without it: {str(e)}")
+                return None
+        return _default_store
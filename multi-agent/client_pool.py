@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import ipaddress
+import contextvars
+import concurrent.futures
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import httpx
+import aiohttp
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from openai import OpenAI, AsyncOpenAI
+from search_client import AsyncTavilyClient, TAVILY_API_URL
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Endpoint overrides, e.g. for pointing the pipeline at local stand-in servers
+def openrouter_base_url() -> str:
+    return os.getenv("OPENROUTER_BASE_URL") or OPENROUTER_BASE_URL
+
+def tavily_base_url() -> str:
+    return os.getenv("TAVILY_API_URL") or TAVILY_API_URL
+
+def gemini_api_endpoint() -> Optional[str]:
+    return os.getenv("GEMINI_API_ENDPOINT") or None
+
+def credential_fingerprint(api_key: Optional[str]) -> str:
+    """Stable, non-reversible identifier for an API key, used in registry keys"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+class ClientRegistry:
+    """Thread-safe keyed registry of reusable objects with idle eviction
+
+    get() returns the existing object for a key or builds one with the
+    given factory. Objects unused for ``idle_timeout`` seconds are dropped
+    (and closed via their closer, if one was registered) on the next access.
+    """
+
+    def __init__(self, idle_timeout: float = 900):
+        self.idle_timeout = idle_timeout
+        self._entries: Dict[Hashable, list] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Hashable, factory: Callable[[], Any],
+            closer: Optional[Callable[[Any], None]] = None) -> Any:
+        now = time.monotonic()
+        self.evict_idle(now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = now
+                self.reused += 1
+                return entry[0]
+            obj = factory()
+            self._entries[key] = [obj, now, closer]
+            self.created += 1
+            return obj
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, (_, last_used, _) in self._entries.items()
+                if now - last_used > self.idle_timeout
+            ]
+            removed = [self._entries.pop(key) for key in expired]
+            self.evicted += len(removed)
+        for obj, _, closer in removed:
+            self._close(obj, closer)
+        return len(removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            removed = list(self._entries.values())
+            self._entries.clear()
+        for obj, _, closer in removed:
+            self._close(obj, closer)
+
+    @staticmethod
+    def _close(obj: Any, closer: Optional[Callable[[Any], None]]) -> None:
+        if closer is None:
+            return
+        try:
+            closer(obj)
+        except Exception as e:
+            logger.warning(f"Failed to close pooled client: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._entries)
+        return {"entries": size, "created": self.created, "reused": self.reused, "evicted": self.evicted}
+
+_registry = ClientRegistry()
+
+def get_registry() -> ClientRegistry:
+    return _registry
+
+def _async_closer(loop: asyncio.AbstractEventLoop) -> Callable[[Any], None]:
+    """Close an async client on the loop that owns it, if that loop is still alive"""
+    def close(client):
+        if loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+    return close
+
+def _openai_options(timeout: Optional[float], max_connections: Optional[int], http_client_class) -> Dict[str, Any]:
+    """Client options that differ from the OpenAI SDK defaults"""
+    options: Dict[str, Any] = {}
+    if timeout is not None:
+        options["timeout"] = timeout
+    if max_connections is not None:
+        options["http_client"] = http_client_class(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+    return options
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None, timeout: Optional[float] = None,
+                      max_connections: Optional[int] = None) -> OpenAI:
+    base_url = base_url or openrouter_base_url()
+    return _registry.get(
+        ("openai", credential_fingerprint(api_key), base_url, timeout, max_connections),
+        lambda: OpenAI(base_url=base_url, api_key=api_key,
+                       **_openai_options(timeout, max_connections, httpx.Client)),
+        closer=lambda client: client.close()
+    )
+
+def get_async_openai_client(api_key: str, base_url: Optional[str] = None, timeout: Optional[float] = None,
+                            max_connections: Optional[int] = None) -> AsyncOpenAI:
+    """Return a pooled AsyncOpenAI client for the running event loop"""
+    base_url = base_url or openrouter_base_url()
+    loop = asyncio.get_running_loop()
+    return _registry.get(
+        ("async-openai", credential_fingerprint(api_key), base_url, timeout, max_connections, loop),
+        lambda: AsyncOpenAI(base_url=base_url, api_key=api_key,
+                            **_openai_options(timeout, max_connections, httpx.AsyncClient)),
+        closer=_async_closer(loop)
+    )
+
+def get_async_tavily_client(api_key: str, base_url: Optional[str] = None) -> AsyncTavilyClient:
+    """Return a pooled AsyncTavilyClient for the running event loop"""
+    base_url = base_url or tavily_base_url()
+    loop = asyncio.get_running_loop()
+    return _registry.get(
+        ("async-tavily", credential_fingerprint(api_key), base_url, loop),
+        lambda: AsyncTavilyClient(api_key=api_key, base_url=base_url),
+        closer=_async_closer(loop)
+    )
+
+def is_public_address(host: str) -> bool:
+    """Whether an IP address is publicly routable (not loopback, private, link-local, ...)"""
+    try:
+        address = ipaddress.ip_address(host.split("%", 1)[0])
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+class PublicAddressResolver(aiohttp.abc.AbstractResolver):
+    """DNS resolver that drops non-public addresses, so fetched URLs cannot reach internal hosts
+
+    Filtering at resolution time also covers redirects and hosts whose DNS
+    changes between a check and the connection.
+    """
+
+    def __init__(self):
+        self._resolver = aiohttp.ThreadedResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: int = 0) -> List[Dict[str, Any]]:
+        addresses = [entry for entry in await self._resolver.resolve(host, port, family)
+                     if is_public_address(entry["host"])]
+        if not addresses:
+            raise OSError(f"{host} does not resolve to a public address")
+        return addresses
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+def get_async_page_session(limit: int, limit_per_host: int, user_agent: str,
+                           public_only: bool = True) -> aiohttp.ClientSession:
+    """Return a pooled aiohttp session for fetching web pages on the running event loop
+
+    With ``public_only`` the session only connects to public addresses.
+    """
+    loop = asyncio.get_running_loop()
+    return _registry.get(
+        ("page-session", limit, limit_per_host, user_agent, public_only, loop),
+        lambda: aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=limit, limit_per_host=limit_per_host,
+                resolver=PublicAddressResolver() if public_only else None
+            ),
+            headers={"User-Agent": user_agent}
+        ),
+        closer=_async_closer(loop)
+    )
+
+def gemini_uses_rest() -> bool:
+    """Whether Gemini calls go over REST to a custom endpoint instead of gRPC"""
+    return gemini_api_endpoint() is not None
+
+def _gemini_model(api_key: str, model_name: str, endpoint: Optional[str]) -> genai.GenerativeModel:
+    options = {"api_key": api_key}
+    if endpoint:
+        options["api_endpoint"] = endpoint
+    model = genai.GenerativeModel(model_name=model_name)
+    # The SDK would otherwise build these lazily from the process-wide genai.configure key
+    model._client = glm.GenerativeServiceClient(client_options=options, transport="rest" if endpoint else None)
+    if not endpoint:
+        model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+    return model
+
+def get_gemini_model(api_key: str, model_name: str) -> genai.GenerativeModel:
+    """Return a pooled GenerativeModel handle whose clients carry its own API key
+
+    genai.configure keeps one key for the whole process, so sessions with
+    different keys would send requests with each other's key. Each model
+    gets its own clients instead, with the key passed explicitly. A
+    GEMINI_API_ENDPOINT override switches them to the REST transport so a
+    plain HTTP server can stand in for the API.
+    """
+    endpoint = gemini_api_endpoint()
+    return _registry.get(
+        ("gemini", credential_fingerprint(api_key), endpoint, model_name),
+        lambda: _gemini_model(api_key, model_name, endpoint)
+    )
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _get_shared_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="research-event-loop", daemon=True
+            ).start()
+        return _loop
+
+def run_async(coro) -> Any:
+    """Run a coroutine on the shared background event loop and wait for its result
+
+    Keeping one long-lived loop lets pooled async clients reuse their
+    connections across requests; asyncio.run would create a fresh loop
+    (and fresh connection pools) for every call. The coroutine runs with a
+    copy of the caller's context variables, such as the active trace.
+    """
+    loop = _get_shared_loop()
+    context = contextvars.copy_context()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def on_done(task: asyncio.Task) -> None:
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def start() -> None:
+        # Tasks copy the context that is current when they are created
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(on_done)
+
+    loop.call_soon_threadsafe(start)
+    return result.result()
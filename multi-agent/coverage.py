@@ -0,0 +1,144 @@
+"""Local estimate of research coverage, used to skip unneeded progress evaluations
+
+CoverageEstimator keeps a term-document model of the plan items against
+the gathered results. A result supports an item when it is substantial
+and shares at least two of the item's content words with it, the same
+rule ResearchIndex uses for depth. An item counts as covered once enough
+results support it, and each progress aspect's coverage is the share of
+its items covered.
+
+The estimate decides whether evaluate_research_progress is worth calling:
+it is skipped while the coverage of the aspects the LLM still considers
+open has barely moved, and called as soon as one of them moves by
+``min_delta`` or crosses ``covered_threshold``.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+from agents import PROGRESS_ASPECTS
+from relevance import term_matrix
+from tracing import METRICS
+from utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+METRICS.describe("research_progress_evaluations_total", "counter",
+                 "Progress evaluation decisions by outcome (called, skipped)")
+
+class CoverageEstimator:
+    """Per-aspect coverage estimated from plan items and gathered results"""
+
+    def __init__(self, plan: Dict[str, List[str]], aspects=PROGRESS_ASPECTS,
+                 covered_threshold: float = 0.8, min_delta: float = 0.1, max_skips: int = 2,
+                 min_sources: int = 2, substantial_length: int = 300):
+        self.aspects = list(aspects)
+        # An aspect is estimated covered at this share of covered items
+        self.covered_threshold = covered_threshold
+        # Smallest coverage change that is worth a new evaluation
+        self.min_delta = min_delta
+        # Evaluate anyway after this many skips in a row
+        self.max_skips = max_skips
+        # Supporting results needed to cover an item, and shorter results never support one
+        self.min_sources = min_sources
+        self.substantial_length = substantial_length
+
+        items = [(aspect, list(dict.fromkeys(tokenize(str(item)))))
+                 for aspect in self.aspects for item in plan.get(aspect, []) or []]
+        self.vocabulary: Dict[str, int] = {}
+        for _, terms in items:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        # Item-term incidence, and how many shared terms a result needs to support each item
+        self.item_terms = np.zeros((len(items), len(self.vocabulary)), dtype=np.int32)
+        for row, (_, terms) in enumerate(items):
+            self.item_terms[row, [self.vocabulary[term] for term in terms]] = 1
+        self.required = np.minimum(self.item_terms.sum(axis=1), 2)
+        # Aspect-item membership, for averaging item coverage per aspect
+        self.aspect_items = np.array([[aspect == item_aspect for item_aspect, _ in items]
+                                      for aspect in self.aspects], dtype=float).reshape(len(self.aspects), len(items))
+        self.support = np.zeros(len(items), dtype=np.int64)
+        self.seen = 0
+
+        self.last_estimate: Optional[Dict[str, float]] = None
+        self.evaluations = 0
+        self.skipped = 0
+        self.consecutive_skips = 0
+        self.agreements = 0
+        self.comparisons = 0
+
+    def update(self, texts: List[str]) -> Dict[str, float]:
+        """Add the texts not seen yet (all gathered results, in arrival order) and return the estimate"""
+        new_texts = [text for text in texts[self.seen:] if len(text) > self.substantial_length]
+        self.seen = len(texts)
+        if new_texts and len(self.support):
+            present = (term_matrix([tokenize(text) for text in new_texts], self.vocabulary) > 0).astype(np.int32)
+            shared = present @ self.item_terms.T
+            self.support += (shared >= self.required).sum(axis=0)
+        return self.estimate()
+
+    def estimate(self) -> Dict[str, float]:
+        """Share of each aspect's items covered; aspects without items count as covered"""
+        item_coverage = np.minimum(self.support / self.min_sources, 1.0)
+        counts = self.aspect_items.sum(axis=1)
+        coverage = np.where(counts > 0, self.aspect_items @ item_coverage / np.maximum(counts, 1), 1.0)
+        return {aspect: round(float(value), 3) for aspect, value in zip(self.aspects, coverage)}
+
+    def needs_evaluation(self, estimate: Dict[str, float], progress: Dict[str, bool]) -> bool:
+        """Whether the estimate moved enough, for aspects not yet covered, to evaluate again"""
+        if self.last_estimate is None or self.consecutive_skips >= self.max_skips:
+            return True
+        for aspect, value in estimate.items():
+            if progress.get(aspect):
+                continue
+            previous = self.last_estimate.get(aspect, 0.0)
+            crossed = (value >= self.covered_threshold) != (previous >= self.covered_threshold)
+            if crossed or value - previous >= self.min_delta:
+                return True
+        return False
+
+    def record_skip(self) -> None:
+        self.skipped += 1
+        self.consecutive_skips += 1
+        METRICS.inc("research_progress_evaluations_total", outcome="skipped")
+
+    def record_evaluation(self, estimate: Dict[str, float], verdicts: Dict[str, bool]) -> None:
+        """Remember the estimate the LLM evaluated against and count where the two agreed"""
+        agreed = [
+            (estimate[aspect] >= self.covered_threshold) == bool(verdict)
+            for aspect, verdict in verdicts.items() if aspect in estimate
+        ]
+        self.agreements += sum(agreed)
+        self.comparisons += len(agreed)
+        self.last_estimate = dict(estimate)
+        self.evaluations += 1
+        self.consecutive_skips = 0
+        METRICS.inc("research_progress_evaluations_total", outcome="called")
+        logger.info(f"Coverage estimate {estimate} agreed with the LLM verdicts {verdicts} "
+                    f"on {sum(agreed)}/{len(agreed)} aspects")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "evaluations": self.evaluations,
+            "skipped": self.skipped,
+            "agreement_rate": round(self.agreements / self.comparisons, 3) if self.comparisons else None
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Support counts are rebuilt from the gathered results on resume
+        return {
+            "last_estimate": self.last_estimate,
+            "evaluations": self.evaluations,
+            "skipped": self.skipped,
+            "consecutive_skips": self.consecutive_skips,
+            "agreements": self.agreements,
+            "comparisons": self.comparisons
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Reload the state saved by to_dict"""
+        self.last_estimate = data.get("last_estimate")
+        self.evaluations = data.get("evaluations", 0)
+        self.skipped = data.get("skipped", 0)
+        self.consecutive_skips = data.get("consecutive_skips", 0)
+        self.agreements = data.get("agreements", 0)
+        self.comparisons = data.get("comparisons", 0)
@@ -0,0 +1,129 @@
+import re
+import hashlib
+from typing import Any, List, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ref", "ref_src", "referrer", "source", "spm", "_ga", "_hsenc", "_hsmi"
+})
+
+_ARXIV_PATH = re.compile(r"^/(?:abs|pdf|html)/([^/]+?)(?:v\d+)?(?:\.pdf)?/?$")
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so mirrors of the same page compare equal
+
+    Lowercases scheme and host, drops ``www.``, fragments, tracking
+    parameters and trailing slashes, sorts the remaining query parameters
+    and maps arXiv abs/pdf/html variants onto the abs page.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path or "/"
+
+    if host in ("arxiv.org", "export.arxiv.org"):
+        match = _ARXIV_PATH.match(path)
+        if match:
+            return f"https://arxiv.org/abs/{match.group(1)}"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    if len(path) > 1:
+        path = path.rstrip("/")
+    scheme = "https" if parts.scheme in ("http", "https", "") else parts.scheme.lower()
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles of a text"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+class NearDuplicateIndex:
+    """Rejects texts whose SimHash is within a similarity threshold of one already seen
+
+    Similarity is ``1 - hamming_distance / 64``, so a threshold of 0.9
+    accepts fingerprints differing in up to 6 bits as duplicates.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        if not 0 < threshold <= 1:
+            raise ValueError("Near-duplicate threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.max_distance = int(round((1 - threshold) * 64))
+        self.fingerprints: List[int] = []
+
+    def find(self, text: str) -> Optional[int]:
+        """Return the position of a near-duplicate of text, or None"""
+        fingerprint = simhash(text)
+        for position, other in enumerate(self.fingerprints):
+            if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                return position
+        return None
+
+    def add(self, text: str) -> int:
+        self.fingerprints.append(simhash(text))
+        return len(self.fingerprints) - 1
+
+class DuplicateFilter:
+    """Canonical-URL and content-fingerprint dedup for one research run"""
+
+    def __init__(self, near_duplicate_threshold: Optional[float] = 0.9):
+        self.seen_urls = set()
+        self.content_index = (
+            NearDuplicateIndex(near_duplicate_threshold) if near_duplicate_threshold else None
+        )
+        self.rejected = {"url": 0, "near_duplicate": 0}
+
+    def accept(self, url: str, content: str) -> bool:
+        """Record the result and return True unless it duplicates an accepted one"""
+        canonical = canonicalize_url(url)
+        if canonical in self.seen_urls:
+            self.rejected["url"] += 1
+            return False
+        if self.content_index is not None:
+            if self.content_index.find(content) is not None:
+                self.rejected["near_duplicate"] += 1
+                return False
+            self.content_index.add(content)
+        self.seen_urls.add(canonical)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.rejected)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seen_urls": sorted(self.seen_urls),
+            "fingerprints": list(self.content_index.fingerprints) if self.content_index else [],
+            "rejected": dict(self.rejected)
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Reload the state saved by to_dict"""
+        self.seen_urls = set(data.get("seen_urls", []))
+        if self.content_index is not None:
+            self.content_index.fingerprints = [int(value) for value in data.get("fingerprints", [])]
+        self.rejected.update(data.get("rejected", {}))
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class DiskLRUCache:
+    """SQLite-backed string cache with LRU eviction and a TTL
+
+    The cache holds at most ``max_entries`` rows, evicting the least
+    recently used ones, and entries older than ``ttl_seconds`` are
+    treated as misses.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        """Store a value and evict least recently used entries over the size limit"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": size,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class LLMResponseCache(DiskLRUCache):
+    """Disk-backed LRU cache for LLM completions
+
+    Entries are keyed on a hash of everything that determines the
+    completion: provider, model, system prompt, prompt and temperature.
+    """
+
+    def __init__(self, path: str = os.path.join("cache", "llm_cache.sqlite"),
+                 max_entries: int = 5000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        super().__init__(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: str, prompt: str, temperature: float) -> str:
+        """Build the cache key for a completion request"""
+        payload = json.dumps([provider, model, system_prompt, prompt, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide cache configured from the environment
+
+    Set LLM_CACHE_DISABLED=1 to turn caching off. LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ENTRIES and LLM_CACHE_TTL_SECONDS override the defaults.
+    """
+    global _default_cache
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = LLMResponseCache(
+                    path=os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite")),
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+                )
+            except Exception as e:
+                logger.error(f"Failed to open LLM cache, continuing without it: {str(e)}")
+                return None
+        return _default_cache
@@ -1,16 +1,22 @@
 import os
 import json
-import logging
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import deque
 from datetime import datetime
 import gradio as gr
 import google.generativeai as genai
 from tavily import TavilyClient
 from dotenv import load_dotenv
 from logger_config import setup_logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Callable
 from utils import (
     validate_response, 
     parse_research_results, 
+    source_text,
     format_sources_section, 
     save_markdown_report, 
     convert_to_html
@@ -28,40 +34,228 @@ class MCPServer:
         """Create the Gradio interface"""
         raise NotImplementedError("Subclasses must implement create_interface")
 
-from agents import OrchestratorAgent, PlannerAgent, ReportAgent
+from agents import OrchestratorAgent, PlannerAgent, ReportAgent, IncrementalProgressEvaluator
+from search_client import AsyncTavilyClient
+from llm_cache import LLMResponseCache, get_default_llm_cache
+from search_cache import SearchResultCache, get_default_search_cache
+from research_index import ResearchIndex
+from dedup import DuplicateFilter, canonicalize_url
+from progress_events import ProgressBus, RunCancelled
+from checkpoint import CheckpointStore, get_default_checkpoint_store, make_run_id, new_run_id
+from client_pool import ClientRegistry, credential_fingerprint, get_async_tavily_client, run_async
+from rate_limit import get_rate_limiter, call_with_retry, call_with_retry_async, throttle_stats
+from usage import RunBudget, summarize_usage
+from providers import LLMProvider, agent_providers_from_env
+from page_fetcher import PageFetcher, get_default_page_fetcher
+from relevance import RelevanceScorer, get_default_relevance_scorer
+from coverage import CoverageEstimator
+from tracing import METRICS, Trace, activate, span, annotate, traced, current_trace, finish_trace, start_metrics_server
 
 # Set up logging
 loggers = setup_logging()
 server_logger = loggers['server']
 
+class SpeculationTally:
+    """Searches and rejections of one speculative item task, applied only if the item is adopted"""
+
+    def __init__(self):
+        self.searches = 0
+        # Fan-out searches whose results the item did not need
+        self.unused_searches = 0
+        self.rejected = {"off_topic": 0, "url": 0}
+
+# Tally of the current speculative item task, so its searches can be handed
+# back and its rejection counts dropped if the item turns out not to be needed
+_speculation_tally: contextvars.ContextVar[Optional[SpeculationTally]] = contextvars.ContextVar(
+    "speculation_tally", default=None
+)
+
+class SpeculativeRound:
+    """Research started for a round's likely items before evaluation confirms them"""
+
+    def __init__(self, planning: asyncio.Future):
+        # Search strategies for all speculated items
+        self.planning = planning
+        # (item_type, research_item) -> (task, SpeculationTally of the task)
+        self.items: Dict[tuple, tuple] = {}
+
+    def reserved(self) -> int:
+        return sum(tally.searches for _, tally in self.items.values())
+
+class ResearchState:
+    """Mutable bookkeeping for a single process_query run"""
+
+    def __init__(self, query: str, near_duplicate_threshold: Optional[float] = 0.9):
+        self.query = query
+        self.research_plan: Dict[str, List[str]] = {}
+        self.all_search_results: List[Dict[str, Any]] = []
+        self.search_count = 0
+        # Track canonical URLs and content fingerprints to avoid duplicates
+        self.duplicates = DuplicateFilter(near_duplicate_threshold)
+        # Word index over gathered content, updated as results arrive
+        self.index = ResearchIndex()
+        # Track research attempts for each item to prevent loops
+        self.research_attempts: Dict[str, int] = {}
+        self.progress: Dict[str, bool] = {}
+        self.progress_evaluator: Optional[IncrementalProgressEvaluator] = None
+        self.coverage: Optional[CoverageEstimator] = None
+        # Searches whose results were discarded: fan-out searches started for an item
+        # that was satisfied first, and pipelined searches for items evaluation dropped
+        self.speculative_searches = 0
+        # Pipelined research running ahead of the current evaluation
+        self.speculation: Optional[SpeculativeRound] = None
+        self.search_cache_hits = 0
+        self.search_cache_misses = 0
+        # Results dropped by the relevance scorer
+        self.off_topic_rejected = 0
+        # Concurrency limits for the run (not part of the research record)
+        self.item_semaphore: Optional[asyncio.Semaphore] = None
+        self.search_semaphore: Optional[asyncio.Semaphore] = None
+        # Per-request progress channel for the UI, if any
+        self.events: Optional[ProgressBus] = None
+        # Checkpoint id and the last stage checkpointed
+        self.run_id: Optional[str] = None
+        self.stage: Optional[str] = None
+        # Spans recorded for this run, if tracing is active
+        self.trace: Optional[Trace] = None
+        # Usage of the run before it was resumed from a checkpoint
+        self.prior_usage: Optional[Dict[str, Any]] = None
+        # Budget bookkeeping: effective search cap and why research stopped early, if it did
+        self.started_at = time.monotonic()
+        self.max_searches = MultiAgentSystem.MAX_SEARCHES_TOTAL
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def seen_urls(self) -> set:
+        return self.duplicates.seen_urls
+
+    def usage(self) -> Dict[str, Any]:
+        """Usage of the whole run, including any time before it was resumed"""
+        return summarize_usage(self.trace, self.prior_usage)
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """Serializable snapshot of everything a resumed run needs"""
+        return {
+            "query": self.query,
+            "stage": self.stage,
+            "research_plan": self.research_plan,
+            "all_search_results": self.all_search_results,
+            # Speculative searches still in flight are not part of the record yet
+            "search_count": self.search_count - (self.speculation.reserved() if self.speculation else 0),
+            "research_attempts": self.research_attempts,
+            "progress": self.progress,
+            "duplicates": self.duplicates.to_dict(),
+            "speculative_searches": self.speculative_searches,
+            "search_cache_hits": self.search_cache_hits,
+            "search_cache_misses": self.search_cache_misses,
+            "off_topic_rejected": self.off_topic_rejected,
+            # Budgets count from the start of the first attempt, not the resume
+            "usage": self.usage(),
+            "elapsed_seconds": time.monotonic() - self.started_at,
+            "progress_evaluator": self.progress_evaluator.to_dict() if self.progress_evaluator else None,
+            "coverage": self.coverage.to_dict() if self.coverage else None
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Reload a snapshot taken by to_checkpoint (the progress evaluator and coverage are restored separately)"""
+        self.stage = data.get("stage")
+        self.research_plan = data.get("research_plan") or {}
+        self.all_search_results = data.get("all_search_results", [])
+        self.search_count = data.get("search_count", 0)
+        self.research_attempts = data.get("research_attempts", {})
+        self.progress = data.get("progress", {})
+        self.duplicates.restore(data.get("duplicates", {}))
+        self.index.extend(source_text(r) for r in self.all_search_results)
+        self.speculative_searches = data.get("speculative_searches", 0)
+        self.search_cache_hits = data.get("search_cache_hits", 0)
+        self.search_cache_misses = data.get("search_cache_misses", 0)
+        self.off_topic_rejected = data.get("off_topic_rejected", 0)
+        self.prior_usage = data.get("usage")
+        self.started_at = time.monotonic() - data.get("elapsed_seconds", 0)
+
 class MultiAgentSystem:
+    MAX_SEARCHES_TOTAL = 30  # Total search limit
+    MIN_RESULTS_PER_ITEM = 3  # Minimum results before checking progress
+    MAX_ATTEMPTS_PER_ITEM = 2  # Maximum attempts to research each item
+    SEARCH_DEPTH = "advanced"  # Only 'basic' or 'advanced' are allowed
+    SEARCH_MAX_RESULTS = 5  # Limit results to keep responses focused
+
     def __init__(self, use_gemini=True, gemini_api_key=None, gemini_model=None, 
-                 tavily_api_key=None, openrouter_api_key=None, openrouter_model=None):
+                 tavily_api_key=None, openrouter_api_key=None, openrouter_model=None,
+                 max_concurrency=4, search_fanout=False, max_concurrent_searches=4,
+                 llm_cache: Optional[LLMResponseCache] = None,
+                 search_cache: Optional[SearchResultCache] = None,
+                 incremental_evaluation=True, report_token_budget=None, batch_strategies=True,
+                 pipelined=False, coverage_gating=True,
+                 near_duplicate_threshold=0.9,
+                 checkpoint_store: Optional[CheckpointStore] = None,
+                 budget: Optional[RunBudget] = None,
+                 agent_backends: Optional[Dict[str, LLMProvider]] = None,
+                 page_fetcher: Optional[PageFetcher] = None,
+                 relevance_scorer: Optional[RelevanceScorer] = None):
         self.use_gemini = use_gemini
         self.gemini_api_key = gemini_api_key
         self.gemini_model = gemini_model
         self.tavily_api_key = tavily_api_key
         self.openrouter_api_key = openrouter_api_key
         self.openrouter_model = openrouter_model
+        # Identifies the keys behind a checkpoint, so a run is only resumed with the keys that started it
+        self.owner = credential_fingerprint(json.dumps([tavily_api_key, gemini_api_key, openrouter_api_key]))
+        # Maximum number of plan items researched at the same time
+        self.max_concurrency = max(1, int(max_concurrency))
+        # Issue all queries of an item at once instead of one after another
+        self.search_fanout = search_fanout
+        # Maximum number of Tavily requests in flight for one run
+        self.max_concurrent_searches = max(1, int(max_concurrent_searches))
+        self.llm_cache = llm_cache
+        self.search_cache = search_cache
+        # Only send new results (plus digests of old ones) to evaluate_research_progress
+        self.incremental_evaluation = incremental_evaluation
+        # Plan the search queries for all items of a round in one LLM call
+        self.batch_strategies = batch_strategies
+        # Start the next round's searches while its evaluation is still running
+        self.pipelined = pipelined
+        # Skip evaluate_research_progress while the local coverage estimate barely changes
+        self.coverage_gating = coverage_gating
+        # SimHash similarity above which a result counts as a near-duplicate (None disables)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        # Save run state after each stage so failed runs can be resumed
+        self.checkpoint_store = checkpoint_store
+        # Token, search and time limits after which research stops early
+        self.budget = budget
+        # Backends for individual agents ("orchestrator", "planner", "report"),
+        # e.g. a local model for the frequent planning and evaluation calls
+        self.agent_backends = agent_backends or {}
+        # Fetch the full pages behind accepted results (None keeps search snippets only)
+        self.page_fetcher = page_fetcher
+        # Scores each batch of results against its research item to drop off-topic ones
+        self.relevance_scorer = relevance_scorer or RelevanceScorer()
 
         # Initialize agents
         self.orchestrator = OrchestratorAgent(
             use_gemini=use_gemini, 
             api_key=gemini_api_key if use_gemini else openrouter_api_key,
             openrouter_model=openrouter_model,
-            gemini_model=gemini_model
+            gemini_model=gemini_model,
+            cache=llm_cache,
+            backend=self.agent_backends.get("orchestrator")
         )
         self.planner = PlannerAgent(
             use_gemini=use_gemini, 
             api_key=gemini_api_key if use_gemini else openrouter_api_key,
             openrouter_model=openrouter_model,
-            gemini_model=gemini_model
+            gemini_model=gemini_model,
+            cache=llm_cache,
+            backend=self.agent_backends.get("planner")
         )
         self.report_agent = ReportAgent(
             use_gemini=use_gemini, 
             api_key=gemini_api_key if use_gemini else openrouter_api_key,
             openrouter_model=openrouter_model,
-            gemini_model=gemini_model
+            gemini_model=gemini_model,
+            cache=llm_cache,
+            context_token_budget=report_token_budget,
+            backend=self.agent_backends.get("report")
         )
 
         # Initialize Tavily client
@@ -70,150 +264,989 @@ class MultiAgentSystem:
         else:
             self.tavily_client = None
 
+    def _emit(self, state: ResearchState, stage: str, message: str,
+              duration: Optional[float] = None, **counts) -> None:
+        """Log a progress message and forward it to the run's progress bus
+
+        Raises RunCancelled once the bus's consumer has cancelled the run.
+        """
+        if state.events is not None and state.events.cancelled:
+            raise RunCancelled("Research run was cancelled")
+        server_logger.info(message)
+        if state.events is not None:
+            state.events.emit(stage, message, duration=duration, **counts)
+
+    def run_id_for(self, query: str, *scope: str) -> str:
+        """Stable run id for a query within a caller-chosen scope, such as a batch and item
+
+        Passing it as ``run_id`` makes a rerun resume the earlier run. Runs
+        without an explicit id get a fresh one and never resume.
+        """
+        overrides = [(role, backend.cache_namespace, backend.model)
+                     for role, backend in sorted(self.agent_backends.items())]
+        return make_run_id(
+            query, self.use_gemini, self.gemini_model if self.use_gemini else self.openrouter_model,
+            self.MAX_SEARCHES_TOTAL, self._search_params(), self.owner, *overrides, *scope
+        )
+
+    @contextmanager
+    def _run_lock(self, run_id: str):
+        """Hold the checkpoint lock for a run so no other run with its id can start"""
+        if not self.checkpoint_store:
+            yield
+            return
+        self.checkpoint_store.acquire(run_id)
+        try:
+            yield
+        finally:
+            self.checkpoint_store.release(run_id)
+
+    def _checkpoint(self, state: ResearchState, stage: str) -> None:
+        """Record that a stage finished and persist the run state if checkpointing is on"""
+        state.stage = stage
+        if not self.checkpoint_store or not state.run_id:
+            return
+        try:
+            self.checkpoint_store.save(state.run_id, dict(state.to_checkpoint(), owner=self.owner))
+        except Exception as e:
+            # Checkpoints only save work on failure; never fail a run because of them
+            server_logger.warning(f"Failed to save checkpoint for run {state.run_id}: {str(e)}")
+
+    def _load_checkpoint(self, query: str, run_id: str) -> Optional[Dict[str, Any]]:
+        if not self.checkpoint_store:
+            return None
+        checkpoint = self.checkpoint_store.load(run_id)
+        if checkpoint and checkpoint.get("query") != query:
+            server_logger.warning(f"Checkpoint {run_id} belongs to a different query, starting over")
+            return None
+        if checkpoint and checkpoint.get("owner") != self.owner:
+            server_logger.warning(f"Checkpoint {run_id} was made with other API keys, starting over")
+            return None
+        return checkpoint
+
+    def _finish_run(self, state: ResearchState) -> None:
+        """Drop the checkpoint of a successful run and prune old ones"""
+        if not self.checkpoint_store or not state.run_id:
+            return
+        try:
+            self.checkpoint_store.delete(state.run_id)
+            self.checkpoint_store.cleanup()
+        except Exception as e:
+            server_logger.warning(f"Failed to clean up checkpoints: {str(e)}")
+
+    def _budget_exceeded(self, state: ResearchState) -> bool:
+        """Check the run budget, recording and announcing the first limit reached"""
+        if state.stop_reason:
+            return True
+        if not self.budget:
+            return False
+        # Speculative searches may still be handed back, so they cannot end the run
+        searches = state.search_count - (state.speculation.reserved() if state.speculation else 0)
+        reason = self.budget.exceeded(state.usage(), searches, state.started_at)
+        if reason:
+            state.stop_reason = reason
+            self._emit(state, "budget", f"Stopping research early: {reason}")
+        return reason is not None
+
+    def _search_params(self) -> Dict[str, Any]:
+        return {"search_depth": self.SEARCH_DEPTH, "max_results": self.SEARCH_MAX_RESULTS}
+
+    @traced("web_search")
     def web_search(self, query: str) -> List[Dict[str, str]]:
         """Perform web search using Tavily"""
         if not self.tavily_client:
             raise ValueError("Tavily API key not provided")
         
+        annotate(query_chars=len(query), search_depth=self.SEARCH_DEPTH)
+        if self.search_cache:
+            cached = self.search_cache.get(query, **self._search_params())
+            annotate(cache_hit=cached is not None)
+            if cached is not None:
+                annotate(results=len(cached))
+                return cached
+        
         try:
-            response = self.tavily_client.search(
-                query, 
-                search_depth="advanced",  # Only 'basic' or 'advanced' are allowed
-                max_results=5,  # Limit results to keep responses focused
-                async_search=True,  # Use async search for better performance
-                timeout=30  # 30 second timeout
+            response = call_with_retry(
+                lambda: self.tavily_client.search(
+                    query, 
+                    search_depth=self.SEARCH_DEPTH,
+                    max_results=self.SEARCH_MAX_RESULTS,
+                    async_search=True,  # Use async search for better performance
+                    timeout=30  # 30 second timeout
+                ),
+                get_rate_limiter("tavily", self.tavily_api_key),
+                "Tavily search"
             )
-            return response.get('results', [])
+            results = response.get('results', [])
+            annotate(results=len(results))
+            if self.search_cache:
+                self.search_cache.set(query, results, **self._search_params())
+            return results
         except Exception as e:
             server_logger.error(f"Web search failed: {str(e)}")
             raise  # Re-raise the exception to handle it in the calling code
     
-    def process_query(self, query: str) -> str:
-        """Process a research query using the multi-agent system"""
+    async def web_search_async(self, query: str, search_client: AsyncTavilyClient) -> List[Dict[str, str]]:
+        """Perform web search using Tavily without blocking the event loop"""
         try:
-            # Step 1: Create a structured research plan
-            server_logger.info("Creating research plan...")
-            research_plan = self.orchestrator.create_research_plan(query)
-            server_logger.info(f"Generated research plan: {json.dumps(research_plan, indent=2)}")
+            response = await call_with_retry_async(
+                lambda: search_client.search(query, **self._search_params()),
+                get_rate_limiter("tavily", self.tavily_api_key),
+                "Tavily search"
+            )
+            return response.get('results', [])
+        except Exception as e:
+            server_logger.error(f"Web search failed: {str(e)}")
+            raise
+
+    @staticmethod
+    def _count_rejection(state: ResearchState, kind: str, count: int = 1) -> None:
+        """Record rejected results, holding them back while the current item is speculative"""
+        tally = _speculation_tally.get()
+        if tally is not None:
+            tally.rejected[kind] += count
+        elif kind == "off_topic":
+            state.off_topic_rejected += count
+        else:
+            state.duplicates.rejected[kind] += count
+
+    def _filter_results(self, state: ResearchState, results: List[Dict[str, Any]], research_item: str,
+                        seen_urls: set) -> List[Dict[str, Any]]:
+        """Drop duplicate, short and off-topic results, recording accepted canonical URLs in seen_urls"""
+        candidates = []
+        for result in results:
+            url = result.get('url')
+            content = result.get('content', '').strip()
+            
+            # Skip if URL missing or content too short
+            if not url or len(content) < 100:
+                continue
+            if canonicalize_url(url) in seen_urls:
+                self._count_rejection(state, "url")
+                continue
+            candidates.append(result)
+        if not candidates:
+            return []
             
-            # Step 2: Initialize research process
-            all_search_results = []
-            MAX_SEARCHES_TOTAL = 30  # Total search limit
-            MIN_RESULTS_PER_ITEM = 3  # Minimum results before checking progress
-            MAX_ATTEMPTS_PER_ITEM = 2  # Maximum attempts to research each item
-            search_count = 0
-            seen_urls = set()  # Track seen URLs to avoid duplicates
+        # Score the batch against the research item and keep what is on topic
+        scores = self.relevance_scorer.score_results(research_item, candidates)
+        accepted_mask = self.relevance_scorer.accepts(scores)
+        accepted = []
+        for result, score, relevant in zip(candidates, scores, accepted_mask):
+            if not relevant:
+                self._count_rejection(state, "off_topic")
+                continue
+            canonical = canonicalize_url(result['url'])
+            if canonical in seen_urls:
+                self._count_rejection(state, "url")
+                continue
+            seen_urls.add(canonical)
+            # Copy rather than annotate in place: results may be shared with the search cache
+            accepted.append(dict(result, relevance_score=round(float(score), 4)))
+        return accepted
+
+    async def _fetch_pages(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attach full page text to accepted results when page fetching is on"""
+        if not self.page_fetcher or not results:
+            return results
+        return await self.page_fetcher.enrich(results)
+
+    def _item_satisfied(self, item_results: List[Dict[str, Any]]) -> bool:
+        """Check if we have enough detailed results for an item"""
+        return len(item_results) >= self.MIN_RESULTS_PER_ITEM and all(
+            len(source_text(r)) > 200 for r in item_results
+        )
+
+    @traced("web_search")
+    async def _run_search(self, state: ResearchState, query_str: str,
+                          search_client: AsyncTavilyClient) -> List[Dict[str, str]]:
+        annotate(query_chars=len(query_str), search_depth=self.SEARCH_DEPTH)
+        if self.search_cache:
+            cached = self.search_cache.get(query_str, **self._search_params())
+            annotate(cache_hit=cached is not None)
+            if cached is not None:
+                state.search_cache_hits += 1
+                annotate(results=len(cached))
+                self._emit(state, "searching", f"Search cache hit for: {query_str}",
+                           searches=state.search_count)
+                return cached
+            state.search_cache_misses += 1
+        
+        queued = time.monotonic()
+        async with state.search_semaphore:
+            annotate(wait_seconds=round(time.monotonic() - queued, 4))
+            self._emit(state, "searching", f"Searching for: {query_str}",
+                       searches=state.search_count, max_searches=state.max_searches)
+            started = time.monotonic()
+            results = await self.web_search_async(query_str, search_client)
+            annotate(results=len(results), response_chars=sum(len(r.get('content', '')) for r in results))
+            if state.events is not None:
+                state.events.emit("searching", f"Got {len(results)} results for: {query_str}",
+                                  duration=time.monotonic() - started)
+        if self.search_cache:
+            self.search_cache.set(query_str, results, **self._search_params())
+        return results
+
+    @staticmethod
+    def _reserve_searches(state: ResearchState, count: int) -> None:
+        state.search_count += count
+        tally = _speculation_tally.get()
+        if tally is not None:
+            tally.searches += count
+
+    async def _search_sequential(self, state: ResearchState, research_item: str, query_strs: List[str],
+                                 search_client: AsyncTavilyClient, seen_urls: set) -> List[Dict[str, Any]]:
+        item_results = []
+        for query_str in query_strs:
+            if state.search_count >= state.max_searches or self._budget_exceeded(state):
+                break
             
-            # Track research attempts for each item to prevent loops
-            research_attempts = {}
+            # Reserve the search before awaiting it so concurrent items
+            # cannot overshoot MAX_SEARCHES_TOTAL
+            self._reserve_searches(state, 1)
+            results = await self._run_search(state, query_str, search_client)
+            item_results.extend(await self._fetch_pages(self._filter_results(state, results, research_item, seen_urls)))
             
-            # Step 3: Conduct initial research
-            while search_count < MAX_SEARCHES_TOTAL:
-                # Evaluate current progress
-                current_results = [r['content'] for r in all_search_results]
-                progress = self.orchestrator.evaluate_research_progress(research_plan, current_results)
-                
-                # Check if we have completed all aspects
-                if all(progress.values()):
-                    server_logger.info("Research complete - all aspects covered with sufficient depth")
-                    break
-                
-                # Get prioritized list of unfulfilled research needs
-                remaining_items = self.planner.prioritize_unfulfilled_requirements(
-                    research_plan, 
-                    progress,
-                    current_results
-                )
-                
-                if not remaining_items:
+            if self._item_satisfied(item_results):
+                break
+        return item_results
+
+    async def _search_fanout(self, state: ResearchState, research_item: str, query_strs: List[str],
+                             search_client: AsyncTavilyClient, seen_urls: set) -> List[Dict[str, Any]]:
+        """Issue all queries of an item at once and merge them as the sequential path would
+
+        Every issued search counts toward the run's search total, including
+        the ones cancelled or ignored because the item was satisfied first.
+        """
+        if self._budget_exceeded(state):
+            return []
+        allowed = query_strs[:max(0, state.max_searches - state.search_count)]
+        if not allowed:
+            return []
+        
+        self._reserve_searches(state, len(allowed))
+        tasks = [
+            asyncio.create_task(self._run_search(state, query_str, search_client))
+            for query_str in allowed
+        ]
+        # Merge in query order and stop where the sequential loop would have,
+        # so dedup, rejection counts and page fetches match it
+        item_results = []
+        consumed = 0
+        try:
+            for task in tasks:
+                results = await task
+                consumed += 1
+                item_results.extend(await self._fetch_pages(self._filter_results(state, results, research_item, seen_urls)))
+                if self._item_satisfied(item_results):
                     break
-                
-                # Research each remaining item
-                for item_type, research_item in remaining_items:
-                    # Check if we've exceeded attempts for this item
-                    item_key = f"{item_type}:{research_item}"
-                    if research_attempts.get(item_key, 0) >= MAX_ATTEMPTS_PER_ITEM:
-                        server_logger.info(f"Reached maximum attempts for {item_key}")
-                        continue
-                    
-                    if search_count >= MAX_SEARCHES_TOTAL:
-                        server_logger.info(f"Reached maximum total searches ({MAX_SEARCHES_TOTAL})")
-                        break
-                    
-                    server_logger.info(f"Researching {item_type}: {research_item}")
-                    search_queries = self.planner.create_search_strategy(research_item, item_type)
-                    
-                    # Track this research attempt
-                    research_attempts[item_key] = research_attempts.get(item_key, 0) + 1
-                    
-                    # Conduct searches for this item
-                    item_results = []
-                    for search_query in search_queries:
-                        if search_count >= MAX_SEARCHES_TOTAL:
-                            break
-                        
-                        # Ensure search query is a simple string
-                        query_str = str(search_query).strip()
-                        if not query_str:
-                            continue
-                        
-                        server_logger.info(f"Searching for: {query_str}")
-                        results = self.web_search(query_str)
-                        
-                        # Deduplicate and filter results
-                        new_results = []
-                        for result in results:
-                            url = result.get('url')
-                            content = result.get('content', '').strip()
-                            
-                            # Skip if URL seen or content too short
-                            if not url or url in seen_urls or len(content) < 100:
-                                continue
-                                
-                            # Check if content is relevant to the research item
-                            if any(keyword.lower() in content.lower() 
-                                  for keyword in research_item.lower().split()):
-                                seen_urls.add(url)
-                                new_results.append(result)
-                        
-                        item_results.extend(new_results)
-                        search_count += 1
-                        
-                        # Check if we have enough detailed results for this item
-                        if len(item_results) >= MIN_RESULTS_PER_ITEM and all(
-                            len(r.get('content', '')) > 200 for r in item_results
-                        ):
-                            break
-                    
-                    all_search_results.extend(item_results)
+        finally:
+            # Searches still queued or in flight are no longer needed
+            for task in tasks[consumed:]:
+                task.cancel()
+            await asyncio.gather(*tasks[consumed:], return_exceptions=True)
+        
+        unused = len(allowed) - consumed
+        tally = _speculation_tally.get()
+        if tally is not None:
+            # A discarded item's searches are all counted as speculative when it is dropped
+            tally.unused_searches += unused
+        else:
+            state.speculative_searches += unused
+        return item_results
+
+    async def _research_item(self, state: ResearchState, item_type: str, research_item: str,
+                             search_client: AsyncTavilyClient,
+                             search_queries: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Run the searches for one plan item, planning them first unless already planned"""
+        async with state.item_semaphore:
+            if state.search_count >= state.max_searches or self._budget_exceeded(state):
+                return []
+
+            self._emit(state, "researching", f"Researching {item_type}: {research_item}")
+            if search_queries is None:
+                search_queries = await self.planner.create_search_strategy_async(research_item, item_type)
             
-            # Step 4: Generate final report
-            server_logger.info("Generating final report...")
-            contexts, sources = parse_research_results(all_search_results)
+            # Ensure search queries are simple strings
+            query_strs = [q for q in (str(sq).strip() for sq in search_queries) if q]
+
+            # Other items run concurrently, so only dedup against URLs accepted
+            # before this round; cross-item dedup happens when results are merged.
+            item_seen_urls = set(state.seen_urls)
+            if self.search_fanout:
+                return await self._search_fanout(state, research_item, query_strs, search_client, item_seen_urls)
+            return await self._search_sequential(state, research_item, query_strs, search_client, item_seen_urls)
+
+    async def _evaluate_progress(self, state: ResearchState, current_results: List[str]) -> None:
+        self._emit(state, "evaluating", "Evaluating research progress...",
+                   sources=len(current_results), searches=state.search_count)
+        started = time.monotonic()
+        estimate = state.coverage.update(current_results) if state.coverage else None
+        if estimate is not None and state.progress and not state.coverage.needs_evaluation(estimate, state.progress):
+            # Nothing that could change a verdict arrived; keep the previous ones
+            state.coverage.record_skip()
+            self._emit(state, "evaluating", f"Skipped evaluation, coverage estimate barely changed: {json.dumps(estimate)}",
+                       duration=time.monotonic() - started)
+            self._checkpoint(state, "evaluated")
+            return
+        if state.progress_evaluator:
+            state.progress = await state.progress_evaluator.evaluate_async(
+                state.research_plan, current_results
+            )
+        else:
+            state.progress = await self.orchestrator.evaluate_research_progress_async(
+                state.research_plan, current_results
+            )
+        if estimate is not None:
+            state.coverage.record_evaluation(estimate, state.progress)
+        if state.events is not None:
+            covered = sum(1 for value in state.progress.values() if value)
+            state.events.emit("evaluating", f"Coverage: {json.dumps(state.progress)}",
+                              duration=time.monotonic() - started,
+                              covered=f"{covered}/{len(state.progress)}")
+        self._checkpoint(state, "evaluated")
+
+    def _select_items(self, state: ResearchState, remaining_items: List[tuple],
+                      record: bool = True) -> List[tuple]:
+        """Skip items we have already researched too often, counting an attempt for the rest"""
+        batch = []
+        for item_type, research_item in remaining_items:
+            item_key = f"{item_type}:{research_item}"
+            if state.research_attempts.get(item_key, 0) >= self.MAX_ATTEMPTS_PER_ITEM:
+                if record:
+                    server_logger.info(f"Reached maximum attempts for {item_key}")
+                continue
+            if record:
+                state.research_attempts[item_key] = state.research_attempts.get(item_key, 0) + 1
+            batch.append((item_type, research_item))
+        return batch
+
+    async def _plan_strategies(self, items: List[tuple]) -> List[Optional[List[str]]]:
+        if self.batch_strategies:
+            return await self.planner.create_search_strategies_async(items)
+        return [None] * len(items)
+
+    def _start_speculation(self, state: ResearchState, current_results: List[str],
+                           search_client: AsyncTavilyClient) -> Optional[SpeculativeRound]:
+        """Start researching the items the next round would pick if coverage did not change"""
+        remaining_items = self.planner.prioritize_unfulfilled_requirements(
+            state.research_plan, state.progress, current_results, index=state.index
+        )
+        items = self._select_items(state, remaining_items, record=False)
+        if not items:
+            return None
+        self._emit(state, "researching", f"Researching {len(items)} items while evaluating",
+                   items=len(items), searches=state.search_count)
+        speculation = SpeculativeRound(asyncio.ensure_future(self._plan_strategies(items)))
+
+        async def research(position: int, item_type: str, research_item: str, tally: SpeculationTally):
+            _speculation_tally.set(tally)
+            # Shielded so cancelling one item does not cancel planning for the others
+            search_queries = (await asyncio.shield(speculation.planning))[position]
+            return await self._research_item(state, item_type, research_item, search_client, search_queries)
+
+        for position, (item_type, research_item) in enumerate(items):
+            tally = SpeculationTally()
+            task = asyncio.create_task(research(position, item_type, research_item, tally))
+            speculation.items[(item_type, research_item)] = (task, tally)
+        state.speculation = speculation
+        return speculation
+
+    async def _discard_speculation(self, state: ResearchState, speculation: Optional[SpeculativeRound],
+                                   keep: Optional[set] = None) -> None:
+        """Cancel speculative work for items outside ``keep`` and hand back their searches"""
+        if speculation is None:
+            return
+        keep = keep or set()
+        discarded = [item for item in speculation.items if item not in keep]
+        tasks = [speculation.items[item][0] for item in discarded]
+        if len(discarded) == len(speculation.items):
+            tasks.append(speculation.planning)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        returned = 0
+        for item in discarded:
+            returned += speculation.items.pop(item)[1].searches
+        state.search_count -= returned
+        state.speculative_searches += returned
+        if not speculation.items:
+            state.speculation = None
+        if discarded:
+            server_logger.info(f"Discarded speculative research for {len(discarded)} items ({returned} searches)")
+
+    async def _research_batch(self, state: ResearchState, batch: List[tuple],
+                              search_client: AsyncTavilyClient,
+                              speculation: Optional[SpeculativeRound]) -> List[List[Dict[str, Any]]]:
+        """Research a round's items, adopting speculative work already started for them"""
+        await self._discard_speculation(state, speculation, keep=set(batch))
+        started = speculation.items if speculation else {}
+        tasks = [task for task, _ in started.values()]
+        # Adopted speculative searches are now ordinary ones
+        state.speculation = None
+        try:
+            missing = [item for item in batch if item not in started]
+            strategies = dict(zip(missing, await self._plan_strategies(missing))) if missing else {}
+            tasks = [
+                started[item][0] if item in started else asyncio.ensure_future(
+                    self._research_item(state, item[0], item[1], search_client, strategies[item])
+                )
+                for item in batch
+            ]
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            # Adopted items keep the rejections and unused searches they counted while speculative
+            for _, tally in started.values():
+                for kind, count in tally.rejected.items():
+                    self._count_rejection(state, kind, count)
+                state.speculative_searches += tally.unused_searches
+
+    async def research_async(self, query: str, events: Optional[ProgressBus] = None,
+                             run_id: Optional[str] = None) -> ResearchState:
+        """Plan and run the research loop, returning the gathered state
+        
+        With a checkpoint store, the state is saved after planning, after
+        each evaluation and after each research round. A run given the
+        ``run_id`` of an unfinished run continues from its checkpoint
+        instead of starting over; without one it starts fresh.
+        """
+        state = ResearchState(query, self.near_duplicate_threshold)
+        state.events = events
+        state.trace = current_trace()
+        if self.budget and self.budget.max_searches is not None:
+            state.max_searches = min(self.MAX_SEARCHES_TOTAL, self.budget.max_searches)
+        checkpoint = None
+        if self.checkpoint_store:
+            state.run_id = run_id or new_run_id()
+            if run_id:
+                checkpoint = self._load_checkpoint(query, run_id)
+        if checkpoint:
+            state.restore(checkpoint)
+            self._emit(state, "resuming", f"Resuming run {state.run_id} after stage '{state.stage}'",
+                       sources=len(state.all_search_results), searches=state.search_count)
+
+        # Step 1: Create a structured research plan
+        if not state.research_plan:
+            self._emit(state, "planning", "Creating research plan...")
+            started = time.monotonic()
+            state.research_plan = await self.orchestrator.create_research_plan_async(query)
+            server_logger.info(f"Generated research plan: {json.dumps(state.research_plan, indent=2)}")
+            if events is not None:
+                events.emit(
+                    "planning", "Research plan ready", duration=time.monotonic() - started,
+                    **{key: len(value) for key, value in state.research_plan.items() if isinstance(value, list)}
+                )
+            self._checkpoint(state, "planned")
+        
+        # Step 2: Initialize research process
+        state.item_semaphore = asyncio.Semaphore(self.max_concurrency)
+        state.search_semaphore = asyncio.Semaphore(self.max_concurrent_searches)
+        if self.incremental_evaluation:
+            state.progress_evaluator = IncrementalProgressEvaluator(self.orchestrator)
+            if checkpoint and checkpoint.get("progress_evaluator"):
+                state.progress_evaluator.restore(checkpoint["progress_evaluator"])
+        if self.coverage_gating:
+            state.coverage = CoverageEstimator(state.research_plan)
+            if checkpoint and checkpoint.get("coverage"):
+                state.coverage.restore(checkpoint["coverage"])
+        if state.stage == "researched":
+            return state
+        
+        # Pooled per key and event loop so connections are reused across runs
+        search_client = get_async_tavily_client(self.tavily_api_key)
+
+        # Step 3: Conduct research
+        while state.search_count < state.max_searches:
+            if self._budget_exceeded(state):
+                break
+            current_results = [source_text(r) for r in state.all_search_results]
+            speculation = None
+            if state.stage == "evaluated":
+                # Resumed right after an evaluation; its verdicts are still current
+                server_logger.info(f"Reusing checkpointed coverage: {json.dumps(state.progress)}")
+            else:
+                if self.pipelined and state.progress:
+                    # Items unfulfilled under the previous verdicts are researched while
+                    # the evaluation runs; the new verdicts decide which results are kept
+                    speculation = self._start_speculation(state, current_results, search_client)
+                try:
+                    await self._evaluate_progress(state, current_results)
+                except BaseException:
+                    await self._discard_speculation(state, speculation)
+                    raise
             
-            # Add research completion statistics
-            completion_stats = {
-                "total_searches": search_count,
-                "unique_sources": len(seen_urls),
-                "research_coverage": {k: v for k, v in progress.items()}
-            }
-            server_logger.info(f"Research stats: {json.dumps(completion_stats, indent=2)}")
+            # Check if we have completed all aspects
+            if all(state.progress.values()):
+                await self._discard_speculation(state, speculation)
+                self._emit(state, "evaluating", "Research complete - all aspects covered with sufficient depth")
+                break
             
-            report = self.report_agent.generate_report(
-                query=query,
-                research_plan=research_plan,
-                research_results=contexts,
-                completion_stats=completion_stats
+            # Get prioritized list of unfulfilled research needs
+            remaining_items = self.planner.prioritize_unfulfilled_requirements(
+                state.research_plan, 
+                state.progress,
+                current_results,
+                index=state.index
             )
+            batch = self._select_items(state, remaining_items)
+            
+            if not batch:
+                await self._discard_speculation(state, speculation)
+                break
             
-            # Add sources section to the report
-            report += "\n\n" + format_sources_section(sources)
+            self._emit(state, "researching", f"Researching {len(batch)} items",
+                       items=len(batch), searches=state.search_count)
+            batch_results = await self._research_batch(state, batch, search_client, speculation)
             
-            return report
+            # Merge in plan order so cross-item dedup is deterministic
+            for item_results in batch_results:
+                for result in item_results:
+                    if not state.duplicates.accept(result['url'], result['content']):
+                        continue
+                    state.all_search_results.append(result)
+                    state.index.add(source_text(result))
+            if events is not None:
+                events.emit("researching", "Merged item results",
+                            sources=len(state.all_search_results), searches=state.search_count,
+                            duplicates=sum(state.duplicates.stats().values()))
+            self._checkpoint(state, "researching")
+            
+            if state.search_count >= state.max_searches:
+                self._emit(state, "researching", f"Reached maximum total searches ({state.max_searches})")
+        
+        if state.search_count >= state.max_searches and state.max_searches < self.MAX_SEARCHES_TOTAL:
+            state.stop_reason = state.stop_reason or (
+                f"search budget reached ({state.search_count}/{state.max_searches} searches)"
+            )
+
+        self._checkpoint(state, "researched")
+        return state
+
+    def _report_token_budget(self, state: ResearchState) -> Optional[int]:
+        return self.budget.report_tokens(state.usage()) if self.budget else None
+
+    def _log_run_usage(self, state: ResearchState) -> None:
+        """Log the run's final usage, including the report"""
+        usage = state.usage()
+        server_logger.info(
+            f"Run usage: {usage['input_tokens']} input / {usage['output_tokens']} output tokens, "
+            f"{usage['search_credits']} search credits"
+            + (f", ~${usage['estimated_cost_usd']}" if "estimated_cost_usd" in usage else "")
+            + f"; by provider {json.dumps(usage['by_provider'])}"
+        )
+
+    def _prepare_report(self, state: ResearchState) -> tuple:
+        """Build report contexts, sources and completion statistics from a finished run
+
+        Contexts are packed into the report budget here, and only the sources
+        of the contexts kept are returned for citation.
+        """
+        contexts, sources = parse_research_results(state.all_search_results)
+        contexts, kept = self.report_agent.pack_findings(
+            state.query, state.research_plan, contexts, self._report_token_budget(state)
+        )
+        sources = [sources[i] for i in kept]
+        
+        # Add research completion statistics
+        usage = state.usage()
+        completion_stats = {
+            "total_searches": state.search_count,
+            "unique_sources": len(state.seen_urls),
+            "duplicates_rejected": state.duplicates.stats(),
+            "off_topic_rejected": state.off_topic_rejected,
+            "research_coverage": {k: v for k, v in state.progress.items()},
+            "token_usage": {
+                key: usage[key] for key in ("input_tokens", "output_tokens", "total_tokens", "llm_calls", "cached_llm_calls")
+            },
+            "searches_by_depth": {depth: entry["calls"] for depth, entry in usage["searches"].items()},
+            "search_credits": usage["search_credits"]
+        }
+        if "estimated_cost_usd" in usage:
+            completion_stats["estimated_cost_usd"] = usage["estimated_cost_usd"]
+        if self.budget:
+            completion_stats["budget"] = dict(self.budget.to_dict(), stopped_early=state.stop_reason)
+        server_logger.info(f"Research stats: {json.dumps(completion_stats, indent=2)}")
+        server_logger.info(f"Token usage by agent: {json.dumps(usage['by_agent'])}")
+        if self.llm_cache:
+            server_logger.info(f"LLM cache stats: {json.dumps(self.llm_cache.stats())}")
+        if self.search_cache:
+            server_logger.info(
+                f"Search cache this run: {state.search_cache_hits} hits, "
+                f"{state.search_cache_misses} misses (overall {json.dumps(self.search_cache.stats())})"
+            )
+        server_logger.info(f"Throttling so far: {json.dumps(throttle_stats())}")
+        if self.page_fetcher:
+            server_logger.info(f"Page fetching so far: {json.dumps(self.page_fetcher.stats())}")
+        if state.progress_evaluator:
+            server_logger.info(f"Incremental evaluation: {json.dumps(state.progress_evaluator.stats())}")
+        if state.coverage:
+            server_logger.info(f"Coverage gating: {json.dumps(state.coverage.stats())}")
+        if state.speculative_searches:
+            server_logger.info(f"Search fan-out issued {state.speculative_searches} speculative searches")
+        if state.trace:
+            server_logger.info(f"Stage timings for trace {state.trace.trace_id}: {json.dumps(state.trace.summary())}")
+
+        return contexts, sources, completion_stats
 
+    async def process_query_async(self, query: str, events: Optional[ProgressBus] = None,
+                                  run_id: Optional[str] = None) -> str:
+        """Process a research query, researching independent plan items concurrently
+
+        Pass the id of a failed run as ``run_id`` to resume it.
+        """
+        trace = Trace(query=query)
+        status = "error"
+        run_id = run_id or new_run_id()
+        try:
+            with self._run_lock(run_id), activate(trace), span("research_run"):
+                state = await self.research_async(query, events, run_id)
+                
+                # Step 4: Generate final report
+                self._emit(state, "reporting", "Generating final report...")
+                started = time.monotonic()
+                contexts, sources, completion_stats = self._prepare_report(state)
+                
+                report = await self.report_agent.generate_report_async(
+                    query=query,
+                    research_plan=state.research_plan,
+                    research_results=contexts,
+                    completion_stats=completion_stats,
+                    packed=True
+                )
+                
+                # Add sources section to the report
+                report += "\n\n" + format_sources_section(sources)
+                self._emit(state, "complete", "Report ready", duration=time.monotonic() - started)
+                self._log_run_usage(state)
+                self._finish_run(state)
+                status = "ok"
+                
+                return report
+
+        except RunCancelled:
+            status = "cancelled"
+            server_logger.info(f"Run {run_id} was cancelled")
+            raise
         except Exception as e:
-            server_logger.error(f"Error in process_query: {str(e)}", exc_info=True)
+            server_logger.error(f"Error in process_query (run {run_id}): {str(e)}", exc_info=True)
             raise
+        finally:
+            finish_trace(trace, status)
+
+    def process_query_stream(self, query: str, events: Optional[ProgressBus] = None,
+                             run_id: Optional[str] = None) -> Iterator[str]:
+        """Process a research query, yielding the report as it is generated
+        
+        Each yielded value is the full report text so far. The research phase
+        runs to completion first; the sources section is appended in the
+        final value.
+        """
+        trace = Trace(query=query)
+        status = "error"
+        run_id = run_id or new_run_id()
+        try:
+            with self._run_lock(run_id), activate(trace), span("research_run"):
+                state = run_async(self.research_async(query, events, run_id))
+                
+                self._emit(state, "reporting", "Generating final report...")
+                started = time.monotonic()
+                contexts, sources, completion_stats = self._prepare_report(state)
+                
+                report = ""
+                for chunk in self.report_agent.generate_report_stream(
+                    query=query,
+                    research_plan=state.research_plan,
+                    research_results=contexts,
+                    completion_stats=completion_stats,
+                    packed=True
+                ):
+                    report += chunk
+                    yield report
+                
+                report += "\n\n" + format_sources_section(sources)
+                self._emit(state, "complete", "Report ready", duration=time.monotonic() - started)
+                self._log_run_usage(state)
+                self._finish_run(state)
+                status = "ok"
+                yield report
+
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        except RunCancelled:
+            status = "cancelled"
+            server_logger.info(f"Run {run_id} was cancelled")
+            raise
+        except Exception as e:
+            server_logger.error(f"Error in process_query (run {run_id}): {str(e)}", exc_info=True)
+            raise
+        finally:
+            finish_trace(trace, status)
+
+    def process_query(self, query: str, run_id: Optional[str] = None) -> str:
+        """Process a research query using the multi-agent system"""
+        return run_async(self.process_query_async(query, run_id=run_id))
+
+    async def resume_async(self, run_id: str, events: Optional[ProgressBus] = None) -> str:
+        """Continue a failed run from its last checkpoint"""
+        checkpoint = self.checkpoint_store.load(run_id) if self.checkpoint_store else None
+        if checkpoint is None:
+            raise KeyError(f"No checkpoint found for run {run_id}")
+        return await self.process_query_async(checkpoint["query"], events, run_id=run_id)
+
+    def resume(self, run_id: str) -> str:
+        """Continue a failed run from its last checkpoint"""
+        return run_async(self.resume_async(run_id))
+
+# Research systems hold no per-run state, so identical configurations share one
+_system_pool = ClientRegistry(idle_timeout=1800)
+
+def get_multi_agent_system(use_gemini=True, gemini_api_key=None, gemini_model=None,
+                           tavily_api_key=None, openrouter_api_key=None,
+                           openrouter_model=None) -> MultiAgentSystem:
+    """Return a pooled MultiAgentSystem for the given credentials and models"""
+    key = (
+        use_gemini,
+        credential_fingerprint(gemini_api_key), gemini_model,
+        credential_fingerprint(tavily_api_key),
+        credential_fingerprint(openrouter_api_key), openrouter_model
+    )
+    return _system_pool.get(key, lambda: MultiAgentSystem(
+        use_gemini=use_gemini,
+        gemini_api_key=gemini_api_key,
+        gemini_model=gemini_model,
+        tavily_api_key=tavily_api_key,
+        openrouter_api_key=openrouter_api_key,
+        openrouter_model=openrouter_model,
+        llm_cache=get_default_llm_cache(),
+        search_cache=get_default_search_cache(),
+        checkpoint_store=get_default_checkpoint_store(),
+        budget=RunBudget.from_env(),
+        agent_backends=agent_providers_from_env({"gemini": gemini_api_key, "openrouter": openrouter_api_key}),
+        page_fetcher=get_default_page_fetcher(),
+        relevance_scorer=get_default_relevance_scorer()
+    ))
+
+class JobRejected(Exception):
+    """A research job was refused by admission control or expired in the queue"""
+
+class ResearchJob:
+    """A unit of research work waiting for or running on the worker pool"""
+
+    def __init__(self, user_id: str, fn: Callable[[], Any], events: ProgressBus):
+        self.user_id = user_id
+        self.fn = fn
+        self.events = events
+        self.status = "queued"
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """Block until the job finishes and return its result, re-raising its error"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Research job did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class JobManager:
+    """Bounded worker pool with a FIFO queue and admission control
+
+    Jobs beyond ``max_queue`` waiting jobs, or beyond ``per_user_limit``
+    queued-plus-running jobs for one user, are rejected at submission.
+    Jobs that wait longer than ``queue_timeout`` seconds are expired
+    instead of started. Queued jobs receive their position through their
+    progress bus whenever the queue moves.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32,
+                 per_user_limit: int = 2, queue_timeout: float = 600):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.queue_timeout = queue_timeout
+        self._queue: "deque[ResearchJob]" = deque()
+        self._active_by_user: Dict[str, int] = {}
+        self._running = 0
+        self._cond = threading.Condition()
+        self.stats = {"submitted": 0, "rejected": 0, "expired": 0, "cancelled": 0, "completed": 0, "failed": 0}
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"research-worker-{i}", daemon=True).start()
+
+    @classmethod
+    def from_env(cls) -> "JobManager":
+        return cls(
+            max_workers=int(os.getenv("RESEARCH_MAX_WORKERS", "4")),
+            max_queue=int(os.getenv("RESEARCH_MAX_QUEUE", "32")),
+            per_user_limit=int(os.getenv("RESEARCH_PER_USER_LIMIT", "2")),
+            queue_timeout=float(os.getenv("RESEARCH_QUEUE_TIMEOUT", "600"))
+        )
+
+    def submit(self, user_id: str, fn: Callable[[], Any], events: Optional[ProgressBus] = None) -> ResearchJob:
+        """Queue fn for execution, raising JobRejected if admission control refuses it"""
+        job = ResearchJob(user_id, fn, events or ProgressBus())
+        with self._cond:
+            if self._active_by_user.get(user_id, 0) >= self.per_user_limit:
+                self.stats["rejected"] += 1
+                raise JobRejected(
+                    f"You already have {self.per_user_limit} research runs in progress. "
+                    "Please wait for one to finish."
+                )
+            if len(self._queue) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise JobRejected("The research queue is full. Please try again in a few minutes.")
+            self._queue.append(job)
+            self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+            self.stats["submitted"] += 1
+            self._announce_positions()
+            self._cond.notify()
+        server_logger.info(f"Queued research job for {user_id} ({len(self._queue)} waiting, {self._running} running)")
+        return job
+
+    def position(self, job: ResearchJob) -> Optional[int]:
+        """1-based queue position of a waiting job, or None once it has started"""
+        with self._cond:
+            for index, queued in enumerate(self._queue, 1):
+                if queued is job:
+                    return index
+        return None
+
+    def cancel(self, job: ResearchJob) -> None:
+        """Drop a queued job, or ask a running one to stop at its next progress update"""
+        with self._cond:
+            if job.status == "queued" and job in self._queue:
+                self._queue.remove(job)
+                job.status = "cancelled"
+                job.error = RunCancelled("Research job was cancelled while queued")
+                self.stats["cancelled"] += 1
+                self._release(job)
+                self._announce_positions()
+                job.events.fail(job.error)
+                job._done.set()
+                return
+        if job.status == "running":
+            job.events.cancel()
+
+    def _announce_positions(self) -> None:
+        # Caller holds the condition lock
+        for index, job in enumerate(self._queue, 1):
+            job.events.emit(
+                "queued", f"Waiting for a free research worker (position {index} of {len(self._queue)})",
+                position=index, running=self._running
+            )
+
+    def _release(self, job: ResearchJob) -> None:
+        # Caller holds the condition lock
+        remaining = self._active_by_user.get(job.user_id, 1) - 1
+        if remaining > 0:
+            self._active_by_user[job.user_id] = remaining
+        else:
+            self._active_by_user.pop(job.user_id, None)
+
+    def _next_job(self) -> ResearchJob:
+        with self._cond:
+            while True:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                waited = time.monotonic() - job.submitted_at
+                if waited > self.queue_timeout:
+                    job.status = "expired"
+                    job.error = JobRejected(f"Research job timed out after {waited:.1f}s in the queue")
+                    self.stats["expired"] += 1
+                    self._release(job)
+                    job.events.fail(job.error)
+                    job._done.set()
+                    continue
+                job.status = "running"
+                job.started_at = time.monotonic()
+                self._running += 1
+                self._announce_positions()
+                return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            job.events.emit("queued", "Research started", duration=job.started_at - job.submitted_at)
+            try:
+                job.result = job.fn()
+                job.status = "done"
+                job.events.close()
+            except BaseException as e:
+                job.status = "cancelled" if isinstance(e, RunCancelled) else "failed"
+                job.error = e
+                job.events.fail(e)
+            finally:
+                job.finished_at = time.monotonic()
+                with self._cond:
+                    self._running -= 1
+                    self._release(job)
+                    self.stats["completed" if job.status == "done" else job.status] += 1
+                job._done.set()
+
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager configured from RESEARCH_* environment variables"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager.from_env()
+            manager = _job_manager
+            METRICS.gauge("research_jobs", "Research jobs waiting for or holding a worker",
+                          lambda: {(("state", "queued"),): len(manager._queue),
+                                   (("state", "running"),): manager._running})
+        return _job_manager
+
+def request_user_id(request: Optional[gr.Request]) -> str:
+    """Identify the caller of a Gradio event for per-user limits"""
+    if request is None:
+        return "anonymous"
+    username = getattr(request, "username", None)
+    if username:
+        return f"user:{username}"
+    # Behind a proxy or NAT many users share one peer address, so the
+    # browser session identifies a caller better than the client host
+    session_hash = getattr(request, "session_hash", None)
+    if session_hash:
+        return f"session:{session_hash}"
+    host = getattr(getattr(request, "client", None), "host", None)
+    return f"host:{host}" if host else "anonymous"
+
+def stream_query_with_progress(system: MultiAgentSystem, query: str,
+                               user_id: str = "anonymous") -> Iterator[tuple]:
+    """Run a query on the job pool, yielding (progress_log, partial_report) as events arrive
+    
+    Raises JobRejected if the job is refused or expires while queued.
+    Closing the generator, as Gradio does when the client disconnects,
+    cancels the job.
+    """
+    bus = ProgressBus()
+
+    def run():
+        for partial_report in system.process_query_stream(query, events=bus):
+            if bus.cancelled:
+                raise RunCancelled("Research run was cancelled")
+            bus.emit("reporting", "Report chunk", report=partial_report)
+
+    job = get_job_manager().submit(user_id, run, bus)
+    try:
+        report = ""
+        for event in bus.events():
+            if event.report is not None:
+                report = event.report
+            yield "\n".join(bus.log_lines()), report
+    finally:
+        get_job_manager().cancel(job)
 
 # Global UI component for progress tracking
 progress_output = None
@@ -347,37 +1380,26 @@ def create_interface():
                     openrouter_model: gr.update(visible=True)
                 }
 
-        def run_research(query, api_type, gemini_key, gemini_model, tavily_key, openrouter_key, openrouter_model):
+        def run_research(query, api_type, gemini_key, gemini_model, tavily_key, openrouter_key, openrouter_model,
+                         request: gr.Request = None):
             try:
                 if not tavily_key:
                     server_logger.error("Missing Tavily API key")
-                    return gr.update(value="Error: Missing Tavily API key"), "Please provide a Tavily API key for web search capability."
+                    yield gr.update(value="Error: Missing Tavily API key"), "Please provide a Tavily API key for web search capability.", gr.update(visible=False), gr.update(visible=False)
+                    return
                 
                 if api_type == "Gemini" and not gemini_key:
                     server_logger.error("Missing Gemini API key")
-                    return gr.update(value="Error: Missing Gemini API key"), "Please provide a Gemini API key when using Gemini mode."
+                    yield gr.update(value="Error: Missing Gemini API key"), "Please provide a Gemini API key when using Gemini mode.", gr.update(visible=False), gr.update(visible=False)
+                    return
                     
                 if api_type == "OpenRouter" and not openrouter_key:
                     server_logger.error("Missing OpenRouter API key")
-                    return gr.update(value="Error: Missing OpenRouter API key"), "Please provide an OpenRouter API key when using OpenRouter mode."
-
-                # Initialize log capture
-                class LogCaptureHandler(logging.Handler):
-                    def __init__(self):
-                        super().__init__()
-                        self.logs = []
+                    yield gr.update(value="Error: Missing OpenRouter API key"), "Please provide an OpenRouter API key when using OpenRouter mode.", gr.update(visible=False), gr.update(visible=False)
+                    return
 
-                    def emit(self, record):
-                        msg = self.format(record)
-                        self.logs.append(msg)
-                        return gr.update(value="\n".join(self.logs))
-
-                log_handler = LogCaptureHandler()
-                log_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
-                server_logger.addHandler(log_handler)
-
-                # Initialize system and run query
-                system = MultiAgentSystem(
+                # Reuse the system (and its agents) for this configuration and run query
+                system = get_multi_agent_system(
                     use_gemini=(api_type == "Gemini"),
                     gemini_api_key=gemini_key if api_type == "Gemini" else None,
                     gemini_model=gemini_model if api_type == "Gemini" else None,
@@ -386,24 +1408,40 @@ def create_interface():
                     openrouter_model=openrouter_model if api_type == "OpenRouter" else None
                 )
 
-                result = system.process_query(query)
+                # Stream this request's progress events and the report as it is written
+                progress_log, result = "", ""
+                for progress_log, result in stream_query_with_progress(system, query, request_user_id(request)):
+                    yield (
+                        gr.update(value=progress_log),
+                        result,
+                        gr.update(visible=False),
+                        gr.update(visible=False)
+                    )
                 
                 # Save markdown report and get file path
                 md_file_path = save_markdown_report(result)
                 html_file_path = convert_to_html(result)
                 
-                server_logger.removeHandler(log_handler)
-                return (
-                    gr.update(value="\n".join(log_handler.logs)),  # Progress output
+                yield (
+                    gr.update(value=progress_log),  # Progress output
                     result,  # Markdown output
                     gr.update(value=md_file_path, visible=True),  # Download markdown button
                     gr.update(value=html_file_path, visible=True)  # Download HTML button
                 )
 
+            except JobRejected as e:
+                server_logger.warning(f"Research job rejected: {str(e)}")
+                yield (
+                    gr.update(value=f"Not started: {str(e)}"),
+                    str(e),
+                    gr.update(visible=False),
+                    gr.update(visible=False)
+                )
+
             except Exception as e:
                 server_logger.error(f"Research failed: {str(e)}", exc_info=True)
                 error_msg = f"ERROR: Research failed: {str(e)}"
-                return (
+                yield (
                     gr.update(value=error_msg),  # Progress output
                     error_msg,  # Markdown output
                     gr.update(visible=False),  # Hide download button
@@ -424,7 +1462,9 @@ def create_interface():
                 tavily_key, openrouter_key, openrouter_model
             ],
             outputs=[progress_output, output, download_md, download_html],
-            show_progress="full"
+            show_progress="full",
+            # Admission control and queueing are handled by the job manager
+            concurrency_limit=None
         )
 
         gr.Examples(
@@ -455,7 +1495,14 @@ class GradioMCPServer(MCPServer):
             gemini_model=gemini_model,
             tavily_api_key=tavily_api_key,
             openrouter_api_key=openrouter_api_key,
-            openrouter_model=openrouter_model
+            openrouter_model=openrouter_model,
+            llm_cache=get_default_llm_cache(),
+            search_cache=get_default_search_cache(),
+            checkpoint_store=get_default_checkpoint_store(),
+            budget=RunBudget.from_env(),
+            agent_backends=agent_providers_from_env({"gemini": gemini_api_key, "openrouter": openrouter_api_key}),
+            page_fetcher=get_default_page_fetcher(),
+            relevance_scorer=get_default_relevance_scorer()
         )
 
     def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -479,8 +1526,12 @@ Sample analysis content...
 """
                 file_path = save_markdown_report(markdown_text) if output_format == 'markdown' else convert_to_html(markdown_text)
             else:
-                # Use multi-agent system to process query
-                report, _, _ = self.agent_system.process_query(query)
+                # Use multi-agent system to process query on the shared worker pool
+                job = get_job_manager().submit(
+                    request.get('user_id', 'api'),
+                    lambda: self.agent_system.process_query(query)
+                )
+                report = job.wait()
                 file_path = save_markdown_report(report) if output_format == 'markdown' else convert_to_html(report)
                 markdown_text = report
                 
@@ -529,8 +1580,8 @@ Sample analysis content...
                         download_md = gr.File(label="Download Markdown", visible=False)
                         download_html = gr.File(label="Download HTML", visible=False)
             
-            def process_query(query: str, test_mode: bool) -> tuple[str, str, str]:
-                """Process the query and return markdown content and file paths"""
+            def process_query(query: str, test_mode: bool, request: gr.Request = None) -> Iterator[tuple]:
+                """Process the query, streaming the markdown preview before the file paths"""
                 try:
                     self.test_mode = test_mode
                     if self.test_mode:
@@ -546,15 +1597,26 @@ This is a sample report generated in test mode without using API credits.
 ## Test Results
 Sample analysis content..."""
                     else:
-                        # Use multi-agent system to process query
-                        markdown_text = self.agent_system.process_query(query)
+                        # Use multi-agent system to process query, streaming the report
+                        markdown_text = ""
+                        for progress_log, partial_report in stream_query_with_progress(
+                            self.agent_system, query, request_user_id(request)
+                        ):
+                            # Show the queue position until the report starts streaming
+                            markdown_text = partial_report
+                            preview = partial_report or f"*{progress_log.splitlines()[-1] if progress_log else 'Queued...'}*"
+                            yield (
+                                preview,
+                                gr.update(visible=False),
+                                gr.update(visible=False)
+                            )
                     
                     # Generate both markdown and HTML files
                     md_path = save_markdown_report(markdown_text)
                     html_path = convert_to_html(markdown_text)
                     
                     # Make download buttons visible and return results
-                    return (
+                    yield (
                         markdown_text,  # Preview content
                         gr.update(value=md_path, visible=True),  # Markdown download
                         gr.update(value=html_path, visible=True)  # HTML download
@@ -562,7 +1624,7 @@ Sample analysis content..."""
                     
                 except Exception as e:
                     server_logger.error(f"Error processing query: {str(e)}")
-                    return (
+                    yield (
                         f"Error: {str(e)}",  # Error message in preview
                         gr.update(visible=False),  # Hide markdown download
                         gr.update(visible=False)   # Hide HTML download
@@ -572,7 +1634,9 @@ Sample analysis content..."""
             submit_btn.click(
                 fn=process_query,
                 inputs=[query_input, test_mode_checkbox],
-                outputs=[report_output, download_md, download_html]
+                outputs=[report_output, download_md, download_html],
+                # Admission control and queueing are handled by the job manager
+                concurrency_limit=None
             )
             
             # Add example queries
@@ -596,6 +1660,17 @@ if __name__ == "__main__":
             if sys.version_info[0] == 3 and sys.version_info[1] >= 8:
                 asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+        # Fail at startup rather than on every request if an agent override is misconfigured
+        agent_providers_from_env()
+
+        metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+        if metrics_port:
+            # Prometheus metrics and per-run traces next to the Gradio server
+            start_metrics_server(
+                metrics_port, host=os.getenv("METRICS_HOST", "127.0.0.1"),
+                serve_traces=os.getenv("TRACES_ENABLED", "").lower() in ("1", "true", "yes")
+            )
+
         server_logger.info("Starting Gradio server")
         interface = create_interface()
         interface.launch(
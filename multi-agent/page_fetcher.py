@@ -0,0 +1,313 @@
+"""Full-page fetching and text extraction for accepted search results
+
+Search snippets are often too thin for technical topics. PageFetcher
+downloads the pages behind accepted results concurrently, with a
+per-host connection limit and size and time caps. It reduces the HTML to
+readable text and caches that text by content hash: pages served under
+several URLs are stored once, and URLs seen before are not fetched again.
+The text is attached to copies of the results as ``page_content``.
+
+Only public addresses are fetched, including after redirects, since the
+URLs come from search results and the text ends up in user-visible
+reports. Local stand-in servers need ``allow_private_addresses``.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import ipaddress
+import threading
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+import aiohttp
+from llm_cache import DiskLRUCache
+from client_pool import get_async_page_session, is_public_address
+from dedup import canonicalize_url
+from tracing import traced, annotate
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never part of the readable content
+_SKIPPED_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "select"
+})
+_BLOCK_TAGS = frozenset({
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "table", "tr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "figcaption"
+})
+_VOID_TAGS = frozenset({"br", "hr", "img", "input", "meta", "link", "source", "wbr", "area", "col", "embed"})
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self._in_title = False
+        self._skip_depth = 0
+        # Text outside and inside <main>/<article>, kept apart so the main content can win
+        self.parts: List[str] = []
+        self.main_parts: List[str] = []
+        self._main_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            if tag == "br":
+                self._append("\n")
+            return
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in ("main", "article"):
+            self._main_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        if tag in _BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in ("main", "article"):
+            self._main_depth = max(0, self._main_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        if tag in _BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._append(data)
+
+    def _append(self, text: str) -> None:
+        self.parts.append(text)
+        if self._main_depth:
+            self.main_parts.append(text)
+
+def _clean(parts: List[str]) -> str:
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+def extract_text(html: str, min_main_chars: int = 500) -> str:
+    """Readable text of an HTML page, preferring its <main>/<article> content when substantial"""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.warning(f"HTML extraction stopped early: {str(e)}")
+    main = _clean(parser.main_parts)
+    return main if len(main) >= min_main_chars else _clean(parser.parts)
+
+class PageCache:
+    """Content-addressed store of extracted page text
+
+    Texts are stored under the hash of their content and URLs map to
+    hashes, so a page reachable under several URLs is stored once.
+    """
+
+    def __init__(self, path: str = os.path.join("cache", "page_cache.sqlite"),
+                 max_entries: int = 20000, ttl_seconds: Optional[float] = 3 * 24 * 3600):
+        self.store = DiskLRUCache(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def content_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[str]:
+        digest = self.store.get(f"url:{canonicalize_url(url)}")
+        return self.store.get(f"text:{digest}") if digest else None
+
+    def set(self, url: str, text: str) -> None:
+        digest = self.content_key(text)
+        self.store.set(f"text:{digest}", text)
+        self.store.set(f"url:{canonicalize_url(url)}", digest)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+class PageFetcher:
+    """Fetch and extract the pages behind search results, concurrently and with caps"""
+
+    CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, max_concurrency: int = 8, per_host_limit: int = 2, timeout: float = 10,
+                 max_bytes: int = 2_000_000, max_chars: int = 20000, min_gain_chars: int = 200,
+                 cache: Optional[PageCache] = None, user_agent: str = "multi-agent-deep-research/1.0",
+                 max_redirects: int = 3, allow_private_addresses: bool = False):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.per_host_limit = max(1, int(per_host_limit))
+        # Seconds for a whole page, including reading the body
+        self.timeout = timeout
+        # Responses larger than this are cut off; extracted text is capped at max_chars
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        # Pages whose text is not at least this much longer than the snippet are ignored
+        self.min_gain_chars = min_gain_chars
+        self.cache = cache
+        self.user_agent = user_agent
+        self.max_redirects = max_redirects
+        # Also fetch loopback, private and link-local addresses (only for local stand-ins)
+        self.allow_private_addresses = allow_private_addresses
+        self._lock = threading.Lock()
+        # charset_fallback counts fetched pages whose declared charset was unknown
+        self.counts = {"fetched": 0, "cache_hits": 0, "failed": 0, "skipped": 0, "charset_fallback": 0, "bytes": 0}
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    async def _read(self, response: aiohttp.ClientResponse) -> bytes:
+        # Oversized pages are cut off rather than skipped; their start is usually the useful part
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(65536):
+            body.extend(chunk)
+            if len(body) >= self.max_bytes:
+                del body[self.max_bytes:]
+                break
+        return bytes(body)
+
+    def _allowed(self, url: str) -> bool:
+        """Reject non-HTTP URLs and literal non-public IPs; resolved hosts are checked on connect"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return False
+        if self.allow_private_addresses:
+            return True
+        try:
+            ipaddress.ip_address(parts.hostname)
+        except ValueError:
+            return True
+        # Literal IPs skip DNS resolution, so the session's resolver never sees them
+        return is_public_address(parts.hostname)
+
+    async def _get(self, session: aiohttp.ClientSession, url: str) -> Optional[tuple]:
+        """Follow up to max_redirects redirects, checking every hop; (content type, charset, body) or None"""
+        for _ in range(self.max_redirects + 1):
+            if not self._allowed(url):
+                self._count("skipped")
+                logger.info(f"Not fetching page {url}: not a public http(s) address")
+                return None
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                   allow_redirects=False) as response:
+                location = response.headers.get("Location")
+                if response.status in self.REDIRECT_STATUSES and location:
+                    url = urljoin(url, location)
+                    continue
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if response.status != 200 or (content_type and content_type not in self.CONTENT_TYPES):
+                    self._count("skipped")
+                    logger.info(f"Not using page {url}: HTTP {response.status}, {content_type or 'no content type'}")
+                    return None
+                body = await asyncio.wait_for(self._read(response), self.timeout)
+                return content_type, response.charset or "utf-8", body
+        self._count("skipped")
+        logger.info(f"Not using page {url}: more than {self.max_redirects} redirects")
+        return None
+
+    async def fetch_text(self, url: str) -> Optional[str]:
+        """Extracted text of one page, from the cache when possible; None if it cannot be fetched"""
+        if self.cache:
+            cached = self.cache.get(url)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+        session = get_async_page_session(self.max_concurrency, self.per_host_limit, self.user_agent,
+                                         public_only=not self.allow_private_addresses)
+        try:
+            fetched = await self._get(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError, UnicodeError, ValueError) as e:
+            self._count("failed")
+            logger.info(f"Failed to fetch page {url}: {type(e).__name__} {str(e)}")
+            return None
+        if fetched is None:
+            return None
+        content_type, charset, body = fetched
+
+        self._count("bytes", len(body))
+        try:
+            html = body.decode(charset, errors="replace")
+        except LookupError:
+            # Unknown charset in the Content-Type header
+            self._count("charset_fallback")
+            logger.info(f"Unknown charset {charset!r} for page {url}, decoding as utf-8")
+            html = body.decode("utf-8", errors="replace")
+        self._count("fetched")
+        text = html if content_type == "text/plain" else extract_text(html)
+        text = text[:self.max_chars]
+        if self.cache and text:
+            self.cache.set(url, text)
+        return text
+
+    @traced("fetch_pages")
+    async def enrich(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of the results with their page text as ``page_content``
+
+        The input dicts are never modified, since they may be shared with
+        the search cache. Results whose page adds little over the snippet
+        are returned unchanged.
+        """
+        urls = list(dict.fromkeys(result["url"] for result in results if result.get("url")))
+        started = time.monotonic()
+        texts = await asyncio.gather(*[self.fetch_text(url) for url in urls], return_exceptions=True)
+        pages = {}
+        for url, text in zip(urls, texts):
+            if isinstance(text, Exception):
+                # One bad page must never fail the research run
+                self._count("failed")
+                logger.warning(f"Unexpected error fetching page {url}: {type(text).__name__} {str(text)}")
+                continue
+            pages[url] = text
+        enriched, deepened = [], 0
+        for result in results:
+            text = pages.get(result.get("url"))
+            if text and len(text) >= len(result.get("content", "")) + self.min_gain_chars:
+                enriched.append(dict(result, page_content=text))
+                deepened += 1
+            else:
+                enriched.append(result)
+        annotate(pages=len(urls), deepened=deepened, seconds=round(time.monotonic() - started, 3))
+        return enriched
+
+_default_fetcher: Optional[PageFetcher] = None
+_default_fetcher_lock = threading.Lock()
+
+def get_default_page_fetcher() -> Optional[PageFetcher]:
+    """Return the process-wide page fetcher configured from the environment
+
+    Fetching is off unless PAGE_FETCH_ENABLED=1. PAGE_FETCH_CONCURRENCY,
+    PAGE_FETCH_PER_HOST, PAGE_FETCH_TIMEOUT, PAGE_FETCH_MAX_BYTES and
+    PAGE_FETCH_MAX_CHARS override the limits; PAGE_CACHE_PATH moves the
+    cache and PAGE_CACHE_DISABLED=1 turns it off. PAGE_FETCH_ALLOW_PRIVATE=1
+    also fetches loopback and private addresses, for local stand-ins only.
+    """
+    global _default_fetcher
+    if os.getenv("PAGE_FETCH_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            cache = None
+            if os.getenv("PAGE_CACHE_DISABLED", "").lower() not in ("1", "true", "yes"):
+                try:
+                    cache = PageCache(path=os.getenv("PAGE_CACHE_PATH", os.path.join("cache", "page_cache.sqlite")))
+                except Exception as e:
+                    logger.error(f"Failed to open page cache, continuing without it: {str(e)}")
+            _default_fetcher = PageFetcher(
+                max_concurrency=int(os.getenv("PAGE_FETCH_CONCURRENCY", "8")),
+                per_host_limit=int(os.getenv("PAGE_FETCH_PER_HOST", "2")),
+                timeout=float(os.getenv("PAGE_FETCH_TIMEOUT", "10")),
+                max_bytes=int(os.getenv("PAGE_FETCH_MAX_BYTES", "2000000")),
+                max_chars=int(os.getenv("PAGE_FETCH_MAX_CHARS", "20000")),
+                cache=cache,
+                allow_private_addresses=os.getenv("PAGE_FETCH_ALLOW_PRIVATE", "").lower() in ("1", "true", "yes")
+            )
+        return _default_fetcher
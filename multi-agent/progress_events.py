@@ -0,0 +1,113 @@
+import time
+import queue
+import threading
+from typing import Dict, Any, Optional, Iterator, List
+
+class ProgressEvent:
+    """One progress update from a research run"""
+
+    def __init__(self, stage: str, message: str, elapsed: float,
+                 counts: Optional[Dict[str, Any]] = None,
+                 duration: Optional[float] = None,
+                 report: Optional[str] = None):
+        self.stage = stage
+        self.message = message
+        # Seconds since the run started
+        self.elapsed = elapsed
+        self.counts = counts or {}
+        # Seconds the finished step took, when the event closes a step
+        self.duration = duration
+        # Partial report text for streaming events
+        self.report = report
+
+    def format(self) -> str:
+        line = f"[{self.elapsed:6.1f}s] {self.stage}: {self.message}"
+        details = [f"{key}={value}" for key, value in self.counts.items()]
+        if self.duration is not None:
+            details.append(f"took {self.duration:.1f}s")
+        if details:
+            line += f" ({', '.join(details)})"
+        return line
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "message": self.message,
+            "elapsed": round(self.elapsed, 3),
+            "counts": self.counts,
+            "duration": round(self.duration, 3) if self.duration is not None else None
+        }
+
+class RunCancelled(Exception):
+    """A run stopped because the consumer of its progress went away"""
+
+class ProgressBus:
+    """Per-request channel carrying progress events from a run to its UI handler
+
+    The research side calls emit() from any thread; the consumer iterates
+    events() until the run closes the bus. A failure recorded with fail()
+    is re-raised in the consumer after the pending events are drained.
+    A consumer that stops listening calls cancel(); the run checks
+    ``cancelled`` and stops at its next progress update.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.history: List[ProgressEvent] = []
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._cancelled = threading.Event()
+
+    def emit(self, stage: str, message: str, duration: Optional[float] = None,
+             report: Optional[str] = None, **counts) -> ProgressEvent:
+        event = ProgressEvent(
+            stage, message, time.monotonic() - self.started_at,
+            counts=counts, duration=duration, report=report
+        )
+        if report is None:
+            with self._lock:
+                self.history.append(event)
+        self._queue.put(event)
+        return event
+
+    def close(self) -> None:
+        self._queue.put(self._CLOSED)
+
+    def fail(self, error: BaseException) -> None:
+        self._error = error
+        self.close()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def events(self) -> Iterator[ProgressEvent]:
+        """Yield events until the bus is closed"""
+        while True:
+            event = self._queue.get()
+            if event is self._CLOSED:
+                break
+            yield event
+        if self._error is not None:
+            raise self._error
+
+    def log_lines(self) -> List[str]:
+        with self._lock:
+            return [event.format() for event in self.history]
+
+    def stage_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Event counts and total step durations per stage"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for event in self.history:
+                entry = summary.setdefault(event.stage, {"events": 0, "duration": 0.0})
+                entry["events"] += 1
+                if event.duration is not None:
+                    entry["duration"] = round(entry["duration"] + event.duration, 3)
+        return summary
@@ -0,0 +1,361 @@
+"""LLM provider backends and the registry agents look them up in
+
+An LLMProvider turns a prompt and system prompt into a completion, either
+in one piece, streamed, or asynchronously. Agents only talk to this
+interface, so a new backend is added by subclassing LLMProvider and
+registering a factory for it:
+
+    register_provider("my-backend", lambda api_key=None, model=None: MyProvider(api_key, model))
+
+Built in are "gemini", "openrouter" and "local", the latter being any
+OpenAI-compatible server (llama.cpp, vLLM, Ollama, ...) configured with
+LOCAL_LLM_BASE_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY, LOCAL_LLM_TIMEOUT
+and LOCAL_LLM_MAX_CONNECTIONS.
+"""
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from openai import OpenAI, AsyncOpenAI, BadRequestError
+from client_pool import (
+    get_gemini_model, gemini_uses_rest, get_openai_client, get_async_openai_client, openrouter_base_url
+)
+from rate_limit import TokenBucket, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+LOCAL_LLM_BASE_URL = "http://localhost:8080/v1"
+
+def structured_output_enabled() -> bool:
+    """Whether response schemas are sent to providers (LLM_STRUCTURED_OUTPUT=0 turns this off)"""
+    return os.getenv("LLM_STRUCTURED_OUTPUT", "1") != "0"
+
+class LLMProvider:
+    """A chat-completion backend agents send their prompts to"""
+
+    name = "base"
+    DEFAULT_MODEL: Optional[str] = None
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        self.api_key = api_key
+        self.model = model or self.DEFAULT_MODEL
+
+    @property
+    def cache_namespace(self) -> str:
+        """Prefix for LLM cache keys; responses are only shared within one namespace"""
+        return self.name
+
+    def rate_limiter(self) -> TokenBucket:
+        # Shared by every agent and run using the same provider key
+        return get_rate_limiter(self.name, self.api_key)
+
+    def generate(self, prompt: str, system_prompt: str, temperature: float,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Complete the prompt; ``response_schema`` is a JSON schema the reply should follow,
+        enforced by the backend where it supports that"""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, system_prompt: str, temperature: float) -> Iterator[str]:
+        yield self.generate(prompt, system_prompt, temperature)
+
+    async def generate_async(self, prompt: str, system_prompt: str, temperature: float,
+                             response_schema: Optional[Dict[str, Any]] = None) -> str:
+        return await asyncio.to_thread(self.generate, prompt, system_prompt, temperature, response_schema)
+
+def _is_schema_error(error: Exception, markers: tuple) -> bool:
+    """Whether a rejected request was rejected for its structured output settings
+
+    Other 400s, such as an oversized prompt, must not switch schemas off
+    for every later call, and retrying them without a schema would not help.
+    """
+    text = f"{getattr(error, 'param', None) or ''} {str(error)}".lower()
+    return any(marker in text for marker in markers)
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    DEFAULT_MODEL = "gemini-1.5-pro"
+
+    # Schema keywords Gemini's response_schema accepts
+    SCHEMA_KEYS = ("type", "properties", "required", "items", "enum", "description")
+    SCHEMA_ERROR_MARKERS = ("response_schema", "response_mime_type", "schema")
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        super().__init__(api_key or os.getenv("GEMINI_API_KEY"), model)
+        if not self.api_key:
+            raise ValueError("Gemini API key is required when use_gemini=True")
+        # Switched off if the model rejects response schemas
+        self.response_schemas = True
+
+    @classmethod
+    def _gemini_schema(cls, schema: Dict[str, Any]) -> Dict[str, Any]:
+        converted = {key: value for key, value in schema.items() if key in cls.SCHEMA_KEYS}
+        if "properties" in converted:
+            converted["properties"] = {name: cls._gemini_schema(value) for name, value in converted["properties"].items()}
+        if "items" in converted:
+            converted["items"] = cls._gemini_schema(converted["items"])
+        return converted
+
+    def _generation_config(self, temperature: float, response_schema: Optional[Dict[str, Any]],
+                           with_schema: bool = True) -> genai.types.GenerationConfig:
+        options: Dict[str, Any] = {"temperature": temperature}
+        if response_schema and structured_output_enabled():
+            options["response_mime_type"] = "application/json"
+            # Objects with free-form keys cannot be described to Gemini; JSON mode still applies
+            if with_schema and self.response_schemas and (
+                response_schema.get("type") != "object" or response_schema.get("properties")
+            ):
+                options["response_schema"] = self._gemini_schema(response_schema)
+        return genai.types.GenerationConfig(**options)
+
+    def _schema_rejected(self, error: Exception) -> None:
+        logger.warning(f"Gemini model {self.model} rejected the response schema, using JSON mode only: {str(error)}")
+        self.response_schemas = False
+
+    def _model(self) -> genai.GenerativeModel:
+        return get_gemini_model(self.api_key, self.model)
+
+    @staticmethod
+    def _combine(prompt: str, system_prompt: str) -> str:
+        # Gemini takes a single prompt, so the system prompt is prepended
+        return f"System: {system_prompt}\n\nUser: {prompt}"
+
+    def generate(self, prompt: str, system_prompt: str, temperature: float,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            model = self._model()
+            try:
+                response = model.generate_content(
+                    self._combine(prompt, system_prompt),
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            except google_exceptions.InvalidArgument as e:
+                if not response_schema or not self.response_schemas \
+                        or not _is_schema_error(e, self.SCHEMA_ERROR_MARKERS):
+                    raise
+                self._schema_rejected(e)
+                response = model.generate_content(
+                    self._combine(prompt, system_prompt),
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            return response.text
+        except Exception as e:
+            logger.error(f"Gemini generation failed: {str(e)}")
+            raise
+
+    def stream(self, prompt: str, system_prompt: str, temperature: float) -> Iterator[str]:
+        response = self._model().generate_content(
+            self._combine(prompt, system_prompt),
+            generation_config=genai.types.GenerationConfig(temperature=temperature),
+            stream=True
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+            if text:
+                yield text
+
+    async def generate_async(self, prompt: str, system_prompt: str, temperature: float,
+                             response_schema: Optional[Dict[str, Any]] = None) -> str:
+        if gemini_uses_rest():
+            # The SDK's async client only speaks gRPC
+            return await asyncio.to_thread(self.generate, prompt, system_prompt, temperature, response_schema)
+        try:
+            model = self._model()
+            try:
+                response = await model.generate_content_async(
+                    self._combine(prompt, system_prompt),
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            except google_exceptions.InvalidArgument as e:
+                if not response_schema or not self.response_schemas \
+                        or not _is_schema_error(e, self.SCHEMA_ERROR_MARKERS):
+                    raise
+                self._schema_rejected(e)
+                response = await model.generate_content_async(
+                    self._combine(prompt, system_prompt),
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            return response.text
+        except Exception as e:
+            logger.error(f"Gemini generation failed: {str(e)}")
+            raise
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any server speaking the OpenAI chat completions API
+
+    ``timeout`` (seconds per request) and ``max_connections`` (per client)
+    default to the OpenAI SDK's own settings when not given.
+    """
+
+    name = "openai-compatible"
+    SCHEMA_ERROR_MARKERS = ("response_format", "json_schema", "structured output")
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 base_url: Optional[str] = None, timeout: Optional[float] = None,
+                 max_connections: Optional[int] = None):
+        super().__init__(api_key, model)
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # Switched off if the server rejects response_format
+        self.response_formats = True
+
+    def _response_format(self, response_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Only object replies can be requested; array schemas rely on the prompt and the repair parser
+        if not response_schema or response_schema.get("type") != "object" \
+                or not self.response_formats or not structured_output_enabled():
+            return {}
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "response", "schema": response_schema}
+        }}
+
+    def _format_rejected(self, error: Exception) -> None:
+        logger.warning(f"{self.name} model {self.model} rejected response_format, "
+                       f"relying on the prompt alone: {str(error)}")
+        self.response_formats = False
+
+    def _messages(self, prompt: str, system_prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def client(self) -> OpenAI:
+        # Clients are pooled per key and endpoint so agents and requests share connections
+        return get_openai_client(self.api_key, self.base_url, self.timeout, self.max_connections)
+
+    def async_client(self) -> AsyncOpenAI:
+        # AsyncOpenAI clients are bound to the event loop that created them,
+        # so the pool keeps one per running loop
+        return get_async_openai_client(self.api_key, self.base_url, self.timeout, self.max_connections)
+
+    def generate(self, prompt: str, system_prompt: str, temperature: float,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        options = self._response_format(response_schema)
+        try:
+            completion = self.client().chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt, system_prompt),
+                temperature=temperature,
+                **options
+            )
+        except BadRequestError as e:
+            if not options or not _is_schema_error(e, self.SCHEMA_ERROR_MARKERS):
+                raise
+            self._format_rejected(e)
+            return self.generate(prompt, system_prompt, temperature)
+        return completion.choices[0].message.content
+
+    def stream(self, prompt: str, system_prompt: str, temperature: float) -> Iterator[str]:
+        stream = self.client().chat.completions.create(
+            model=self.model,
+            messages=self._messages(prompt, system_prompt),
+            temperature=temperature,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def generate_async(self, prompt: str, system_prompt: str, temperature: float,
+                             response_schema: Optional[Dict[str, Any]] = None) -> str:
+        options = self._response_format(response_schema)
+        try:
+            completion = await self.async_client().chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt, system_prompt),
+                temperature=temperature,
+                **options
+            )
+        except BadRequestError as e:
+            if not options or not _is_schema_error(e, self.SCHEMA_ERROR_MARKERS):
+                raise
+            self._format_rejected(e)
+            return await self.generate_async(prompt, system_prompt, temperature)
+        return completion.choices[0].message.content
+
+class OpenRouterProvider(OpenAICompatibleProvider):
+    name = "openrouter"
+    DEFAULT_MODEL = "anthropic/claude-3-opus:beta"
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        super().__init__(api_key or os.getenv("OPENROUTER_API_KEY"), model, base_url=openrouter_base_url())
+
+class LocalProvider(OpenAICompatibleProvider):
+    """An OpenAI-compatible model server on this machine or the local network"""
+
+    name = "local"
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        max_connections = os.getenv("LOCAL_LLM_MAX_CONNECTIONS")
+        super().__init__(
+            # Local servers usually ignore the key, but the SDK requires one
+            api_key or os.getenv("LOCAL_LLM_API_KEY") or "local",
+            model or os.getenv("LOCAL_LLM_MODEL") or "local-model",
+            base_url=os.getenv("LOCAL_LLM_BASE_URL") or LOCAL_LLM_BASE_URL,
+            timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", "300")),
+            max_connections=int(max_connections) if max_connections else None
+        )
+
+    @property
+    def cache_namespace(self) -> str:
+        # Model ids of local servers are not globally meaningful
+        return f"{self.name}:{self.base_url}"
+
+_providers: Dict[str, Callable[..., LLMProvider]] = {}
+_providers_lock = threading.Lock()
+
+def register_provider(name: str, factory: Callable[..., LLMProvider]) -> None:
+    """Make a backend available by name; ``factory(api_key=..., model=...)`` builds it"""
+    with _providers_lock:
+        _providers[name] = factory
+
+def available_providers() -> List[str]:
+    with _providers_lock:
+        return sorted(_providers)
+
+def create_provider(name: str, api_key: Optional[str] = None, model: Optional[str] = None) -> LLMProvider:
+    with _providers_lock:
+        factory = _providers.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown LLM provider '{name}'; available: {', '.join(available_providers())}")
+    return factory(api_key=api_key, model=model)
+
+register_provider("gemini", GeminiProvider)
+register_provider("openrouter", OpenRouterProvider)
+register_provider("local", LocalProvider)
+
+# Agents whose backend can be overridden with <AGENT>_LLM_PROVIDER / <AGENT>_LLM_MODEL
+AGENT_ROLES = ("orchestrator", "planner", "report")
+
+# Providers that bill the user's own key; overrides never fall back to the server's key for them
+KEYED_PROVIDERS = ("gemini", "openrouter")
+
+def agent_providers_from_env(api_keys: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, LLMProvider]:
+    """Per-agent backends configured in the environment, e.g. PLANNER_LLM_PROVIDER=local
+
+    ``api_keys`` maps provider names to the keys of the user the system
+    serves. An override naming gemini or openrouter uses that key, or
+    <AGENT>_LLM_API_KEY when set; without either the override is skipped
+    and the agent keeps the main provider. Unknown provider names raise
+    ValueError, so call this once at startup to validate the settings.
+    """
+    api_keys = api_keys or {}
+    providers = {}
+    for role in AGENT_ROLES:
+        name = os.getenv(f"{role.upper()}_LLM_PROVIDER")
+        if not name:
+            continue
+        api_key = os.getenv(f"{role.upper()}_LLM_API_KEY") or api_keys.get(name)
+        if name in KEYED_PROVIDERS and not api_key:
+            logger.warning(f"No {name} API key for the {role} agent override, keeping the main provider")
+            continue
+        providers[role] = create_provider(name, api_key=api_key, model=os.getenv(f"{role.upper()}_LLM_MODEL") or None)
+    return providers
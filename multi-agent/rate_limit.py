@@ -0,0 +1,206 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from tenacity import (
+    Retrying,
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from client_pool import credential_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Requests per second and burst size per provider; override with
+# RATE_LIMIT_<PROVIDER>_RPS / RATE_LIMIT_<PROVIDER>_BURST
+DEFAULT_RATE_LIMITS = {
+    "gemini": (2.0, 5),
+    "openrouter": (2.0, 5),
+    "tavily": (2.0, 5),
+    # Local model servers have no quota; their connection limit does the throttling
+    "local": (100.0, 100),
+}
+FALLBACK_RATE_LIMIT = (2.0, 5)
+
+MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+MAX_BACKOFF_SECONDS = 60.0
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every caller of one provider key
+
+    acquire() reserves a token immediately, possibly going into debt, and
+    sleeps for however long the reservation is ahead of the refill rate,
+    so concurrent callers are spaced out rather than bursting.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.throttled_seconds = 0.0
+        self.retries = 0
+        self.retry_wait_seconds = 0.0
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            self.acquisitions += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.throttled_seconds += wait
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds waited"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_retry(self, wait: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.retry_wait_seconds += wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.acquisitions,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "retries": self.retries,
+                "retry_wait_seconds": round(self.retry_wait_seconds, 3)
+            }
+
+_limiters: Dict[tuple, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str, api_key: Optional[str]) -> TokenBucket:
+    """Return the process-wide limiter for a provider and API key"""
+    key = (provider, credential_fingerprint(api_key))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rate, burst = DEFAULT_RATE_LIMITS.get(provider, FALLBACK_RATE_LIMIT)
+            prefix = f"RATE_LIMIT_{provider.upper()}"
+            limiter = TokenBucket(
+                rate=float(os.getenv(f"{prefix}_RPS", rate)),
+                capacity=int(os.getenv(f"{prefix}_BURST", burst))
+            )
+            _limiters[key] = limiter
+        return limiter
+
+def throttle_stats() -> Dict[str, Dict[str, Any]]:
+    """Throttling and retry metrics per provider (summed over keys)"""
+    totals: Dict[str, Dict[str, Any]] = {}
+    with _limiters_lock:
+        items = list(_limiters.items())
+    for (provider, _), limiter in items:
+        entry = totals.setdefault(provider, {})
+        for name, value in limiter.stats().items():
+            entry[name] = round(entry.get(name, 0) + value, 3)
+    return totals
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for attr in ("status_code", "status", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, transient server errors and connection problems are worth retrying"""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("Timeout", "Connection", "ResourceExhausted", "ServiceUnavailable"))
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read a Retry-After hint (seconds or HTTP date) from a provider error"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class _RetryAfterWait:
+    """Exponential backoff with full jitter that defers to Retry-After when given"""
+
+    def __init__(self):
+        self._backoff = wait_random_exponential(multiplier=1, max=MAX_BACKOFF_SECONDS)
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        error = retry_state.outcome.exception() if retry_state.outcome else None
+        hinted = retry_after_seconds(error) if error is not None else None
+        if hinted is not None:
+            return min(hinted + random.uniform(0, 1), MAX_BACKOFF_SECONDS)
+        return self._backoff(retry_state)
+
+def _retry_kwargs(limiter: TokenBucket, label: str) -> Dict[str, Any]:
+    def before_sleep(retry_state: RetryCallState) -> None:
+        wait = retry_state.next_action.sleep if retry_state.next_action else 0.0
+        limiter.record_retry(wait)
+        logger.warning(
+            f"{label} failed (attempt {retry_state.attempt_number}/{MAX_ATTEMPTS}): "
+            f"{retry_state.outcome.exception()}; retrying in {wait:.1f}s"
+        )
+
+    return {
+        "retry": retry_if_exception(is_retryable),
+        "wait": _RetryAfterWait(),
+        "stop": stop_after_attempt(MAX_ATTEMPTS),
+        "before_sleep": before_sleep,
+        "reraise": True,
+    }
+
+def retrying(limiter: TokenBucket, label: str) -> Retrying:
+    """Retry controller for call sites that cannot be wrapped in a single callable"""
+    return Retrying(**_retry_kwargs(limiter, label))
+
+def call_with_retry(fn: Callable[[], Any], limiter: TokenBucket, label: str) -> Any:
+    """Call fn under the limiter, retrying transient failures with backoff"""
+    for attempt in Retrying(**_retry_kwargs(limiter, label)):
+        with attempt:
+            limiter.acquire()
+            return fn()
+
+async def call_with_retry_async(fn: Callable[[], Any], limiter: TokenBucket, label: str) -> Any:
+    """Async variant of call_with_retry; fn returns an awaitable"""
+    async for attempt in AsyncRetrying(**_retry_kwargs(limiter, label)):
+        with attempt:
+            await limiter.acquire_async()
+            return await fn()
@@ -0,0 +1,85 @@
+"""Local relevance scoring of search results against a research item
+
+RelevanceScorer scores a whole batch of results in one vectorized pass.
+The item's content words form the vocabulary, term frequencies for every
+result come from a single bincount, and saturating them with length
+normalization (the term-frequency part of BM25, without IDF: every term
+of the item weighs the same) turns them into a score between 0 and 1: the
+share of the item's terms a result covers, weighted by how often it uses
+them.
+"""
+import os
+import logging
+from typing import Any, Dict, List
+import numpy as np
+from utils import tokenize
+from tracing import METRICS
+
+logger = logging.getLogger(__name__)
+
+METRICS.describe("research_relevance_results_total", "counter",
+                 "Search results scored for relevance, by outcome (accepted, off_topic)")
+
+def term_matrix(tokens: List[List[str]], vocabulary: Dict[str, int]) -> np.ndarray:
+    """Term frequencies of tokenized texts over a vocabulary, one row per text, in one bincount"""
+    lengths = np.fromiter((len(words) for words in tokens), dtype=np.int64, count=len(tokens))
+    columns = np.fromiter((vocabulary.get(word, -1) for words in tokens for word in words),
+                          dtype=np.int64, count=int(lengths.sum()))
+    rows = np.repeat(np.arange(len(tokens)), lengths)
+    matched = columns >= 0
+    return np.bincount(rows[matched] * len(vocabulary) + columns[matched],
+                       minlength=len(tokens) * len(vocabulary)).reshape(len(tokens), len(vocabulary))
+
+class RelevanceScorer:
+    """Saturated term-frequency scoring of result texts against a topic, with an acceptance threshold"""
+
+    def __init__(self, threshold: float = 0.1, k1: float = 1.2, b: float = 0.75):
+        # Results scoring below this are off topic; 0 accepts everything
+        self.threshold = threshold
+        # As in BM25: k1 caps the weight of repeated terms, b scales length normalization
+        self.k1 = k1
+        self.b = b
+
+    def score(self, topic: str, texts: List[str]) -> np.ndarray:
+        """Relevance of each text to the topic, between 0 and 1
+
+        Topics without content words give every text a score of 1.
+        """
+        terms = list(dict.fromkeys(tokenize(str(topic))))
+        if not texts:
+            return np.zeros(0)
+        if not terms:
+            return np.ones(len(texts))
+        tokens = [tokenize(text) for text in texts]
+        lengths = np.fromiter((len(words) for words in tokens), dtype=np.int64, count=len(tokens))
+        # Term frequencies for the whole batch: one row per text, one column per topic term
+        tf = term_matrix(tokens, {term: column for column, term in enumerate(terms)})
+
+        average_length = max(float(lengths.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        saturated = tf * (self.k1 + 1) / (tf + norm[:, None])
+        return saturated.sum(axis=1) / (len(terms) * (self.k1 + 1))
+
+    def score_results(self, topic: str, results: List[Dict[str, Any]]) -> np.ndarray:
+        """Score search results on their title and content"""
+        return self.score(topic, [f"{r.get('title', '')}\n{r.get('content', '')}" for r in results])
+
+    def accepts(self, scores: np.ndarray) -> np.ndarray:
+        """Boolean mask of the scores that pass the threshold"""
+        accepted = scores >= self.threshold
+        METRICS.inc("research_relevance_results_total", int(accepted.sum()), outcome="accepted")
+        METRICS.inc("research_relevance_results_total", int(len(scores) - accepted.sum()), outcome="off_topic")
+        return accepted
+
+def get_default_relevance_scorer() -> RelevanceScorer:
+    """Return a scorer configured from the environment
+
+    RELEVANCE_THRESHOLD sets the acceptance threshold (default 0.1, 0 keeps
+    every result that is not a duplicate or too short).
+    """
+    try:
+        threshold = float(os.getenv("RELEVANCE_THRESHOLD", "0.1"))
+    except ValueError:
+        logger.error(f"Invalid RELEVANCE_THRESHOLD {os.getenv('RELEVANCE_THRESHOLD')!r}, using 0.1")
+        threshold = 0.1
+    return RelevanceScorer(threshold=threshold)
@@ -0,0 +1,53 @@
+from collections import Counter
+from typing import List, Dict, Set, Iterable
+from utils import extract_terms
+
+class ResearchIndex:
+    """Inverted index over gathered result texts
+
+    Texts are tokenized once, when they are added, into whole lowercased
+    words without stopwords. Depth checks then become set lookups over the
+    postings instead of substring scans over every text.
+    """
+
+    def __init__(self, substantial_length: int = 300):
+        # Texts shorter than this never count as a substantial mention
+        self.substantial_length = substantial_length
+        self.postings: Dict[str, Set[int]] = {}
+        self.doc_lengths: List[int] = []
+        self.substantial_docs: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        """Index a newly gathered text and return its document id"""
+        doc_id = len(self.doc_lengths)
+        self.doc_lengths.append(len(text))
+        if len(text) > self.substantial_length:
+            self.substantial_docs.add(doc_id)
+        for term in extract_terms(text):
+            self.postings.setdefault(term, set()).add(doc_id)
+        return doc_id
+
+    def extend(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            self.add(text)
+
+    def substantial_mentions(self, topic: str, min_matches: int = 2) -> int:
+        """Count detailed texts that contain at least min_matches of the topic's words"""
+        topic_terms = extract_terms(str(topic))
+        if not topic_terms:
+            return 0
+        # Single-word topics can only ever match one word
+        required = min(min_matches, len(topic_terms))
+        matches = Counter()
+        for term in topic_terms:
+            for doc_id in self.postings.get(term, ()):
+                if doc_id in self.substantial_docs:
+                    matches[doc_id] += 1
+        return sum(1 for count in matches.values() if count >= required)
+
+    def has_sufficient_depth(self, topic: str, min_mentions: int = 2) -> bool:
+        """Require multiple substantial mentions of the topic"""
+        return self.substantial_mentions(topic) >= min_mentions
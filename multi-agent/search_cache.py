@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from llm_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry"""
+    return " ".join(str(query).lower().split()).strip(" ?.!")
+
+class SearchResultCache:
+    """Two-tier TTL + LRU cache for web search results
+
+    The memory tier is an ordered dict capped at ``max_entries``. When
+    ``disk_path`` is given, entries are also written to a SQLite store
+    that survives restarts and is consulted on memory misses.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: Optional[float] = 6 * 3600,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 20000,
+                 disk_ttl_seconds: Optional[float] = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskLRUCache(
+            disk_path, max_entries=disk_max_entries, ttl_seconds=disk_ttl_seconds
+        ) if disk_path else None
+
+    @staticmethod
+    def make_key(query: str, **params) -> str:
+        """Build the cache key from the normalized query and search parameters"""
+        return json.dumps([normalize_query(query), sorted(params.items())])
+
+    def _remember(self, key: str, results: List[Dict[str, Any]], stored_at: float) -> None:
+        self._entries[key] = (stored_at, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, query: str, **params) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for the query, or None on a miss"""
+        key = self.make_key(query, **params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, results = entry
+                if self.ttl_seconds is None or now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return results
+                del self._entries[key]
+
+        if self.disk is not None:
+            payload = self.disk.get(key)
+            if payload is not None:
+                results = json.loads(payload)
+                with self._lock:
+                    self._remember(key, results, now)
+                    self.disk_hits += 1
+                return results
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, query: str, results: List[Dict[str, Any]], **params) -> None:
+        key = self.make_key(query, **params)
+        with self._lock:
+            self._remember(key, results, time.time())
+        if self.disk is not None:
+            try:
+                self.disk.set(key, json.dumps(results))
+            except Exception as e:
+                logger.error(f"Failed to write search cache entry: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+_default_cache: Optional[SearchResultCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_search_cache() -> Optional[SearchResultCache]:
+    """Return the process-wide search cache configured from the environment
+
+    Set SEARCH_CACHE_DISABLED=1 to turn caching off. SEARCH_CACHE_PATH
+    enables the on-disk tier; SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS
+    and SEARCH_CACHE_DISK_TTL_SECONDS override the defaults.
+    """
+    global _default_cache
+    if os.getenv("SEARCH_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = SearchResultCache(
+                    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000")),
+                    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(6 * 3600))),
+                    disk_path=os.getenv("SEARCH_CACHE_PATH") or None,
+                    disk_ttl_seconds=float(os.getenv("SEARCH_CACHE_DISK_TTL_SECONDS", str(24 * 3600)))
+                )
+            except Exception as e:
+                logger.error(f"Failed to open search cache, continuing without it: {str(e)}")
+                return None
+        return _default_cache
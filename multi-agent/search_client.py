@@ -0,0 +1,65 @@
+import logging
+from typing import Dict, Any, Optional
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+class SearchAPIError(RuntimeError):
+    """Non-200 response from the search API"""
+
+    def __init__(self, status: int, detail: str, retry_after: Optional[str] = None):
+        super().__init__(f"Tavily search failed with status {status}: {detail}")
+        self.status = status
+        self.retry_after = retry_after
+
+class AsyncTavilyClient:
+    """Minimal non-blocking client for the Tavily search endpoint
+
+    One aiohttp session is opened per client so that every search of a
+    research run reuses the same connection pool. Use it as an async
+    context manager so the session is closed when the run finishes.
+    """
+
+    def __init__(self, api_key: str, base_url: str = TAVILY_API_URL, timeout: float = 30):
+        if not api_key:
+            raise ValueError("Tavily API key not provided")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncTavilyClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def search(self, query: str, search_depth: str = "advanced",
+                     max_results: int = 5, **kwargs) -> Dict[str, Any]:
+        """Run a search and return the raw Tavily response payload"""
+        payload = {
+            "api_key": self.api_key,
+            "query": query,
+            "search_depth": search_depth,
+            "max_results": max_results,
+            **kwargs
+        }
+        async with self._get_session().post(f"{self.base_url}/search", json=payload) as response:
+            if response.status != 200:
+                detail = await response.text()
+                raise SearchAPIError(response.status, detail, response.headers.get("Retry-After"))
+            return await response.json()
@@ -0,0 +1,181 @@
+"""Tolerant parsing of JSON replies from LLMs and tracking of how often it fails
+
+parse_json() accepts what models commonly wrap around or do to JSON:
+code fences, prose before and after, trailing commas, comments, smart
+quotes, Python literals, single-quoted strings and output cut off before
+the closing brackets. Each structured call is recorded with one outcome:
+
+- ok: the reply parsed as it was
+- repaired: the reply only parsed after repair
+- reasked: the reply was unusable and a single re-ask fixed it
+- failed: the re-ask did not help either and the caller fell back
+"""
+import re
+import ast
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from tracing import METRICS, annotate
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("ok", "repaired", "reasked", "failed")
+
+METRICS.describe("research_structured_output_total", "counter",
+                 "Structured LLM replies by operation and outcome (ok, repaired, reasked, failed)")
+
+class StructuredOutputError(ValueError):
+    """An LLM reply that could not be turned into the expected structure"""
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+def _extract(text: str) -> Optional[str]:
+    """The first JSON object or array in text, closing it if the text was cut off"""
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        return None
+    stack, quote, escaped = [], None, False
+    for position in range(start, len(text)):
+        ch = text[position]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                return None
+            stack.pop()
+            if not stack:
+                return text[start:position + 1]
+    # Truncated reply: close the open string and brackets
+    fragment = text[start:].rstrip().rstrip(",")
+    if quote:
+        fragment += quote
+    return fragment + "".join(reversed(stack))
+
+def _normalize(fragment: str) -> str:
+    """Rewrite the JSON-like parts models get wrong, leaving string contents alone"""
+    out, position, quote = [], 0, None
+    while position < len(fragment):
+        ch = fragment[position]
+        if quote:
+            if ch == "\\" and position + 1 < len(fragment):
+                out.append(fragment[position:position + 2])
+                position += 2
+                continue
+            if ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"' and quote == "'":
+                out.append('\\"')
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif fragment.startswith("//", position):
+            newline = fragment.find("\n", position)
+            position = len(fragment) if newline < 0 else newline
+            continue
+        elif fragment.startswith("/*", position):
+            end = fragment.find("*/", position + 2)
+            position = len(fragment) if end < 0 else end + 2
+            continue
+        else:
+            word = re.match(r"[A-Za-z]+", fragment[position:])
+            if word:
+                out.append(_PYTHON_LITERALS.get(word.group(0), word.group(0)))
+                position += len(word.group(0))
+                continue
+            out.append(ch)
+        position += 1
+    return _TRAILING_COMMA.sub(r"\1", "".join(out))
+
+def parse_json(text: Optional[str]) -> Tuple[Any, bool]:
+    """Parse a JSON reply, returning (value, whether it needed repair)
+
+    Raises StructuredOutputError when nothing usable can be recovered.
+    """
+    if not text or not text.strip():
+        raise StructuredOutputError("empty reply")
+    stripped = text.strip()
+    try:
+        return json.loads(stripped), False
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _FENCE.search(stripped)
+    candidates = [fenced.group(1).strip()] if fenced else []
+    candidates.append(stripped.translate(_SMART_QUOTES))
+    for candidate in candidates:
+        fragment = _extract(candidate.translate(_SMART_QUOTES))
+        if fragment is None:
+            continue
+        for attempt in (fragment, _normalize(fragment)):
+            try:
+                return json.loads(attempt), True
+            except json.JSONDecodeError:
+                pass
+        try:
+            # Python-style dicts and lists that survived normalization
+            return ast.literal_eval(fragment), True
+        except (ValueError, SyntaxError):
+            pass
+    raise StructuredOutputError(f"no valid JSON found in reply: {stripped[:200]!r}")
+
+class StructuredOutputStats:
+    """Thread-safe outcome counts per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(operation, dict.fromkeys(OUTCOMES, 0))
+            counts[outcome] += 1
+        METRICS.inc("research_structured_output_total", operation=operation, outcome=outcome)
+        annotate(structured_output=outcome)
+        if outcome != "ok":
+            logger.info(f"Structured output for {operation}: {outcome}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counts per operation with the share of replies that were malformed and that failed"""
+        with self._lock:
+            snapshot = {operation: dict(counts) for operation, counts in self._counts.items()}
+        for counts in snapshot.values():
+            total = sum(counts[outcome] for outcome in OUTCOMES)
+            counts["malformed_rate"] = round((total - counts["ok"]) / total, 3) if total else 0.0
+            counts["failure_rate"] = round(counts["failed"] / total, 3) if total else 0.0
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+STRUCTURED_OUTPUT_STATS = StructuredOutputStats()
+
+def reask_prompt(prompt: str, response: Optional[str], error: Exception, schema: Dict[str, Any]) -> str:
+    """Ask for the same answer again as valid JSON
+
+    When the reply contained something JSON-like only that reply is sent
+    back to be fixed; otherwise the original prompt is repeated.
+    """
+    instructions = (f"Reply with ONLY valid JSON matching this JSON schema, with no other text:\n"
+                    f"{json.dumps(schema)}")
+    if response and any(ch in response for ch in "{["):
+        return (f"Your previous reply could not be used: {error}\n\n"
+                f"Previous reply:\n{response[:4000]}\n\n"
+                f"Return the same content, corrected. {instructions}")
+    return f"{prompt}\n\nYour previous reply could not be used: {error}\n{instructions}"
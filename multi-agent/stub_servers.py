@@ -0,0 +1,371 @@
+"""Local stand-ins for the OpenRouter, Gemini and Tavily APIs
+
+The stubs speak just enough of each wire protocol for the research
+pipeline to run end to end without API credits. Each one has a
+configurable latency, failure rate and payload size and counts the
+requests, bytes and tokens it receives, so the benchmark can measure the
+pipeline itself rather than the providers.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from aiohttp import web
+from utils import count_tokens
+
+# Marker the stub LLM counts to decide how much research has been gathered
+SOURCE_MARKER = re.compile(r"\[stub-source-([0-9a-f]+-\d+)\]")
+
+_FILLER_WORDS = (
+    "analysis architecture benchmark cache compiler dataset evaluation framework gradient "
+    "hardware inference kernel latency memory network optimizer parameter pipeline quantization "
+    "runtime sampling scheduler sparsity throughput tokenizer training vector workload"
+).split()
+
+class StubConfig:
+    """Behaviour knobs shared by all stub servers"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 payload_chars: int = 1500, report_chars: int = 4000, plan_size: int = 3,
+                 sources_per_aspect: int = 6, page_chars: int = 8000, seed: int = 0):
+        # Seconds added to every response, plus up to ``jitter`` more at random
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests answered with a retryable 503
+        self.failure_rate = failure_rate
+        # Characters of content per search result and per generated report
+        self.payload_chars = payload_chars
+        self.report_chars = report_chars
+        # Items per research plan section
+        self.plan_size = plan_size
+        # Distinct sources needed before the stub judges one more aspect covered
+        self.sources_per_aspect = sources_per_aspect
+        # Characters of article text on each page served by PageStub
+        self.page_chars = page_chars
+        self.seed = seed
+
+class StubServer:
+    """aiohttp application served from a background thread on an ephemeral port"""
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.url: Optional[str] = None
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.reset_stats()
+
+    def routes(self, app: web.Application) -> None:
+        raise NotImplementedError
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats: Dict[str, Any] = {
+                "requests": 0, "failures": 0, "bytes_in": 0, "bytes_out": 0,
+                "tokens_in": 0, "tokens_out": 0, "calls": {}
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _record(self, kind: str, bytes_in: int, bytes_out: int = 0,
+                tokens_in: int = 0, tokens_out: int = 0) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+            self.stats["tokens_in"] += tokens_in
+            self.stats["tokens_out"] += tokens_out
+            self.stats["calls"][kind] = self.stats["calls"].get(kind, 0) + 1
+
+    async def _delay_or_fail(self) -> Optional[web.Response]:
+        with self._lock:
+            delay = self.config.latency + self._random.random() * self.config.jitter
+            failed = self._random.random() < self.config.failure_rate
+            if failed:
+                self.stats["failures"] += 1
+        await asyncio.sleep(delay)
+        if failed:
+            return web.json_response(
+                {"error": {"message": "Injected stub failure", "code": 503}},
+                status=503, headers={"Retry-After": "0"}
+            )
+        return None
+
+    def start(self) -> str:
+        """Start serving and return the base URL"""
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application(client_max_size=64 * 1024 * 1024)
+            self.routes(app)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://127.0.0.1:{port}"
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve, name=f"{type(self).__name__}", daemon=True).start()
+        started.wait(10)
+        return self.url
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+class StubLLM(StubServer):
+    """Shared prompt handling for the chat-completion stand-ins
+
+    Responses are shaped by which agent prompt arrives: plans with
+    ``plan_size`` items per section, three search queries per item
+    (one item or a numbered batch),
+    coverage verdicts that turn true as more distinct sources appear in
+    the evaluate prompt, and a report of ``report_chars`` characters.
+    """
+
+    def classify(self, prompt: str) -> str:
+        if "Create a detailed research plan" in prompt:
+            return "create_research_plan"
+        if "queries for each of these research items" in prompt:
+            return "create_search_strategies"
+        if "highly specific search queries" in prompt:
+            return "create_search_strategy"
+        if "evaluate completeness" in prompt or "evaluation of research completeness" in prompt:
+            return "evaluate_research_progress"
+        if "Generate a comprehensive technical report" in prompt:
+            return "generate_report"
+        return "other"
+
+    def respond(self, kind: str, prompt: str) -> str:
+        config = self.config
+        if kind == "create_research_plan":
+            match = re.search(r"following query: (.*)", prompt)
+            topic = match.group(1).strip() if match else "topic"
+            return json.dumps({
+                section: [f"{topic} {label} {i + 1}" for i in range(config.plan_size)]
+                for section, label in (
+                    ("core_concepts", "concept"), ("key_questions", "question"),
+                    ("information_requirements", "requirement"), ("research_priorities", "priority")
+                )
+            })
+        if kind == "create_search_strategy":
+            match = re.search(r"for this \w+: (.*)", prompt)
+            item = match.group(1).strip() if match else "topic"
+            return json.dumps([f"{item} {suffix}" for suffix in ("overview", "implementation", "benchmarks")])
+        if kind == "create_search_strategies":
+            return json.dumps({
+                number: [f"{item.strip()} {suffix}" for suffix in ("overview", "implementation", "benchmarks")]
+                for number, item in re.findall(r"^\s*(\d+)\. \[\w+\] (.*)$", prompt, re.MULTILINE)
+            })
+        if kind == "evaluate_research_progress":
+            # Digests in incremental prompts keep the marker at the start of each source
+            sources = len(set(SOURCE_MARKER.findall(prompt)))
+            covered = sources // max(1, config.sources_per_aspect)
+            return json.dumps({
+                key: covered > position
+                for position, key in enumerate(("core_concepts", "key_questions", "information_requirements"))
+            })
+        if kind == "generate_report":
+            paragraph = "This section summarizes the stub findings in detail. "
+            body = (paragraph * (config.report_chars // len(paragraph) + 1))[:config.report_chars]
+            return f"# Benchmark Report\n\n## Findings\n\n{body}"
+        return "OK"
+
+    def complete(self, prompt: str) -> tuple:
+        kind = self.classify(prompt)
+        return kind, self.respond(kind, prompt)
+
+    @staticmethod
+    def chunks(text: str, size: int = 200):
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+class OpenAIStub(StubLLM):
+    """OpenAI-compatible /chat/completions endpoint (set OPENROUTER_BASE_URL to ``url + '/v1'``)"""
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.read()
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            self._record("failed", len(raw))
+            return failure
+        body = json.loads(raw)
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        kind, text = self.complete(prompt)
+        tokens_in, tokens_out = count_tokens(prompt), count_tokens(text)
+        created = int(time.time())
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": tokens_in, "completion_tokens": tokens_out,
+                          "total_tokens": tokens_in + tokens_out}
+            }).encode("utf-8")
+            self._record(kind, len(raw), len(payload), tokens_in, tokens_out)
+            return web.Response(body=payload, content_type="application/json")
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        sent = 0
+        for piece in self.chunks(text):
+            event = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            })
+            data = f"data: {event}\n\n".encode("utf-8")
+            sent += len(data)
+            await response.write(data)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        self._record(kind, len(raw), sent, tokens_in, tokens_out)
+        return response
+
+class GeminiStub(StubLLM):
+    """Gemini REST generateContent endpoint (set GEMINI_API_ENDPOINT to ``url``)"""
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/v1beta/models/{call}", self.generate_content)
+
+    @staticmethod
+    def _candidate(text: str, finished: bool = True) -> Dict[str, Any]:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        return candidate
+
+    async def generate_content(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.read()
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            self._record("failed", len(raw))
+            return failure
+        body = json.loads(raw)
+        prompt = "\n".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        kind, text = self.complete(prompt)
+        tokens_in, tokens_out = count_tokens(prompt), count_tokens(text)
+        usage = {"promptTokenCount": tokens_in, "candidatesTokenCount": tokens_out,
+                 "totalTokenCount": tokens_in + tokens_out}
+
+        if not request.match_info["call"].endswith(":streamGenerateContent"):
+            payload = json.dumps({"candidates": [self._candidate(text)], "usageMetadata": usage}).encode("utf-8")
+            self._record(kind, len(raw), len(payload), tokens_in, tokens_out)
+            return web.Response(body=payload, content_type="application/json")
+
+        # The SDK's REST transport reads the stream as one JSON array
+        pieces = self.chunks(text)
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        sent = 0
+        for position, piece in enumerate(pieces):
+            last = position == len(pieces) - 1
+            chunk = {"candidates": [self._candidate(piece, finished=last)]}
+            if last:
+                chunk["usageMetadata"] = usage
+            data = (("[" if position == 0 else ",") + json.dumps(chunk) + ("]" if last else "")).encode("utf-8")
+            sent += len(data)
+            await response.write(data)
+        await response.write_eof()
+        self._record(kind, len(raw), sent, tokens_in, tokens_out)
+        return response
+
+class TavilyStub(StubServer):
+    """Tavily /search endpoint (set TAVILY_API_URL to ``url``)
+
+    Results are deterministic per query, distinct across queries and
+    varied enough in wording not to trip near-duplicate detection. Set
+    ``page_url`` to a PageStub's URL to make result URLs fetchable.
+    """
+
+    def __init__(self, config: Optional[StubConfig] = None, page_url: Optional[str] = None):
+        super().__init__(config)
+        self.page_url = page_url
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/search", self.search)
+
+    def _content(self, query: str, source_id: str) -> str:
+        rng = random.Random(source_id)
+        words = [rng.choice(_FILLER_WORDS) for _ in range(self.config.payload_chars // 8)]
+        text = f"[stub-source-{source_id}] {query}. " + " ".join(words)
+        return text[:max(self.config.payload_chars, len(query) + 40)]
+
+    async def search(self, request: web.Request) -> web.Response:
+        raw = await request.read()
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            self._record("failed", len(raw))
+            return failure
+        body = json.loads(raw)
+        query = str(body.get("query", ""))
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+        results = [
+            {
+                "title": f"{query} ({i + 1})",
+                "url": f"{self.page_url or 'https://stub.example'}/{digest}/{i}",
+                "content": self._content(query, f"{digest}-{i}"),
+                "score": round(1 - i * 0.1, 2),
+                "published_date": "2024-01-01"
+            }
+            for i in range(int(body.get("max_results", 5)))
+        ]
+        payload = json.dumps({"query": query, "results": results}).encode("utf-8")
+        self._record(f"search_{body.get('search_depth', 'basic')}", len(raw), len(payload))
+        return web.Response(body=payload, content_type="application/json")
+
+class PageStub(StubServer):
+    """Web pages behind TavilyStub results (pass ``url + '/page'`` as its ``page_url``)
+
+    Each page wraps ``page_chars`` of article text for the result in
+    navigation, scripts and a footer, like a typical site.
+    """
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_get("/page/{digest}/{index}", self.page)
+
+    def _article(self, source_id: str) -> str:
+        rng = random.Random(f"page-{source_id}")
+        paragraphs = []
+        length = 0
+        while length < self.config.page_chars:
+            paragraph = " ".join(rng.choice(_FILLER_WORDS) for _ in range(60))
+            paragraphs.append(f"<p>{paragraph}.</p>")
+            length += len(paragraph) + 1
+        return f"<p>[stub-source-{source_id}]</p>" + "".join(paragraphs)
+
+    async def page(self, request: web.Request) -> web.Response:
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            self._record("failed", 0)
+            return failure
+        source_id = f"{request.match_info['digest']}-{request.match_info['index']}"
+        html = (
+            f"<html><head><title>Stub page {source_id}</title>"
+            f"<script>var tracking = {{id: '{source_id}'}};</script><style>body {{ margin: 0 }}</style></head>"
+            f"<body><nav><a href='/'>Home</a> <a href='/about'>About</a></nav>"
+            f"<main><article><h1>Stub page {source_id}</h1>{self._article(source_id)}</article></main>"
+            f"<footer>Copyright stub.example</footer></body></html>"
+        ).encode("utf-8")
+        self._record("page", 0, len(html))
+        return web.Response(body=html, content_type="text/html", charset="utf-8")
@@ -0,0 +1,58 @@
+import asyncio
+from agents import OrchestratorAgent
+from providers import LLMProvider
+from tracing import Trace, activate
+from usage import summarize_usage
+from utils import count_tokens
+
+class ScriptedProvider(LLMProvider):
+    """Returns the given replies in order and records the prompts it was sent"""
+
+    name = "scripted"
+    DEFAULT_MODEL = "scripted-model"
+
+    def __init__(self, replies):
+        super().__init__(api_key="test")
+        self.replies = list(replies)
+        self.prompts = []
+
+    def generate(self, prompt, system_prompt, temperature, response_schema=None):
+        self.prompts.append((system_prompt, prompt))
+        return self.replies.pop(0)
+
+    async def generate_async(self, prompt, system_prompt, temperature, response_schema=None):
+        return self.generate(prompt, system_prompt, temperature, response_schema)
+
+PLAN = ('{"core_concepts": ["a"], "key_questions": ["b"], '
+        '"information_requirements": ["c"], "research_priorities": ["d"]}')
+
+def _expected_usage(backend, replies):
+    return (sum(count_tokens(system) + count_tokens(prompt) for system, prompt in backend.prompts),
+            sum(count_tokens(reply) for reply in replies))
+
+def test_reask_usage_counts_both_calls():
+    replies = ["I cannot answer in JSON", PLAN]
+    backend = ScriptedProvider(replies)
+    agent = OrchestratorAgent(backend=backend)
+    trace = Trace(query="q")
+    with activate(trace):
+        plan = agent.create_research_plan("q")
+    assert plan["core_concepts"] == ["a"]
+    usage = summarize_usage(trace)
+    assert usage["llm_calls"] == 2
+    assert (usage["input_tokens"], usage["output_tokens"]) == _expected_usage(backend, replies)
+
+def test_async_reask_usage_counts_both_calls():
+    replies = ["not json at all", PLAN]
+    backend = ScriptedProvider(replies)
+    agent = OrchestratorAgent(backend=backend)
+    trace = Trace(query="q")
+
+    async def run():
+        with activate(trace):
+            return await agent.create_research_plan_async("q")
+
+    asyncio.run(run())
+    usage = summarize_usage(trace)
+    assert usage["llm_calls"] == 2
+    assert (usage["input_tokens"], usage["output_tokens"]) == _expected_usage(backend, replies)
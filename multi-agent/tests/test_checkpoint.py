@@ -0,0 +1,74 @@
+import os
+import time
+import pytest
+from checkpoint import CheckpointStore, RunInProgressError, new_run_id
+from mcp_server import ResearchState
+from tracing import Trace, activate, annotate, span
+
+def test_save_and_load_round_trip(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save("run1", {"query": "q", "stage": "planned", "research_plan": {"core_concepts": ["a"]}})
+    loaded = store.load("run1")
+    assert loaded["query"] == "q"
+    assert loaded["research_plan"] == {"core_concepts": ["a"]}
+    assert loaded["run_id"] == "run1"
+    assert store.load("missing") is None
+
+def test_expired_checkpoints_are_dropped(tmp_path):
+    store = CheckpointStore(str(tmp_path), max_age_seconds=60)
+    store.save("old", {"query": "q"})
+    path = os.path.join(str(tmp_path), "old.json")
+    past = time.time() - 120
+    os.utime(path, (past, past))
+    assert store.cleanup() == 1
+    assert store.load("old") is None
+
+def test_unsafe_run_ids_are_rejected(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    for run_id in ("", "../escape", ".hidden"):
+        with pytest.raises(ValueError):
+            store.save(run_id, {})
+
+def test_lock_is_exclusive_until_released(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    run_id = new_run_id()
+    store.acquire(run_id)
+    with pytest.raises(RunInProgressError):
+        store.acquire(run_id)
+    store.release(run_id)
+    store.acquire(run_id)
+
+def test_stale_lock_is_taken_over(tmp_path):
+    store = CheckpointStore(str(tmp_path), lock_timeout=60)
+    store.acquire("run1")
+    past = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), "run1.lock"), (past, past))
+    store.acquire("run1")
+
+def test_research_state_round_trip(tmp_path):
+    state = ResearchState("what is q")
+    state.research_plan = {"core_concepts": ["q basics"]}
+    state.all_search_results = [{"url": "https://example.com/a", "title": "A", "content": "about q " * 20}]
+    state.duplicates.accept("https://example.com/a", "about q " * 20)
+    state.search_count = 4
+    state.progress = {"core_concepts": True}
+    state.off_topic_rejected = 2
+    state.started_at = time.monotonic() - 30
+    state.trace = Trace(query="what is q")
+    with activate(state.trace), span("create_research_plan"):
+        annotate(provider="stub", prompt_tokens=100, response_tokens=20)
+
+    store = CheckpointStore(str(tmp_path))
+    store.save("run1", state.to_checkpoint())
+    resumed = ResearchState("what is q")
+    resumed.restore(store.load("run1"))
+
+    assert resumed.research_plan == state.research_plan
+    assert resumed.all_search_results == state.all_search_results
+    assert resumed.seen_urls == state.seen_urls
+    assert (resumed.search_count, resumed.off_topic_rejected) == (4, 2)
+    assert resumed.progress == {"core_concepts": True}
+    # Usage and elapsed time carry over so budgets count from the first attempt
+    assert time.monotonic() - resumed.started_at >= 30
+    assert resumed.usage()["total_tokens"] == 120
+    assert resumed.usage()["by_agent"]["create_research_plan"]["input_tokens"] == 100
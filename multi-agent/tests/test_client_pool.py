@@ -0,0 +1,52 @@
+import threading
+import pytest
+from aiohttp import web
+from client_pool import get_gemini_model, get_registry
+from providers import GeminiProvider
+from stub_servers import GeminiStub, StubConfig
+
+class KeyRecordingGemini(GeminiStub):
+    """Gemini stand-in that records the API key each prompt arrived with"""
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.keys_by_sender = {}
+
+    async def generate_content(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        sender = body["contents"][0]["parts"][0]["text"].split("sender=", 1)[1].split()[0]
+        key = request.headers.get("x-goog-api-key") or request.query.get("key")
+        with self._lock:
+            self.keys_by_sender.setdefault(sender, set()).add(key)
+        return await super().generate_content(request)
+
+@pytest.fixture
+def gemini_stub(monkeypatch):
+    stub = KeyRecordingGemini(StubConfig(latency=0.01, jitter=0.02))
+    monkeypatch.setenv("GEMINI_API_ENDPOINT", stub.start())
+    get_registry().clear()
+    yield stub
+    get_registry().clear()
+    stub.stop()
+
+def test_gemini_models_send_their_own_key(gemini_stub):
+    def run(key):
+        provider = GeminiProvider(api_key=key, model="gemini-test")
+        for i in range(5):
+            provider.generate(f"sender={key} question {i}", "system", 0.1)
+
+    threads = [threading.Thread(target=run, args=(key,)) for key in ("key-a", "key-b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gemini_stub.keys_by_sender == {"key-a": {"key-a"}, "key-b": {"key-b"}}
+
+def test_gemini_model_keeps_its_key_after_another_key_is_used(gemini_stub):
+    # The interleaving of two sessions: one gets its model, the other gets
+    # a model for a different key, then the first one sends its request
+    model_a = get_gemini_model("key-a", "gemini-test")
+    model_b = get_gemini_model("key-b", "gemini-test")
+    model_a.generate_content("sender=key-a question")
+    model_b.generate_content("sender=key-b question")
+    assert gemini_stub.keys_by_sender == {"key-a": {"key-a"}, "key-b": {"key-b"}}
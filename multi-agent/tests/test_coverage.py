@@ -0,0 +1,41 @@
+from coverage import CoverageEstimator
+
+PLAN = {
+    "core_concepts": ["photovoltaic efficiency", "battery storage"],
+    "key_questions": ["how do inverters work"],
+    "information_requirements": [],
+}
+
+def _text(*words):
+    return " ".join(words) + " filler" * 80
+
+def test_items_need_enough_supporting_results():
+    coverage = CoverageEstimator(PLAN, min_sources=2)
+    estimate = coverage.update([_text("photovoltaic", "efficiency")])
+    assert estimate["core_concepts"] == 0.25
+    estimate = coverage.update([_text("photovoltaic", "efficiency"), _text("photovoltaic efficiency again")])
+    assert estimate["core_concepts"] == 0.5
+    assert estimate["key_questions"] == 0.0
+    # Aspects without plan items count as covered
+    assert estimate["information_requirements"] == 1.0
+
+def test_short_results_do_not_count():
+    coverage = CoverageEstimator(PLAN)
+    assert coverage.update(["photovoltaic efficiency"])["core_concepts"] == 0.0
+
+def test_evaluation_skipped_until_the_estimate_moves():
+    coverage = CoverageEstimator(PLAN, max_skips=2)
+    progress = {"core_concepts": False, "key_questions": False}
+    estimate = coverage.update([])
+    assert coverage.needs_evaluation(estimate, progress)
+    coverage.record_evaluation(estimate, progress)
+    assert not coverage.needs_evaluation(coverage.update([_text("unrelated")]), progress)
+    moved = coverage.update([_text("unrelated"), _text("inverters", "work"), _text("inverters work")])
+    assert coverage.needs_evaluation(moved, progress)
+
+def test_evaluation_forced_after_max_skips():
+    coverage = CoverageEstimator(PLAN, max_skips=1)
+    estimate = coverage.update([])
+    coverage.record_evaluation(estimate, {})
+    coverage.record_skip()
+    assert coverage.needs_evaluation(estimate, {})
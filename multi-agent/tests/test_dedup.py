@@ -0,0 +1,39 @@
+from dedup import DuplicateFilter, NearDuplicateIndex, canonicalize_url, simhash
+
+TEXT = (
+    "Solar panels convert sunlight into electricity using photovoltaic cells made of silicon. "
+    "Efficiency has improved steadily over the last decade as manufacturing costs fell. "
+    "Most residential systems today reach between eighteen and twenty two percent efficiency. "
+    "Panels lose a small share of their output every year, usually less than one percent. "
+    "Inverters turn the direct current from the panels into alternating current for the home. "
+    "Batteries let households store surplus energy for use in the evening and at night. "
+    "Grid operators increasingly pay for exported power at rates below the retail price. "
+    "Installation costs vary widely between regions because of permits and labour prices. "
+    "Researchers are testing perovskite layers that could push efficiency well past thirty percent. "
+    "Recycling programs for old panels are still small but expected to grow quickly."
+)
+EDITED = TEXT.replace("steadily", "gradually")
+
+def test_canonical_urls_ignore_tracking_and_cosmetic_differences():
+    assert canonicalize_url("HTTP://Example.com/a/?utm_source=x#top") == canonicalize_url("https://example.com/a")
+
+def test_simhash_is_stable_and_close_for_small_edits():
+    assert simhash(TEXT) == simhash(TEXT)
+    assert bin(simhash(TEXT) ^ simhash(EDITED)).count("1") <= 6
+
+def test_threshold_sets_the_allowed_bit_distance():
+    assert NearDuplicateIndex(0.9).max_distance == 6
+    assert NearDuplicateIndex(1.0).max_distance == 0
+
+def test_near_duplicates_are_rejected_and_distinct_texts_kept():
+    duplicates = DuplicateFilter(0.9)
+    assert duplicates.accept("https://a.example/1", TEXT)
+    assert not duplicates.accept("https://b.example/2", EDITED)
+    assert duplicates.accept("https://c.example/3", "A recipe for sourdough bread with a long cold fermentation. " * 4)
+    assert not duplicates.accept("https://a.example/1?utm_campaign=x", "anything")
+    assert duplicates.stats() == {"url": 1, "near_duplicate": 1}
+
+def test_disabled_threshold_only_dedups_urls():
+    duplicates = DuplicateFilter(None)
+    assert duplicates.accept("https://a.example/1", TEXT)
+    assert duplicates.accept("https://b.example/2", TEXT)
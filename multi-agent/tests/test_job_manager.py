@@ -0,0 +1,68 @@
+import threading
+import time
+import pytest
+from mcp_server import JobManager, JobRejected, request_user_id
+from progress_events import ProgressBus, RunCancelled
+
+def _blocking_job(release: threading.Event):
+    def run():
+        release.wait(5)
+        return "done"
+    return run
+
+def test_per_user_limit_and_queue_size_are_enforced():
+    release = threading.Event()
+    manager = JobManager(max_workers=1, max_queue=2, per_user_limit=1)
+    manager.submit("alice", _blocking_job(release))
+    with pytest.raises(JobRejected):
+        manager.submit("alice", _blocking_job(release))
+    manager.submit("bob", _blocking_job(release))
+    manager.submit("carol", _blocking_job(release))
+    with pytest.raises(JobRejected):
+        manager.submit("dave", _blocking_job(release))
+    release.set()
+
+def test_cancelling_a_queued_job_frees_its_place():
+    release = threading.Event()
+    manager = JobManager(max_workers=1, per_user_limit=1)
+    running = manager.submit("alice", _blocking_job(release))
+    queued = manager.submit("bob", _blocking_job(release))
+    manager.cancel(queued)
+    assert queued.status == "cancelled"
+    with pytest.raises(RunCancelled):
+        queued.wait(1)
+    # Bob may submit again once the cancelled job is gone
+    manager.submit("bob", _blocking_job(release))
+    release.set()
+    assert running.wait(5) == "done"
+
+def test_cancelling_a_running_job_signals_its_progress_bus():
+    bus = ProgressBus()
+    started = threading.Event()
+
+    def run():
+        started.set()
+        while not bus.cancelled:
+            time.sleep(0.01)
+        raise RunCancelled("stopped")
+
+    manager = JobManager(max_workers=1)
+    job = manager.submit("alice", run, bus)
+    assert started.wait(5)
+    manager.cancel(job)
+    with pytest.raises(RunCancelled):
+        job.wait(5)
+    assert job.status == "cancelled"
+    assert manager.stats["cancelled"] == 1
+
+class _Request:
+    def __init__(self, username=None, session_hash=None, host=None):
+        self.username = username
+        self.session_hash = session_hash
+        self.client = type("Client", (), {"host": host})()
+
+def test_callers_are_identified_by_session_before_address():
+    assert request_user_id(_Request(username="ann", session_hash="s1", host="10.0.0.1")) == "user:ann"
+    assert request_user_id(_Request(session_hash="s1", host="10.0.0.1")) == "session:s1"
+    assert request_user_id(_Request(host="10.0.0.1")) == "host:10.0.0.1"
+    assert request_user_id(None) == "anonymous"
@@ -0,0 +1,39 @@
+import time
+from llm_cache import DiskLRUCache, LLMResponseCache
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    cache.set("b", "2")
+    time.sleep(0.01)
+    assert cache.get("a") == "1"  # a is now more recent than b
+    time.sleep(0.01)
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.sqlite"), ttl_seconds=0.05)
+    cache.set("a", "1")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DiskLRUCache(path)
+    cache.set("a", "1")
+    cache.close()
+    assert DiskLRUCache(path).get("a") == "1"
+
+def test_keys_depend_on_every_input():
+    base = ("openrouter", "model", "system", "prompt", 0.1)
+    keys = {LLMResponseCache.make_key(*base)}
+    for position, changed in enumerate(("gemini", "other-model", "other system", "other prompt", 0.7)):
+        args = list(base)
+        args[position] = changed
+        keys.add(LLMResponseCache.make_key(*args))
+    assert len(keys) == 6
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from aiohttp import web
+from client_pool import PublicAddressResolver
+from page_fetcher import PageCache, PageFetcher
+from stub_servers import PageStub, StubConfig, StubServer
+
+class EdgeCaseServer(StubServer):
+    """Pages with an unknown charset and redirect chains"""
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_get("/odd-charset", self.odd_charset)
+        app.router.add_get("/loop", self.loop)
+
+    async def odd_charset(self, request: web.Request) -> web.Response:
+        body = "<html><body><main>" + "charset text " * 100 + "</main></body></html>"
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": "text/html; charset=utf8mb4"})
+
+    async def loop(self, request: web.Request) -> web.Response:
+        raise web.HTTPFound("/loop")
+
+@pytest.fixture(scope="module")
+def page_stub():
+    stub = PageStub(StubConfig(latency=0.0, page_chars=3000))
+    yield stub.start()
+    stub.stop()
+
+@pytest.fixture(scope="module")
+def edge_server():
+    server = EdgeCaseServer(StubConfig(latency=0.0))
+    yield server.start()
+    server.stop()
+
+def _results(url: str, count: int = 3):
+    return [{"url": f"{url}/page/abc/{i}", "title": f"Result {i}", "content": "short snippet"} for i in range(count)]
+
+def test_enrich_extracts_main_text_without_touching_input(page_stub, tmp_path):
+    fetcher = PageFetcher(cache=PageCache(str(tmp_path / "pages.sqlite")), allow_private_addresses=True)
+    results = _results(page_stub)
+    enriched = asyncio.run(fetcher.enrich(results))
+
+    assert all("page_content" not in result for result in results)
+    assert all(len(result["page_content"]) > 2000 for result in enriched)
+    text = enriched[0]["page_content"]
+    assert "[stub-source-abc-0]" in text
+    assert "tracking" not in text and "Home" not in text and "Copyright" not in text
+
+    asyncio.run(fetcher.enrich(results))
+    assert fetcher.stats()["fetched"] == 3
+    assert fetcher.stats()["cache_hits"] == 3
+
+def test_private_addresses_are_not_fetched_by_default(page_stub):
+    fetcher = PageFetcher()
+    results = _results(page_stub, 1) + [{"url": "http://169.254.169.254/latest/meta-data/", "content": "x"}]
+    enriched = asyncio.run(fetcher.enrich(results))
+    assert all("page_content" not in result for result in enriched)
+    assert fetcher.stats()["fetched"] == 0
+
+def test_resolver_drops_loopback_addresses():
+    async def resolve():
+        resolver = PublicAddressResolver()
+        try:
+            await resolver.resolve("localhost", 80)
+        finally:
+            await resolver.close()
+    with pytest.raises(OSError):
+        asyncio.run(resolve())
+
+def test_unknown_charset_falls_back_to_utf8(edge_server):
+    fetcher = PageFetcher(allow_private_addresses=True)
+    enriched = asyncio.run(fetcher.enrich([{"url": f"{edge_server}/odd-charset", "content": "x"}]))
+    assert "charset text" in enriched[0]["page_content"]
+    stats = fetcher.stats()
+    assert (stats["fetched"], stats["charset_fallback"], stats["failed"]) == (1, 1, 0)
+
+def test_redirects_are_capped(edge_server):
+    fetcher = PageFetcher(allow_private_addresses=True, max_redirects=2)
+    enriched = asyncio.run(fetcher.enrich([{"url": f"{edge_server}/loop", "content": "x"}]))
+    assert "page_content" not in enriched[0]
+    assert fetcher.stats()["skipped"] == 1
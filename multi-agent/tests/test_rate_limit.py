@@ -0,0 +1,26 @@
+import threading
+import time
+from rate_limit import TokenBucket
+
+def test_burst_up_to_capacity_is_not_throttled():
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+def test_concurrent_callers_are_spaced_at_the_refill_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One token up front, then four more at 20 per second
+    assert time.monotonic() - started >= 0.19
+    stats = bucket.stats()
+    assert stats["requests"] == 5
+    assert 0.45 <= stats["throttled_seconds"] <= 0.55
+
+def test_retries_are_recorded():
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.record_retry(2.5)
+    assert (bucket.stats()["retries"], bucket.stats()["retry_wait_seconds"]) == (1, 2.5)
@@ -0,0 +1,22 @@
+from relevance import RelevanceScorer, term_matrix
+
+def test_term_matrix_counts_vocabulary_words_per_text():
+    matrix = term_matrix([["solar", "panel", "solar"], ["wind"], []], {"solar": 0, "panel": 1})
+    assert matrix.tolist() == [[2, 1], [0, 0], [0, 0]]
+
+def test_on_topic_text_scores_higher_and_scores_stay_in_range():
+    scorer = RelevanceScorer()
+    scores = scorer.score("solar panel efficiency", [
+        "Solar panel efficiency has improved; modern solar panels convert more sunlight.",
+        "A recipe for sourdough bread with a long cold fermentation.",
+    ])
+    assert scores[0] > scores[1] == 0
+    assert 0 < scores[0] <= 1
+
+def test_topics_without_content_words_accept_everything():
+    assert RelevanceScorer().score("what is the", ["anything", "else"]).tolist() == [1.0, 1.0]
+
+def test_threshold_decides_acceptance():
+    scorer = RelevanceScorer(threshold=0.2)
+    assert scorer.accepts(scorer.score("solar", ["solar power", "wind power"])).tolist() == [True, False]
+    assert RelevanceScorer(threshold=0).accepts(scorer.score("solar", ["wind power"])).tolist() == [True]
@@ -0,0 +1,29 @@
+from search_cache import SearchResultCache
+
+RESULTS = [{"url": "https://example.com", "content": "text"}]
+
+def test_queries_are_normalized_and_params_are_part_of_the_key():
+    cache = SearchResultCache()
+    cache.set("Solar  Panels", RESULTS, search_depth="advanced")
+    assert cache.get("solar panels", search_depth="advanced") == RESULTS
+    assert cache.get("solar panels", search_depth="basic") is None
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = SearchResultCache(max_entries=2)
+    cache.set("a", RESULTS)
+    cache.set("b", RESULTS)
+    cache.get("a")
+    cache.set("c", RESULTS)
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULTS
+    assert cache.stats()["entries"] == 2
+
+def test_disk_tier_serves_entries_evicted_from_memory(tmp_path):
+    path = str(tmp_path / "search.sqlite")
+    cache = SearchResultCache(max_entries=1, disk_path=path)
+    cache.set("a", RESULTS)
+    cache.set("b", RESULTS)
+    assert cache.get("a") == RESULTS
+    assert cache.stats()["disk_hits"] == 1
+    # and a new process sees them too
+    assert SearchResultCache(disk_path=path).get("b") == RESULTS
@@ -0,0 +1,36 @@
+import pytest
+from structured_output import StructuredOutputError, StructuredOutputStats, parse_json, reask_prompt
+
+def test_valid_json_is_not_repaired():
+    assert parse_json('{"a": [1, 2]}') == ({"a": [1, 2]}, False)
+
+@pytest.mark.parametrize("reply, expected", [
+    ('Here you go:\n```json\n{"a": [1, 2,],}\n```\nThanks', {"a": [1, 2]}),
+    ("{'a': True, 'b': None}", {"a": True, "b": None}),
+    ('{"a": 1 // note\n}', {"a": 1}),
+    ('{“a”: “b”}', {"a": "b"}),
+    ('{"a": [1, 2', {"a": [1, 2]}),
+    ('["x", "y"', ["x", "y"]),
+])
+def test_common_defects_are_repaired(reply, expected):
+    assert parse_json(reply) == (expected, True)
+
+@pytest.mark.parametrize("reply", [None, "", "   ", "no json here"])
+def test_unusable_replies_raise(reply):
+    with pytest.raises(StructuredOutputError):
+        parse_json(reply)
+
+def test_reask_sends_back_the_broken_reply_and_schema():
+    prompt = reask_prompt("original prompt", '{"a": [1,', ValueError("truncated"), {"type": "object"})
+    assert '{"a": [1,' in prompt
+    assert "truncated" in prompt
+    assert '{"type": "object"}' in prompt
+
+def test_stats_rates_per_operation():
+    stats = StructuredOutputStats()
+    for outcome in ("ok", "ok", "repaired", "failed"):
+        stats.record("plan", outcome)
+    plan = stats.stats()["plan"]
+    assert (plan["ok"], plan["repaired"], plan["failed"]) == (2, 1, 1)
+    assert plan["malformed_rate"] == 0.5
+    assert plan["failure_rate"] == 0.25
@@ -0,0 +1,46 @@
+import contextvars
+from tracing import Trace, activate, annotate, span, traced
+
+@traced("produce")
+def produce(count):
+    for i in range(count):
+        with span("produce_step"):
+            annotate(step=i)
+        yield i
+    annotate(produced=count)
+
+def _spans(trace):
+    return {s.name: s for s in trace.finished_spans()}
+
+def test_traced_generator_is_not_parent_of_consumer_spans():
+    trace = Trace(query="q")
+    with activate(trace):
+        with span("consumer") as consumer:
+            for _ in produce(2):
+                with span("handle_chunk"):
+                    pass
+    spans = _spans(trace)
+    assert spans["produce_step"].parent_id == spans["produce"].span_id
+    assert spans["handle_chunk"].parent_id == consumer.span_id
+    assert spans["produce"].parent_id == consumer.span_id
+    assert spans["produce"].attributes["produced"] == 2
+
+def test_traced_generator_consumed_across_contexts():
+    trace = Trace(query="q")
+    with activate(trace):
+        chunks = produce(3)
+        # Each step runs in a different context, as with a streaming web handler
+        values = [contextvars.copy_context().run(next, chunks) for _ in range(3)]
+        chunks.close()
+    assert values == [0, 1, 2]
+    assert _spans(trace)["produce"].error is None
+
+def test_closing_a_traced_generator_early_finishes_its_span():
+    trace = Trace(query="q")
+    with activate(trace):
+        chunks = produce(5)
+        next(chunks)
+        chunks.close()
+    spans = _spans(trace)
+    assert spans["produce"].duration is not None
+    assert "produced" not in spans["produce"].attributes
@@ -0,0 +1,385 @@
+"""Per-run tracing spans and process-wide Prometheus-style metrics
+
+Agent and search calls are wrapped in spans with ``traced`` or ``span``.
+A span records its duration, any error, and attributes such as prompt and
+response sizes, token counts and cache hits added with ``annotate``.
+Finished spans are appended to the run's active Trace and folded into
+the global METRICS registry, which start_metrics_server exposes over HTTP.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    """One timed operation within a run"""
+
+    def __init__(self, name: str, trace: Optional["Trace"], parent: Optional["Span"] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:12]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.offset = time.monotonic() - trace.started_monotonic if trace else 0.0
+        self._started = time.monotonic()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def finish(self) -> None:
+        self.duration = time.monotonic() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset": round(self.offset, 4),
+            "duration": round(self.duration, 4) if self.duration is not None else None,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+class Trace:
+    """The spans recorded during one research run"""
+
+    def __init__(self, trace_id: Optional[str] = None, query: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.query = query
+        self.started_at = time.time()
+        self.started_monotonic = time.monotonic()
+        self.status = "running"
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, errors, total seconds and token counts per span name"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = summary.setdefault(span.name, {"calls": 0, "errors": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += 1 if span.error else 0
+            entry["seconds"] = round(entry["seconds"] + (span.duration or 0.0), 3)
+            for key in ("prompt_tokens", "response_tokens"):
+                if key in span.attributes:
+                    entry[key] = entry.get(key, 0) + span.attributes[key]
+            if span.attributes.get("cache_hit"):
+                entry["cache_hits"] = entry.get("cache_hits", 0) + 1
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            "trace_id": self.trace_id,
+            "query": self.query,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": round(time.monotonic() - self.started_monotonic, 3),
+            "summary": self.summary(),
+            "spans": spans
+        }
+
+    def export_json(self, path: str) -> str:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("research_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("research_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make trace the destination of spans started in this context"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Generators may be finished from a different context
+            pass
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a block as a span of the active trace and record it in METRICS"""
+    trace = _current_trace.get()
+    current = Span(name, trace, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        _record_error(current, e)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass
+        _finish_span(current, trace)
+
+def _record_error(current: Span, error: BaseException) -> None:
+    if not isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        current.error = f"{type(error).__name__}: {str(error)}"
+
+def _finish_span(current: Span, trace: Optional[Trace]) -> None:
+    current.finish()
+    if trace is not None:
+        trace.add(current)
+    METRICS.record_span(current)
+
+def annotate(**attributes) -> None:
+    """Add attributes to the innermost active span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping each call of a function, coroutine or generator in a span"""
+    def decorate(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                # The span is active only while the generator runs, not while the
+                # consumer handles a chunk, so the consumer's own spans are not
+                # nested under it and the contextvar is reset where it was set
+                trace = _current_trace.get()
+                current = Span(name, trace, _current_span.get())
+                generator = fn(*args, **kwargs)
+                try:
+                    while True:
+                        token = _current_span.set(current)
+                        try:
+                            chunk = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            _current_span.reset(token)
+                        yield chunk
+                except BaseException as e:
+                    _record_error(current, e)
+                    raise
+                finally:
+                    token = _current_span.set(current)
+                    try:
+                        generator.close()
+                    finally:
+                        _current_span.reset(token)
+                    _finish_span(current, trace)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class MetricsRegistry:
+    """Counters, histograms and callback gauges rendered in Prometheus text format"""
+
+    DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], list] = {}
+        self._gauges: Dict[str, Callable[[], Dict[tuple, float]]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(self.DURATION_BUCKETS), 0.0, 0]
+            for position, bound in enumerate(self.DURATION_BUCKETS):
+                if value <= bound:
+                    entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Dict[tuple, float]]) -> None:
+        """Register a gauge whose samples ({label items: value}) are read at render time"""
+        self.describe(name, "gauge", help_text)
+        self._gauges[name] = fn
+
+    def record_span(self, finished: Span) -> None:
+        operation = finished.name
+        self.inc("research_operations_total", operation=operation, status="error" if finished.error else "ok")
+        if finished.duration is not None:
+            self.observe("research_operation_duration_seconds", finished.duration, operation=operation)
+        attributes = finished.attributes
+        for key, direction in (("prompt_tokens", "prompt"), ("response_tokens", "response")):
+            if key in attributes:
+                self.inc("research_llm_tokens_total", attributes[key], operation=operation, direction=direction)
+        if "cache_hit" in attributes:
+            self.inc("research_cache_lookups_total", operation=operation)
+            if attributes["cache_hit"]:
+                self.inc("research_cache_hits_total", operation=operation)
+
+    @staticmethod
+    def _escape(value: Any) -> str:
+        """Escape a label value as the Prometheus text format requires"""
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = [f'{key}="{cls._escape(value)}"' for key, value in labels]
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+        names = sorted({name for name, _ in counters} | {name for name, _ in histograms} | set(self._gauges))
+        for name in names:
+            kind, help_text = self._help.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(self.DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', bound),))} {bucket_count}")
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {round(total, 6)}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+            if name in self._gauges:
+                try:
+                    samples = self._gauges[name]()
+                except Exception as e:
+                    logger.warning(f"Gauge {name} failed: {str(e)}")
+                    samples = {}
+                for labels, value in samples.items():
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+METRICS.describe("research_operations_total", "counter", "Agent, search and run operations by outcome")
+METRICS.describe("research_operation_duration_seconds", "histogram", "Duration of agent, search and run operations")
+METRICS.describe("research_llm_tokens_total", "counter", "Estimated LLM tokens by operation and direction")
+METRICS.describe("research_cache_lookups_total", "counter", "LLM and search cache lookups by operation")
+METRICS.describe("research_cache_hits_total", "counter", "LLM and search cache hits by operation")
+
+# Recently finished traces, served by the metrics endpoint
+_recent_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_recent_lock = threading.Lock()
+MAX_RECENT_TRACES = 100
+
+def finish_trace(trace: Trace, status: str) -> None:
+    """Mark a run's trace finished, keep it for the endpoint and export it if TRACE_DIR is set"""
+    trace.status = status
+    with _recent_lock:
+        _recent_traces[trace.trace_id] = trace
+        _recent_traces.move_to_end(trace.trace_id)
+        while len(_recent_traces) > MAX_RECENT_TRACES:
+            _recent_traces.popitem(last=False)
+    directory = os.getenv("TRACE_DIR")
+    if directory:
+        try:
+            trace.export_json(os.path.join(directory, f"{trace.trace_id}.json"))
+        except Exception as e:
+            logger.warning(f"Failed to export trace {trace.trace_id}: {str(e)}")
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    with _recent_lock:
+        return _recent_traces.get(trace_id)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/metrics":
+            self._send(200, METRICS.render(), "text/plain; version=0.0.4")
+        elif path.startswith("/traces") and not self.server.serve_traces:
+            self._send(404, "not found\n", "text/plain")
+        elif path == "/traces":
+            with _recent_lock:
+                traces = [
+                    {"trace_id": trace.trace_id, "query": trace.query, "status": trace.status,
+                     "started_at": trace.started_at}
+                    for trace in reversed(_recent_traces.values())
+                ]
+            self._send(200, json.dumps(traces), "application/json")
+        elif path.startswith("/traces/"):
+            trace = get_trace(path[len("/traces/"):])
+            if trace is None:
+                self._send(404, json.dumps({"error": "unknown trace"}), "application/json")
+            else:
+                self._send(200, json.dumps(trace.to_dict(), default=str), "application/json")
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+    def _send(self, status: int, body: str, content_type: str) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics endpoint: {format % args}")
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1",
+                         serve_traces: bool = False) -> ThreadingHTTPServer:
+    """Serve /metrics, and with ``serve_traces`` /traces and /traces/<id>, from a background thread
+
+    Traces include user queries and the endpoint has no authentication, so
+    they are off by default and the server only listens locally unless
+    another host is given.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.serve_traces = serve_traces
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
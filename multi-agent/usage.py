@@ -0,0 +1,122 @@
+"""Per-run token, search and cost accounting, and run budgets
+
+Usage is read off the spans of a run's Trace: every agent call carries
+its provider and estimated prompt/response tokens, and every search its
+depth and whether it was served from cache. Cached calls are counted
+separately and cost nothing.
+"""
+import os
+import copy
+import time
+from typing import Any, Dict, Optional
+from tracing import Trace
+
+# Tavily bills advanced searches at two API credits and basic ones at one
+SEARCH_CREDITS = {"basic": 1, "advanced": 2}
+
+def _price(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+def summarize_usage(trace: Optional[Trace], prior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Token totals per agent operation and provider, and searches by depth
+
+    ``prior`` is an earlier summary to add to, such as the usage of a run
+    before it was resumed from a checkpoint. When LLM_PRICE_INPUT_PER_MTOK / LLM_PRICE_OUTPUT_PER_MTOK (USD per
+    million tokens) and TAVILY_PRICE_PER_CREDIT are set, an estimated cost
+    is included.
+    """
+    prior = prior or {}
+    by_agent: Dict[str, Dict[str, int]] = copy.deepcopy(prior.get("by_agent", {}))
+    by_provider: Dict[str, Dict[str, int]] = copy.deepcopy(prior.get("by_provider", {}))
+    searches: Dict[str, Dict[str, int]] = copy.deepcopy(prior.get("searches", {}))
+    totals = {key: prior.get(key, 0) for key in ("input_tokens", "output_tokens", "llm_calls", "cached_llm_calls")}
+
+    for span in (trace.finished_spans() if trace else []):
+        attributes = span.attributes
+        if "prompt_tokens" in attributes:
+            cached = bool(attributes.get("cache_hit"))
+            entries = (
+                by_agent.setdefault(span.name, {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0}),
+                by_provider.setdefault(attributes.get("provider", "unknown"),
+                                       {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0})
+            )
+            for entry in entries:
+                entry["cached_calls" if cached else "calls"] += 1
+                if not cached:
+                    entry["input_tokens"] += attributes["prompt_tokens"]
+                    entry["output_tokens"] += attributes.get("response_tokens", 0)
+            totals["cached_llm_calls" if cached else "llm_calls"] += 1
+            if not cached:
+                totals["input_tokens"] += attributes["prompt_tokens"]
+                totals["output_tokens"] += attributes.get("response_tokens", 0)
+        elif span.name == "web_search" and "search_depth" in attributes:
+            entry = searches.setdefault(attributes["search_depth"], {"calls": 0, "cached": 0})
+            entry["cached" if attributes.get("cache_hit") else "calls"] += 1
+
+    usage: Dict[str, Any] = {
+        **totals,
+        "total_tokens": totals["input_tokens"] + totals["output_tokens"],
+        "by_agent": by_agent,
+        "by_provider": by_provider,
+        "searches": searches,
+        "search_credits": sum(SEARCH_CREDITS.get(depth, 1) * entry["calls"] for depth, entry in searches.items())
+    }
+
+    input_price, output_price = _price("LLM_PRICE_INPUT_PER_MTOK"), _price("LLM_PRICE_OUTPUT_PER_MTOK")
+    credit_price = _price("TAVILY_PRICE_PER_CREDIT")
+    if input_price is not None or output_price is not None or credit_price is not None:
+        cost = (totals["input_tokens"] * (input_price or 0) + totals["output_tokens"] * (output_price or 0)) / 1e6
+        cost += usage["search_credits"] * (credit_price or 0)
+        usage["estimated_cost_usd"] = round(cost, 4)
+    return usage
+
+class RunBudget:
+    """Limits after which a run stops researching and writes its report
+
+    ``max_tokens`` caps LLM tokens (input plus output, cache hits excluded)
+    spent before the report; the report's findings are then packed into
+    whatever remains, with a floor so a report is always produced.
+    ``max_searches`` caps searches alongside MAX_SEARCHES_TOTAL and
+    ``max_seconds`` caps wall-clock time spent researching.
+    """
+
+    # Tokens always left for the report prompt's findings
+    MIN_REPORT_TOKENS = 4000
+
+    def __init__(self, max_tokens: Optional[int] = None, max_searches: Optional[int] = None,
+                 max_seconds: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_searches = max_searches
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def from_env(cls) -> "RunBudget":
+        def read(name, cast):
+            value = os.getenv(name)
+            return cast(value) if value else None
+        return cls(
+            max_tokens=read("RUN_MAX_TOKENS", int),
+            max_searches=read("RUN_MAX_SEARCHES", int),
+            max_seconds=read("RUN_MAX_SECONDS", float)
+        )
+
+    def exceeded(self, usage: Dict[str, Any], search_count: int, started_at: float) -> Optional[str]:
+        """Return why the run must stop researching, or None while within budget"""
+        if self.max_tokens is not None and usage["total_tokens"] >= self.max_tokens:
+            return f"token budget reached ({usage['total_tokens']}/{self.max_tokens} tokens)"
+        if self.max_searches is not None and search_count >= self.max_searches:
+            return f"search budget reached ({search_count}/{self.max_searches} searches)"
+        elapsed = time.monotonic() - started_at
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return f"time budget reached ({elapsed:.1f}/{self.max_seconds:.1f}s)"
+        return None
+
+    def report_tokens(self, usage: Dict[str, Any]) -> Optional[int]:
+        """Token budget for the report's findings, or None when tokens are unlimited"""
+        if self.max_tokens is None:
+            return None
+        return max(self.MIN_REPORT_TOKENS, self.max_tokens - usage["total_tokens"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"max_tokens": self.max_tokens, "max_searches": self.max_searches, "max_seconds": self.max_seconds}
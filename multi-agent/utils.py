@@ -1,9 +1,13 @@
 import json
 import os
+import re
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
 from markdown_it import MarkdownIt
+import tiktoken
+
+_token_encoding = None
 
 def validate_response(response: Any, expected_type: type) -> bool:
     """Validate response type and structure"""
@@ -11,6 +15,26 @@ def validate_response(response: Any, expected_type: type) -> bool:
         return False
     return True
 
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken's cl100k_base encoding
+    
+    Gemini and most OpenRouter models use their own tokenizers, so this is
+    an estimate. Falls back to ~4 characters per token when the encoding
+    cannot be loaded (tiktoken downloads it on first use).
+    """
+    global _token_encoding
+    if not text:
+        return 0
+    if _token_encoding is None:
+        try:
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"tiktoken unavailable, estimating tokens: {str(e)}")
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
 def format_source_content(
     title: str,
     url: str,
@@ -29,6 +53,10 @@ Type: {source_type}
 
 ---"""
 
+def source_text(result: Dict[str, Any]) -> str:
+    """Fullest text available for a search result: the fetched page if there is one, else the snippet"""
+    return result.get("page_content") or result.get("content", "")
+
 def parse_research_results(results: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, str]]]:
     """Parse and validate research results"""
     contexts = []
@@ -36,7 +64,7 @@ def parse_research_results(results: List[Dict[str, Any]]) -> Tuple[List[str], Li
     
     for result in results:
         title = result.get("title", "").strip()
-        content = result.get("content", "").strip()
+        content = source_text(result).strip()
         url = result.get("url", "").strip()
         date = result.get("published_date", "").strip()
         
@@ -60,6 +88,100 @@ def parse_research_results(results: List[Dict[str, Any]]) -> Tuple[List[str], Li
     
     return contexts, sources
 
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how in into is it its of on or
+that the their them these this those to was what when where which who why will with
+about between vs versus using use used than then there they we you your our
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased content words of a text in order, repeats included, without stopwords"""
+    return [
+        word for word in re.findall(r"[a-z0-9]+", text.lower())
+        if len(word) > 1 and word not in _STOPWORDS
+    ]
+
+def extract_terms(text: str) -> set:
+    """Lowercased content words of a text, without stopwords"""
+    return set(tokenize(text))
+
+def _context_title(context: str) -> str:
+    first_line = context.split("\n", 1)[0]
+    return first_line.replace("### Source:", "").strip() or "Untitled source"
+
+def trim_context(context: str, max_tokens: int) -> str:
+    """Shorten the key content of a formatted context to roughly max_tokens"""
+    head, marker, body = context.partition("**Key Content:**\n")
+    if not marker:
+        head, body = "", context
+    body = body.replace("\n\n---", "").strip()
+    max_chars = max_tokens * 4
+    if len(body) <= max_chars:
+        return context
+    cut = body[:max_chars]
+    # Prefer ending on a sentence boundary
+    sentence_end = cut.rfind(". ")
+    if sentence_end > max_chars // 2:
+        cut = cut[:sentence_end + 1]
+    return f"{head}{marker}{cut} [trimmed]\n\n---"
+
+def pack_contexts(
+    contexts: List[str],
+    query: str,
+    research_plan: Dict[str, Any],
+    token_budget: int,
+    trimmed_tokens: int = 300
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Fit formatted contexts into a token budget, keeping the most relevant ones
+    
+    Contexts are ranked by term overlap with the query (weighted double) and
+    the research plan. In rank order each context is kept whole if it fits,
+    otherwise trimmed to about ``trimmed_tokens``, otherwise dropped. The
+    kept contexts are returned in their original order.
+    
+    Returns:
+        Tuple of the packed contexts and a summary with token usage and the
+        titles of trimmed and dropped sources
+    """
+    query_terms = extract_terms(query)
+    plan_terms = extract_terms(json.dumps(research_plan))
+    
+    scores = []
+    for context in contexts:
+        terms = extract_terms(context)
+        scores.append(2 * len(terms & query_terms) + len(terms & plan_terms))
+    
+    ranked = sorted(range(len(contexts)), key=lambda i: (-scores[i], i))
+    chosen = {}
+    trimmed, dropped = [], []
+    used = 0
+    for i in ranked:
+        context = contexts[i]
+        tokens = count_tokens(context)
+        if used + tokens <= token_budget:
+            chosen[i] = context
+            used += tokens
+            continue
+        
+        short = trim_context(context, trimmed_tokens)
+        short_tokens = count_tokens(short)
+        if short_tokens < tokens and used + short_tokens <= token_budget:
+            chosen[i] = short
+            used += short_tokens
+            trimmed.append(_context_title(context))
+        else:
+            dropped.append(_context_title(context))
+    
+    summary = {
+        "budget": token_budget,
+        "tokens_used": used,
+        "kept": len(chosen),
+        "kept_indices": sorted(chosen),
+        "trimmed": trimmed,
+        "dropped": dropped
+    }
+    return [chosen[i] for i in sorted(chosen)], summary
+
 def format_sources_section(sources: List[Dict[str, str]]) -> str:
     """Format the sources section of the response with proper markdown"""
     sources_section = "\n\n## Sources Cited\n\n"
@@ -84,23 +206,27 @@ def format_sources_section(sources: List[Dict[str, str]]) -> str:
     sources_section += "\n"
     return sources_section
 
-def save_markdown_report(content: str) -> str:
+def save_markdown_report(content: str, output_dir: str = "generated_reports",
+                         filename: Optional[str] = None) -> str:
     """Save markdown content to a file and return the file path
     
     Args:
         content: The markdown content to save
+        output_dir: Directory to write the report into
+        filename: File name to use instead of a timestamped one
         
     Returns:
         str: Path to the generated markdown file
     """
     try:
         # Create output directory if it doesn't exist
-        os.makedirs("generated_reports", exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         
         # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"research_report_{timestamp}.md"
-        file_path = os.path.join("generated_reports", filename)
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"research_report_{timestamp}.md"
+        file_path = os.path.join(output_dir, filename)
         
         # Save markdown content
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -113,11 +239,14 @@ def save_markdown_report(content: str) -> str:
         logger.error(f"Failed to save markdown report: {str(e)}")
         raise
 
-def convert_to_html(markdown_content: str) -> str:
+def convert_to_html(markdown_content: str, output_dir: str = "generated_reports",
+                    filename: Optional[str] = None) -> str:
     """Convert markdown to styled HTML and save to file
     
     Args:
         markdown_content: The markdown content to convert
+        output_dir: Directory to write the HTML file into
+        filename: File name to use instead of a timestamped one
         
     Returns:
         str: Path to the generated HTML file
@@ -189,11 +318,13 @@ def convert_to_html(markdown_content: str) -> str:
         """
         
         # Create output directory if it doesn't exist
-        os.makedirs("generated_reports", exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         
         # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        html_path = os.path.join("generated_reports", f"report_{timestamp}.html")
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"report_{timestamp}.html"
+        html_path = os.path.join(output_dir, filename)
         
         # Save HTML file
         with open(html_path, 'w', encoding='utf-8') as f: